@@ -7,35 +7,33 @@
 
 """Acquisition indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
+from invenio_app_ils.proxies import current_app_ils
 
 from .api import ORDER_PID_TYPE, VENDOR_PID_TYPE
 from .proxies import current_ils_acq
 
 
 @shared_task(ignore_result=True)
-def vendor_index_referenced_records(vendor):
+def vendor_index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    vendor = scheduler.started(pid_type, pid_value, revision_id)
+    if vendor is None:
+        return
     indexer = ReferencedRecordsIndexer()
     indexed = dict(pid_type=VENDOR_PID_TYPE, record=vendor)
-    referenced = []
 
     # fetch and index orders
-    Order = current_ils_acq.order_record_cls
     OrderSearch = current_ils_acq.order_search_cls
-    for order in (
-        OrderSearch().search_by_vendor_pid(vendor_pid=vendor["pid"]).scan()
-    ):
-        order = Order.get_record_by_pid(order["pid"])
-        referenced.append(dict(pid_type=ORDER_PID_TYPE, record=order))
+    search = OrderSearch().search_by_vendor_pid(vendor_pid=vendor["pid"])
 
-    indexer.index(indexed, referenced)
+    indexer.index(indexed, search_referenced_records(ORDER_PID_TYPE, search))
+    scheduler.processed(pid_type, vendor)
 
 
 class VendorIndexer(RecordIndexer):
@@ -44,5 +42,6 @@ class VendorIndexer(RecordIndexer):
     def index(self, vendor, arguments=None, **kwargs):
         """Index an Vendor."""
         super().index(vendor)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        vendor_index_referenced_records.apply_async((vendor,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            vendor_index_referenced_records, VENDOR_PID_TYPE, vendor
+        )
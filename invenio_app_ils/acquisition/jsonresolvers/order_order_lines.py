@@ -7,15 +7,21 @@
 
 """Resolve documents and patron for order lines."""
 
+from copy import deepcopy
+
 import jsonresolver
 from werkzeug.routing import Rule
 
 from invenio_app_ils.acquisition.proxies import current_ils_acq
+from invenio_app_ils.patrons.api import get_patrons_by_pids
 from invenio_app_ils.proxies import current_app_ils
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import pick
 
+DOCUMENT_FIELDS = ("cover_metadata", "pid", "title")
+"""Fields of the documents embedded in the order lines."""
+
 
 @jsonresolver.hookimpl
 def jsonresolver_loader(url_map):
@@ -29,28 +35,46 @@ def jsonresolver_loader(url_map):
 
     def document_resolver(order_line, doc):
         """Resolve the Document for the given Order Line."""
-        order_line["document"] = pick(doc, 'cover_metadata', 'pid', 'title')
+        order_line["document"] = pick(doc, *DOCUMENT_FIELDS)
         return doc
 
     def order_lines_resolver(order_pid):
         Order = current_ils_acq.order_record_cls
         Document = current_app_ils.document_record_cls
         Patron = current_app_ils.patron_cls
-        order_lines = get_field_value(Order, order_pid, "order_lines")
+        # the cached order is not enriched with the resolved records
+        order_lines = deepcopy(
+            get_field_value(Order, order_pid, "order_lines")
+        )
+
+        # fetch all documents and patrons at once
+        documents = {
+            doc["pid"]: doc
+            for doc in Document.get_fields_by_pids(
+                {line.get("document_pid") for line in order_lines},
+                DOCUMENT_FIELDS,
+            )
+        }
+        patrons = {
+            str(patron.id): patron
+            for patron in get_patrons_by_pids(
+                {line["patron_pid"] for line in order_lines
+                 if line.get("patron_pid")}
+            )
+        }
 
-        documents = {}
-        patrons = {}
         for order_line in order_lines:
             doc_pid = order_line.get('document_pid')
+            # raises the errors of deleted or not existing documents
             doc = documents.get(doc_pid) or Document.get_record_by_pid(doc_pid)
-            documents[doc["pid"]] = doc
             document_resolver(order_line, doc)
 
             patron_pid = order_line.get('patron_pid')
             if not patron_pid:
                 continue
-            patron = patrons.get(patron_pid) or Patron.get_patron(patron_pid)
-            patrons[patron_pid] = patron
+            patron = patrons.get(str(patron_pid)) or Patron.get_patron(
+                patron_pid
+            )
             patron_resolver(order_line, patron)
         return order_lines
 
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Create invenio-app-ils branch."""
+
+# revision identifiers, used by Alembic.
+revision = "47d8e96ff83e"
+down_revision = None
+branch_labels = ("invenio_app_ils",)
+depends_on = "07fb52561c5c"
+
+
+def upgrade():
+    """Upgrade database."""
+
+
+def downgrade():
+    """Downgrade database."""
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Create the index of the patron of the loans."""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "ef307ae05f93"
+down_revision = "47d8e96ff83e"
+branch_labels = ()
+depends_on = None
+
+INDEX = "idx_records_metadata_patron_pid"
+
+
+def upgrade():
+    """Upgrade database."""
+    if op.get_context().dialect.name == "postgresql":
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS {} "
+            "ON records_metadata ((json->>'patron_pid'))".format(INDEX)
+        )
+
+
+def downgrade():
+    """Downgrade database."""
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS {}".format(INDEX))
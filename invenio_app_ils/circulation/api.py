@@ -7,12 +7,12 @@
 
 """Invenio App ILS Circulation APIs."""
 
+import hashlib
 import uuid
 from copy import deepcopy
 from datetime import timedelta
 from functools import partial
 
-from elasticsearch import VERSION as ES_VERSION
 from flask import current_app
 from flask_login import current_user
 from invenio_circulation.api import Loan
@@ -21,8 +21,10 @@ from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
 from invenio_circulation.proxies import current_circulation
 from invenio_circulation.search.api import search_by_patron_item_or_document
 from invenio_db import db
-from invenio_pidstore.models import PIDStatus
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_pidstore.providers.recordid_v2 import RecordIdProviderV2
+from invenio_records.models import RecordMetadata
+from sqlalchemy import func, select
 
 from invenio_app_ils.errors import MissingRequiredParameterError, \
     PatronHasLoanOnDocumentError, PatronHasLoanOnItemError, \
@@ -32,9 +34,6 @@ from invenio_app_ils.items.api import Item
 from invenio_app_ils.minters import pid_minter
 from invenio_app_ils.proxies import current_app_ils
 
-lt_es7 = ES_VERSION[0] < 7
-
-
 # override default `invenio-circulation` minters to use the base32 PIDs
 # CIRCULATION_LOAN_PID_TYPE is already defined in `invenio-circulation`
 ILS_CIRCULATION_LOAN_MINTER = "ilsloanid"
@@ -77,23 +76,93 @@ def _set_item_to_can_circulate(item_pid):
         current_app_ils.item_indexer.index(item)
 
 
+def get_patron_loans_states(patron_pid, states, document_pid=None,
+                            item_pid=None):
+    """Return the states of the loans of the patron in the given states.
+
+    On PostgreSQL, the loans are looked up in the database, within the current
+    transaction: loans just committed are found, as opposed to Elasticsearch
+    which is near real-time. On other databases, they are searched in
+    Elasticsearch.
+
+    :param patron_pid: the PID value of the patron.
+    :param states: the states of the loans to look up.
+    :param document_pid: the PID value of the document of the loans, if any.
+    :param item_pid: a dict containing `value` and `type` fields of the item
+        of the loans, if any.
+    :returns: a list of states.
+    """
+    if db.engine.dialect.name != "postgresql":
+        search = search_by_patron_item_or_document(
+            patron_pid=patron_pid,
+            document_pid=document_pid,
+            item_pid=item_pid,
+            filter_states=states,
+        ).source(includes=["state"])
+        return [hit.state for hit in search.execute().hits]
+
+    json = RecordMetadata.json
+    query = (
+        db.session.query(json["state"].as_string())
+        .join(
+            PersistentIdentifier,
+            PersistentIdentifier.object_uuid == RecordMetadata.id,
+        )
+        .filter(
+            PersistentIdentifier.pid_type == CIRCULATION_LOAN_PID_TYPE,
+            PersistentIdentifier.object_type == "rec",
+            # uses the index on the patron pid
+            json["patron_pid"].as_string() == str(patron_pid),
+            json["state"].as_string().in_(states),
+        )
+    )
+    if document_pid:
+        query = query.filter(
+            json["document_pid"].as_string() == document_pid
+        )
+    if item_pid:
+        query = query.filter(
+            json[("item_pid", "value")].as_string() == item_pid["value"],
+            json[("item_pid", "type")].as_string() == item_pid["type"],
+        )
+    return [state for state, in query]
+
+
+def lock_patron_loans(patron_pid, key):
+    """Serialize the loans changes of the patron on the same key.
+
+    On PostgreSQL, a transaction-level advisory lock is taken on the patron
+    and the key, e.g. a document: concurrent requests of the same patron
+    wait for each other's transaction to end, so that a duplicate loan is
+    found by the checks that follow. The lock is released at the end of the
+    transaction.
+
+    :param patron_pid: the PID value of the patron.
+    :param key: the string identifying the loans, e.g. the document PID.
+    """
+    if db.engine.dialect.name != "postgresql":
+        return
+    name = "ils:loans:{}:{}".format(patron_pid, key).encode("utf-8")
+    lock_id = int.from_bytes(
+        hashlib.sha1(name).digest()[:8], "big", signed=True
+    )
+    db.session.execute(select([func.pg_advisory_xact_lock(lock_id)]))
+
+
 def patron_has_active_loan_or_request_on_document(patron_pid, document_pid):
-    """Return True if patron has an active loan/request for given document."""
+    """Return True if patron has an active loan/request for given document.
+
+    :returns: a tuple with the states of the loans and requests found and
+        True if any.
+    """
     states = (
         current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
         + current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"]
     )
-    search = search_by_patron_item_or_document(
-        patron_pid=patron_pid, document_pid=document_pid, filter_states=states
-    )
-    search_result = search.execute()
-
-    return (
-        search_result,
-        search_result.hits.total > 0
-        if lt_es7
-        else search_result.hits.total.value > 0,
+    found_states = get_patron_loans_states(
+        patron_pid, states, document_pid=document_pid
     )
+    return found_states, len(found_states) > 0
 
 
 def request_loan(
@@ -104,13 +173,14 @@ def request_loan(
     **kwargs
 ):
     """Create a new loan and trigger the first transition to PENDING."""
-    search_result, loan_found = patron_has_active_loan_or_request_on_document(
+    lock_patron_loans(patron_pid, document_pid)
+    states, loan_found = patron_has_active_loan_or_request_on_document(
         patron_pid, document_pid
     )
     if loan_found:
-        if (
-            search_result.hits[0].state
-            in current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
+        if any(
+            state in current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
+            for state in states
         ):
             raise PatronHasRequestOnDocumentError(patron_pid, document_pid)
         raise PatronHasLoanOnDocumentError(patron_pid, document_pid)
@@ -142,17 +212,12 @@ def request_loan(
 
 def patron_has_active_loan_on_item(patron_pid, item_pid):
     """Return True if patron has a active Loan for given item."""
-    search = search_by_patron_item_or_document(
-        patron_pid=patron_pid,
+    states = get_patron_loans_states(
+        patron_pid,
+        current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"],
         item_pid=item_pid,
-        filter_states=current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"],
-    )
-    search_result = search.execute()
-    return (
-        search_result.hits.total > 0
-        if lt_es7
-        else search_result.hits.total.value > 0
     )
+    return len(states) > 0
 
 
 def checkout_loan(
@@ -176,6 +241,9 @@ def checkout_loan(
         the checkout. If False, the checkout will fail when the item cannot
         circulate.
     """
+    lock_patron_loans(
+        patron_pid, "{}:{}".format(item_pid["type"], item_pid["value"])
+    )
     if patron_has_active_loan_on_item(
         patron_pid=patron_pid, item_pid=item_pid
     ):
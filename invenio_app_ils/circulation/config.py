@@ -13,8 +13,7 @@ from invenio_circulation.pidstore.pids import _LOANID_CONVERTER, \
     CIRCULATION_LOAN_PID_TYPE
 from invenio_circulation.search.api import LoansSearch
 from invenio_circulation.transitions.transitions import CreatedToPending, \
-    ItemOnLoanToItemOnLoan, ItemOnLoanToItemReturned, ToCancelled, \
-    ToItemOnLoan
+    ItemOnLoanToItemOnLoan, ItemOnLoanToItemReturned, ToItemOnLoan
 from invenio_records_rest.facets import terms_filter
 
 from invenio_app_ils.documents.api import document_exists
@@ -34,6 +33,7 @@ from .api import ILS_CIRCULATION_LOAN_FETCHER, ILS_CIRCULATION_LOAN_MINTER
 from .indexer import LoanIndexer
 from .jsonresolvers.loan import document_resolver, item_resolver, \
     loan_patron_resolver
+from .transitions import DeferrableToCancelled
 from .utils import circulation_build_document_ref, \
     circulation_build_item_ref, circulation_build_patron_ref, \
     circulation_can_be_requested, circulation_default_extension_max_count, \
@@ -53,8 +53,12 @@ ILS_CIRCULATION_MAIL_MSG_CREATOR = (
 )
 #: Notification email for overdue loan sent automatically every X days
 ILS_CIRCULATION_MAIL_OVERDUE_REMINDER_INTERVAL = 3
+#: Number of loans reminded by each sub-task of the reminders tasks
+ILS_CIRCULATION_MAIL_REMINDERS_CHUNK_SIZE = 100
 #: The maximum duration of a loan request
 ILS_CIRCULATION_LOAN_REQUEST_DURATION_DAYS = 60
+#: Number of expired loan requests cancelled in each transaction
+ILS_CIRCULATION_EXPIRED_LOAN_REQUESTS_CHUNK_SIZE = 500
 #: Period of time in days, before loans expire, for notifications etc.
 ILS_CIRCULATION_LOAN_WILL_EXPIRE_DAYS = 7
 #: Delivery methods
@@ -151,7 +155,7 @@ CIRCULATION_LOAN_TRANSITIONS = {
         dict(
             dest="CANCELLED",
             trigger="cancel",
-            transition=ToCancelled,
+            transition=DeferrableToCancelled,
             permission_factory=PatronOwnerPermission,
         ),
     ],
@@ -172,7 +176,7 @@ CIRCULATION_LOAN_TRANSITIONS = {
         dict(
             dest="CANCELLED",
             trigger="cancel",
-            transition=ToCancelled,
+            transition=DeferrableToCancelled,
             permission_factory=backoffice_permission,
         ),
     ],
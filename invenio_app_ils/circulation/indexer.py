@@ -7,6 +7,7 @@
 
 """Loan indexer APIs."""
 
+from collections import defaultdict
 from datetime import datetime
 
 from celery import shared_task
@@ -18,11 +19,16 @@ from invenio_app_ils.circulation.utils import resolve_item_from_loan
 from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
 from invenio_app_ils.indexer import ReferencedRecordsIndexer
 from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.api import IlsRecord
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(loan):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    loan = scheduler.started(pid_type, pid_value, revision_id)
+    if loan is None:
+        return
     indexer = ReferencedRecordsIndexer()
     indexed = dict(pid_type=CIRCULATION_LOAN_PID_TYPE, record=loan)
     referenced = []
@@ -39,6 +45,57 @@ def index_referenced_records(loan):
 
     # index the document
     indexer.index(indexed, referenced)
+    scheduler.processed(pid_type, loan)
+
+
+@shared_task(ignore_result=True)
+def index_loans_referenced_records(loan_pids, document_pids, item_pids):
+    """Index the records referenced by a chunk of loans changed in bulk.
+
+    :param loan_pids: the pids of the changed loans, for logging.
+    :param document_pids: the pids of the referenced documents.
+    :param item_pids: the referenced `item_pid` dicts, with type and value.
+    """
+    indexer = ReferencedRecordsIndexer()
+    indexed = dict(pid_type=CIRCULATION_LOAN_PID_TYPE, pid_values=loan_pids)
+    referenced = [
+        dict(pid_type=DOCUMENT_PID_TYPE, record=document)
+        for document in IlsRecord.get_records_by_pids(
+            document_pids, pid_type=DOCUMENT_PID_TYPE
+        )
+    ]
+    pids_by_type = defaultdict(list)
+    for item_pid in item_pids:
+        pids_by_type[item_pid["type"]].append(item_pid["value"])
+    for pid_type, pids in pids_by_type.items():
+        referenced.extend(
+            dict(pid_type=pid_type, record=item)
+            for item in IlsRecord.get_records_by_pids(pids, pid_type=pid_type)
+        )
+    indexer.index(indexed, referenced)
+
+
+def schedule_loans_referenced_records(loans):
+    """Schedule one indexing of the records referenced by the loans.
+
+    Each document and item referenced by several loans is indexed once.
+    """
+    if not loans:
+        return
+    document_pids = list(dict.fromkeys(loan["document_pid"] for loan in loans))
+    item_pids = list(
+        {
+            (loan["item_pid"]["type"], loan["item_pid"]["value"]): dict(
+                type=loan["item_pid"]["type"], value=loan["item_pid"]["value"]
+            )
+            for loan in loans
+            if loan.get("item_pid")
+        }.values()
+    )
+    eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
+    index_loans_referenced_records.apply_async(
+        ([loan["pid"] for loan in loans], document_pids, item_pids), eta=eta
+    )
 
 
 class LoanIndexer(RecordIndexer):
@@ -47,5 +104,6 @@ class LoanIndexer(RecordIndexer):
     def index(self, loan, arguments=None, **kwargs):
         """Index an Loan."""
         super().index(loan)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((loan,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, CIRCULATION_LOAN_PID_TYPE, loan
+        )
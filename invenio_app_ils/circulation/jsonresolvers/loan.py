@@ -10,9 +10,10 @@
 from invenio_circulation.proxies import current_circulation
 from invenio_pidstore.errors import PIDDeletedError
 
-from invenio_app_ils.circulation.utils import resolve_item_from_loan
+from invenio_app_ils.circulation.utils import get_loan_item_record_class
 from invenio_app_ils.patrons.api import get_patron_or_empty_dict
 from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default, pick
@@ -21,13 +22,16 @@ from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default, pick
 def item_resolver(loan_pid):
     """Resolve an Item given a Loan PID."""
     Loan = current_circulation.loan_record_cls
-    loan = Loan.get_record_by_pid(loan_pid)
+    loan = get_cached_record(Loan, loan_pid)
     if not loan.get("item_pid"):
         return {}
 
+    item_pid = loan["item_pid"]
     try:
         # can resolve to an Item or BorrowingRequest
-        item = resolve_item_from_loan(loan["item_pid"])
+        item = get_cached_record(
+            get_loan_item_record_class(item_pid), item_pid["value"]
+        )
     except PIDDeletedError:
         item = {}
     else:
@@ -68,7 +72,7 @@ def document_resolver(loan_pid):
 
     Document = current_app_ils.document_record_cls
     try:
-        document = Document.get_record_by_pid(document_pid)
+        document = get_cached_record(Document, document_pid)
     except PIDDeletedError:
         obj = {}
     else:
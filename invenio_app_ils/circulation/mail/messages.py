@@ -32,6 +32,7 @@ class LoanMessage(BlockTemplatedMessage):
     def __init__(self, loan, action, message_ctx, **kwargs):
         """Create loan message based on the loan action."""
         self.loan = loan
+        self.message_ctx = message_ctx
 
         templates = dict(
             self.default_templates,
@@ -54,17 +55,16 @@ class LoanMessage(BlockTemplatedMessage):
         )
 
     def get_template_name(self, action):
-        """Get the template filename based on the loan action."""
-        new_state = self.loan["state"]
-        document_pid = self.loan.get("document_pid")
-        is_request = (
-            new_state in current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
-        )
-        if (
-            is_request
-            and document_pid
-            and not get_available_item_by_doc_pid(document_pid)
-        ):
+        """Get the template filename based on the loan action.
+
+        Whether the requested document has no available items is taken from
+        the `no_available_items` message context when given, i.e. as it was
+        when the loan changed, and checked now otherwise.
+        """
+        no_available_items = self.message_ctx.get("no_available_items")
+        if no_available_items is None:
+            no_available_items = has_no_available_items(self.loan)
+        if no_available_items:
             return "request_no_items"
         return action
 
@@ -73,3 +73,19 @@ class LoanMessage(BlockTemplatedMessage):
         data = super().dump()
         data["loan_pid"] = self.loan["pid"]
         return data
+
+
+def has_no_available_items(loan):
+    """Return True if the loan is a request of a document without items.
+
+    :param loan: the loan after the change.
+    """
+    document_pid = loan.get("document_pid")
+    is_request = (
+        loan["state"] in current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
+    )
+    return bool(
+        is_request
+        and document_pid
+        and not get_available_item_by_doc_pid(document_pid)
+    )
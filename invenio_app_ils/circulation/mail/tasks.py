@@ -7,18 +7,27 @@
 
 """Circulation mail tasks."""
 
+import json
+import uuid
+from contextlib import contextmanager
+from datetime import date
+
 from celery import shared_task
 from celery.utils.log import get_task_logger
-from flask import current_app
+from flask import current_app, g, has_app_context
+from invenio_cache import current_cache
 from invenio_circulation.proxies import current_circulation
 
 from invenio_app_ils.circulation.mail.factory import \
     loan_message_creator_factory
+from invenio_app_ils.circulation.mail.messages import has_no_available_items
 from invenio_app_ils.circulation.search import get_all_expiring_loans, \
-    get_all_overdue_loans
+    get_overdue_loans_to_remind
 from invenio_app_ils.circulation.utils import circulation_overdue_loan_days
 from invenio_app_ils.mail.messages import get_common_message_ctx
-from invenio_app_ils.mail.tasks import send_ils_email
+from invenio_app_ils.mail.tasks import ils_email_batch, send_ils_email
+from invenio_app_ils.records.jsonresolvers.api import pick
+from invenio_app_ils.records.jsonresolvers.cache import ref_resolution_cache
 
 celery_logger = get_task_logger(__name__)
 
@@ -45,6 +54,123 @@ def send_loan_mail(action, loan, message_ctx={}, **kwargs):
     send_ils_email(msg)
 
 
+LOAN_NOTIFICATION_INITIAL_FIELDS = (
+    "end_date",
+    "extension_count",
+    "item_pid",
+    "start_date",
+    "state",
+)
+"""Fields of the loan before the change, passed to the notifications."""
+
+
+def _get_loan_revision(loan_pid, revision_id):
+    """Return the loan as it was at the revision of the change, if known."""
+    loan = current_circulation.loan_record_cls.get_record_by_pid(loan_pid)
+    if revision_id is None or loan.revision_id == revision_id:
+        return loan
+    try:
+        revision = loan.revisions[revision_id]
+    except (AttributeError, IndexError):
+        # revisions are not stored when versioning is disabled
+        return loan
+    return current_circulation.loan_record_cls(
+        dict(revision), model=revision.model
+    )
+
+
+@shared_task
+def send_loans_change_mails(notifications):
+    """Build and send the emails of loans changes.
+
+    :param notifications: the notifications of the changes, dicts with the
+        `loan_pid`, `revision_id`, `trigger`, `no_available_items` and
+        `initial_loan` keys.
+    """
+    with ref_resolution_cache(), ils_email_batch():
+        for notification in notifications:
+            try:
+                loan = _get_loan_revision(
+                    notification["loan_pid"], notification["revision_id"]
+                )
+                send_loan_mail(
+                    action=notification["trigger"],
+                    loan=loan,
+                    message_ctx=dict(
+                        initial_loan=notification["initial_loan"],
+                        no_available_items=notification.get(
+                            "no_available_items"
+                        ),
+                    ),
+                )
+            except Exception:
+                celery_logger.exception(
+                    "Failed to send the {} email of loan {}.".format(
+                        notification["trigger"], notification["loan_pid"]
+                    )
+                )
+
+
+def _send_loans_change_mails_in_batches(notifications):
+    """Send the notifications with one task per batch of ILS_MAIL_BATCH_SIZE.
+
+    The notifications of a patron are kept next to each other, so that the
+    patron is fetched by as few tasks as possible.
+    """
+    size = current_app.config["ILS_MAIL_BATCH_SIZE"]
+    notifications = sorted(
+        notifications, key=lambda n: str(n.get("patron_pid"))
+    )
+    for notification in notifications:
+        notification.pop("patron_pid", None)
+    for start in range(0, len(notifications), size):
+        send_loans_change_mails.apply_async(
+            (notifications[start:start + size],)
+        )
+
+
+@contextmanager
+def loan_notifications_batch():
+    """Batch the notifications of the loans changed in the block.
+
+    The notifications are sent at the end of the block, with one task per
+    batch of `ILS_MAIL_BATCH_SIZE` notifications.
+    """
+    if g.get("ils_loan_notifications") is not None:
+        yield
+        return
+
+    notifications = g.ils_loan_notifications = []
+    try:
+        yield
+    finally:
+        g.pop("ils_loan_notifications", None)
+        if notifications:
+            _send_loans_change_mails_in_batches(notifications)
+
+
+def notify_loan_change(initial_loan, loan, trigger):
+    """Send the email of a loan change asynchronously.
+
+    Only the pid and the revision of the loan are passed to the task building
+    the email, with a few fields of the loan before the change and whether
+    the document has available items at the time of the change.
+    """
+    notification = dict(
+        loan_pid=loan["pid"],
+        revision_id=getattr(loan, "revision_id", None),
+        trigger=trigger,
+        no_available_items=has_no_available_items(loan),
+        initial_loan=pick(initial_loan, *LOAN_NOTIFICATION_INITIAL_FIELDS),
+        patron_pid=loan.get("patron_pid"),
+    )
+    batch = g.get("ils_loan_notifications") if has_app_context() else None
+    if batch is not None:
+        batch.append(notification)
+    else:
+        _send_loans_change_mails_in_batches([notification])
+
+
 def send_loan_overdue_reminder_mail(loan, days_ago):
     """Send loan overdue email."""
     send_loan_mail(
@@ -54,16 +180,14 @@ def send_loan_overdue_reminder_mail(loan, days_ago):
     )
 
 
-@shared_task
-def send_overdue_loans_mail_reminder():
-    """Send email message for loans that are overdue every X days."""
+def _send_overdue_loan_reminder(loan):
+    """Send the overdue reminder, every X days since the loan end date."""
     days = current_app.config["ILS_CIRCULATION_MAIL_OVERDUE_REMINDER_INTERVAL"]
-    overdue_loans = get_all_overdue_loans().execute()
-    for hit in overdue_loans.hits:
-        loan = hit.to_dict()
-        days_ago = circulation_overdue_loan_days(loan)
-        if days_ago % days == 0:
-            send_loan_overdue_reminder_mail(loan, days_ago)
+    days_ago = circulation_overdue_loan_days(loan)
+    if days_ago % days != 0:
+        return False
+    send_loan_overdue_reminder_mail(loan, days_ago)
+    return True
 
 
 def send_expiring_loan_reminder_mail(loan, expiring_in_days):
@@ -75,11 +199,169 @@ def send_expiring_loan_reminder_mail(loan, expiring_in_days):
     )
 
 
+def _send_expiring_loan_reminder(loan):
+    """Send the expiring reminder."""
+    days = current_app.config["ILS_CIRCULATION_LOAN_WILL_EXPIRE_DAYS"]
+    send_expiring_loan_reminder_mail(loan, days)
+    return True
+
+
+LOANS_MAIL_REMINDERS = {
+    "overdue": _send_overdue_loan_reminder,
+    "expiring": _send_expiring_loan_reminder,
+}
+"""Functions sending each reminder, returning False when it is skipped."""
+
+REMINDERS_COUNTERS = ("sent", "skipped", "failed")
+REMINDERS_RUN_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _checkpoint_key(name):
+    """Return the cache key of the checkpoint of the reminders."""
+    return "ils:circulation:mail_reminders:{}".format(name)
+
+
+def _counter_key(name, run_id, counter):
+    """Return the cache key of a counter of a reminders run."""
+    return "{}:{}:{}".format(_checkpoint_key(name), run_id, counter)
+
+
+def get_loans_mail_reminders_counts(name, run_id):
+    """Return the counts of the reminders run, once its chunks are sent."""
+    return {
+        counter: int(current_cache.get(_counter_key(name, run_id, counter))
+                     or 0)
+        for counter in REMINDERS_COUNTERS
+    }
+
+
+def stream_loans(search, after=None):
+    """Stream all the loans of the search, in chunks sorted by pid.
+
+    Pages are requested with `search_after`, so that the stream can be
+    resumed after any loan pid.
+
+    :param search: the loans search.
+    :param after: the pid of the loan to resume after.
+    :returns: a generator of lists of loans.
+    """
+    config = current_app.config
+    chunk_size = config["ILS_CIRCULATION_MAIL_REMINDERS_CHUNK_SIZE"]
+    search = search.sort("pid").extra(size=chunk_size)
+    while True:
+        page = search
+        if after is not None:
+            page = search.extra(search_after=[after])
+        loans = [hit.to_dict() for hit in page.execute().hits]
+        if not loans:
+            return
+        yield loans
+        if len(loans) < chunk_size:
+            return
+        after = loans[-1]["pid"]
+
+
+def send_loans_mail_reminders(name, search):
+    """Send the reminders of all the loans of the search.
+
+    The loans are streamed in chunks, each one sent by a sub-task. The pid of
+    the last dispatched loan is stored in a checkpoint, so that a run
+    interrupted on the same day resumes after it.
+
+    :param name: the name of the reminder, in `LOANS_MAIL_REMINDERS`.
+    :param search: the search of the loans to remind.
+    :returns: the run id, the number of matched loans and of chunks.
+    """
+    key = _checkpoint_key(name)
+    today = date.today().isoformat()
+    checkpoint = current_cache.get(key)
+    if checkpoint and checkpoint["date"] == today:
+        celery_logger.info(
+            "Resuming {} reminders after loan {}.".format(
+                name, checkpoint["after"]
+            )
+        )
+    else:
+        checkpoint = dict(
+            run_id=uuid.uuid4().hex, date=today, after=None, matched=0,
+            chunks=0,
+        )
+        for counter in REMINDERS_COUNTERS:
+            current_cache.set(
+                _counter_key(name, checkpoint["run_id"], counter),
+                0,
+                timeout=REMINDERS_RUN_TIMEOUT,
+            )
+
+    for loans in stream_loans(search, after=checkpoint["after"]):
+        send_loans_mail_reminders_chunk.apply_async(
+            (name, checkpoint["run_id"], loans)
+        )
+        checkpoint["after"] = loans[-1]["pid"]
+        checkpoint["matched"] += len(loans)
+        checkpoint["chunks"] += 1
+        current_cache.set(key, checkpoint, timeout=REMINDERS_RUN_TIMEOUT)
+    current_cache.delete(key)
+
+    log_msg = dict(
+        name="ils_mail_reminders",
+        action="dispatched",
+        reminder=name,
+        run_id=checkpoint["run_id"],
+        matched=checkpoint["matched"],
+        chunks=checkpoint["chunks"],
+    )
+    celery_logger.info(json.dumps(log_msg, sort_keys=True))
+    return dict(
+        run_id=checkpoint["run_id"],
+        matched=checkpoint["matched"],
+        chunks=checkpoint["chunks"],
+    )
+
+
+@shared_task
+def send_loans_mail_reminders_chunk(name, run_id, loans):
+    """Send the reminders of a chunk of loans and count the results."""
+    send_reminder = LOANS_MAIL_REMINDERS[name]
+    counts = dict.fromkeys(REMINDERS_COUNTERS, 0)
+    with ils_email_batch():
+        for loan in loans:
+            try:
+                counter = "sent" if send_reminder(loan) else "skipped"
+            except Exception:
+                celery_logger.exception(
+                    "Failed to send the {} reminder of loan {}.".format(
+                        name, loan["pid"]
+                    )
+                )
+                counter = "failed"
+            counts[counter] += 1
+
+    for counter, count in counts.items():
+        if count:
+            current_cache.inc(_counter_key(name, run_id, counter), count)
+    log_msg = dict(
+        name="ils_mail_reminders", action="chunk", reminder=name,
+        run_id=run_id,
+    )
+    log_msg.update(counts)
+    celery_logger.info(json.dumps(log_msg, sort_keys=True))
+    return counts
+
+
+@shared_task
+def send_overdue_loans_mail_reminder():
+    """Send email message for loans that are overdue every X days."""
+    days = current_app.config["ILS_CIRCULATION_MAIL_OVERDUE_REMINDER_INTERVAL"]
+    return send_loans_mail_reminders(
+        "overdue", get_overdue_loans_to_remind(days)
+    )
+
+
 @shared_task
 def send_expiring_loans_mail_reminder():
     """Send email for loans that will expire in X days."""
     days = current_app.config["ILS_CIRCULATION_LOAN_WILL_EXPIRE_DAYS"]
-    expiring_loans = get_all_expiring_loans(days).execute()
-    for hit in expiring_loans.hits:
-        loan = hit.to_dict()
-        send_expiring_loan_reminder_mail(loan, days)
+    return send_loans_mail_reminders(
+        "expiring", get_all_expiring_loans(days)
+    )
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation database indexes."""
+
+from invenio_records.models import RecordMetadata
+from sqlalchemy import DDL, event
+
+LOANS_PATRON_PID_INDEX = "idx_records_metadata_patron_pid"
+
+create_loans_patron_pid_index = DDL(
+    "CREATE INDEX IF NOT EXISTS {} "
+    "ON records_metadata ((json->>'patron_pid'))".format(
+        LOANS_PATRON_PID_INDEX
+    )
+)
+"""Index of the patron of the loans, used by the duplicate loans guards.
+
+It is created with the records table. Existing databases are upgraded by the
+`ef307ae05f93` alembic revision.
+"""
+
+event.listen(
+    RecordMetadata.__table__,
+    "after_create",
+    create_loans_patron_pid_index.execute_if(dialect="postgresql"),
+)
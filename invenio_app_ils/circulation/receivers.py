@@ -9,8 +9,9 @@
 
 from invenio_circulation.signals import loan_replace_item, loan_state_changed
 
-from invenio_app_ils.circulation.mail.tasks import send_loan_mail
+from invenio_app_ils.circulation.mail.tasks import notify_loan_change
 from invenio_app_ils.circulation.utils import resolve_item_from_loan
+from invenio_app_ils.documents.circulation import update_loan_circulation
 from invenio_app_ils.ill.api import BORROWING_REQUEST_PID_TYPE
 from invenio_app_ils.ill.proxies import current_ils_ill
 from invenio_app_ils.items.api import ITEM_PID_TYPE
@@ -20,6 +21,9 @@ from invenio_app_ils.proxies import current_app_ils
 def register_circulation_signals():
     """Register Circulation signal."""
     loan_state_changed.connect(send_email_after_loan_change, weak=False)
+    loan_state_changed.connect(
+        update_document_circulation_after_loan_change, weak=False
+    )
     loan_replace_item.connect(index_after_loan_replace_item, weak=False)
 
 
@@ -46,6 +50,11 @@ def index_after_loan_replace_item(_, old_item_pid, new_item_pid):
 
 def send_email_after_loan_change(_, initial_loan, loan, trigger):
     """Send email notification when the loan changes."""
-    send_loan_mail(
-        action=trigger, loan=loan, message_ctx=dict(initial_loan=initial_loan)
-    )
+    notify_loan_change(initial_loan, loan, trigger)
+
+
+def update_document_circulation_after_loan_change(
+    _, initial_loan, loan, trigger
+):
+    """Update the materialized circulation of the document of the loan."""
+    update_loan_circulation(initial_loan, loan)
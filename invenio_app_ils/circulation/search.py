@@ -9,6 +9,7 @@
 
 from datetime import datetime, timedelta
 
+import arrow
 from elasticsearch_dsl import A, Q
 from flask import current_app
 from invenio_circulation.proxies import current_circulation
@@ -100,6 +101,27 @@ def get_all_overdue_loans():
     )
 
 
+def get_overdue_loans_to_remind(interval):
+    """Return the overdue loans due for a reminder, every <interval> days.
+
+    The loans ended a multiple of <interval> days ago are selected with the
+    exact end dates, up to the end date of the oldest overdue loan.
+    """
+    search = get_all_overdue_loans()
+    oldest_search = search.extra(size=0)
+    oldest_search.aggs.metric("oldest", "min", field="end_date")
+    oldest = oldest_search.execute().aggregations.oldest.value
+    end_dates = []
+    if oldest is not None:
+        today = arrow.utcnow().date()
+        overdue_days = (today - arrow.get(oldest / 1000).date()).days
+        end_dates = [
+            (today - timedelta(days=days)).isoformat()
+            for days in range(interval, overdue_days + 1, interval)
+        ]
+    return search.filter("terms", end_date=end_dates)
+
+
 def get_overdue_loans_by_doc_pid(document_pid):
     """Return any overdue loans for the given document."""
     states = current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"]
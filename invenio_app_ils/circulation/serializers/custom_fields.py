@@ -11,6 +11,7 @@ from flask import current_app
 from invenio_pidstore.errors import PIDDeletedError, PIDDoesNotExistError
 
 from invenio_app_ils.circulation.utils import circulation_overdue_loan_days
+from invenio_app_ils.locations.directory import get_location
 from invenio_app_ils.proxies import current_app_ils
 from invenio_app_ils.records.jsonresolvers.api import pick
 
@@ -31,9 +32,8 @@ def field_pickup_location(metadata):
     pickup_location_pid = metadata.get("pickup_location_pid")
     if not pickup_location_pid:
         return
-    Location = current_app_ils.location_record_cls
     try:
-        pickup_location = Location.get_record_by_pid(pickup_location_pid)
+        pickup_location = get_location(pickup_location_pid)
     except PIDDeletedError:
         metadata["pickup_location"] = {"name": "This location was deleted."}
         return
@@ -48,11 +48,8 @@ def field_transaction_location(metadata):
     transaction_location_pid = metadata.get("transaction_location_pid")
     if not transaction_location_pid:
         return
-    Location = current_app_ils.location_record_cls
     try:
-        transaction_location = Location.get_record_by_pid(
-            transaction_location_pid
-        )
+        transaction_location = get_location(transaction_location_pid)
     except PIDDeletedError:
         metadata["transaction_location"] = {
             "name": "This location was deleted."
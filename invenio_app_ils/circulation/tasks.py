@@ -12,39 +12,112 @@ from copy import deepcopy
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from flask import current_app
-from invenio_circulation.api import Loan
+from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
 from invenio_circulation.proxies import current_circulation
+from invenio_circulation.signals import loan_state_changed
 from invenio_db import db
 
+from invenio_app_ils.circulation.indexer import \
+    schedule_loans_referenced_records
+from invenio_app_ils.circulation.mail.tasks import loan_notifications_batch
 from invenio_app_ils.circulation.search import get_all_expired_loans
+from invenio_app_ils.circulation.transitions import deferred_transitions
+from invenio_app_ils.indexer import bulk_index_records, chunks
 from invenio_app_ils.patrons.api import SystemAgent
+from invenio_app_ils.records.api import IlsRecord
 
 celery_logger = get_task_logger(__name__)
 
 
+def _cancel_expired_loan_requests_chunk(loans):
+    """Cancel the loan requests in one transaction and index them at once.
+
+    :returns: the number of cancelled and of failed loan requests.
+    """
+    duration_days = current_app.config[
+        "ILS_CIRCULATION_LOAN_REQUEST_DURATION_DAYS"
+    ]
+    cancel_reason = "The loan request has been automatically cancelled " \
+        "because {} days have passed.".format(duration_days)
+    system_agent_id = str(SystemAgent.id)
+    request_states = current_app.config["CIRCULATION_STATES_LOAN_REQUEST"]
+    failed = 0
+    with deferred_transitions() as cancelled:
+        for loan in loans:
+            if loan["state"] not in request_states:
+                # changed since the search
+                continue
+            params = deepcopy(loan)
+            params.update(
+                dict(
+                    cancel_reason=cancel_reason,
+                    transaction_user_pid=system_agent_id,
+                )
+            )
+            try:
+                with db.session.begin_nested():
+                    current_circulation.circulation.trigger(
+                        loan, **dict(params, trigger="cancel")
+                    )
+            except Exception:
+                celery_logger.exception(
+                    "Failed to cancel the expired loan request {}.".format(
+                        loan["pid"]
+                    )
+                )
+                failed += 1
+        db.session.commit()
+
+    cancelled_loans = [change["loan"] for change in cancelled]
+    for _, success, errors in bulk_index_records(
+        cancelled_loans, record_indexer=current_circulation.loan_indexer()
+    ):
+        if errors:
+            celery_logger.warning(
+                "Failed to index {} cancelled loans: {}".format(
+                    len(errors), errors
+                )
+            )
+    with loan_notifications_batch():
+        for change in cancelled:
+            loan_state_changed.send(
+                change["transition"],
+                initial_loan=change["initial_loan"],
+                loan=change["loan"],
+                trigger="cancel",
+            )
+    schedule_loans_referenced_records(cancelled_loans)
+    return len(cancelled), failed
+
+
 @shared_task
 def cancel_expired_loan_requests():
-    """Cancel loan requests after expiration date has passed."""
-    expired_loans = get_all_expired_loans().execute()
-    for hit in expired_loans.hits:
-        loan = Loan.get_record_by_pid(hit.pid)
-        duration_days = current_app.config[
-            "ILS_CIRCULATION_LOAN_REQUEST_DURATION_DAYS"
-        ]
-        params = deepcopy(loan)
-        system_agent_id = str(SystemAgent.id)
-        params.update(
-            dict(
-                cancel_reason="The loan request has been automatically cancelled because {} days have passed.".format(
-                    duration_days
-                ),
-                transaction_user_pid=system_agent_id,
-            )
-        )
-        current_circulation.circulation.trigger(
-            loan, **dict(params, trigger="cancel")
+    """Cancel loan requests after expiration date has passed.
+
+    All the expired loan requests are streamed and cancelled in chunks of
+    `ILS_CIRCULATION_EXPIRED_LOAN_REQUESTS_CHUNK_SIZE`, each one committed in
+    a single transaction and bulk indexed. The referenced documents and items
+    of each chunk are indexed once, by a single task.
+
+    :returns: the number of cancelled and of failed loan requests.
+    """
+    chunk_size = current_app.config[
+        "ILS_CIRCULATION_EXPIRED_LOAN_REQUESTS_CHUNK_SIZE"
+    ]
+    search = get_all_expired_loans().source(includes=["pid"])
+    pids = (hit["pid"] for hit in search.scan())
+    total_cancelled = total_failed = 0
+    for chunk in chunks(pids, chunk_size):
+        loans = IlsRecord.get_records_by_pids(
+            chunk, pid_type=CIRCULATION_LOAN_PID_TYPE
         )
+        cancelled, failed = _cancel_expired_loan_requests_chunk(loans)
+        total_cancelled += cancelled
+        total_failed += failed
 
-        loan.commit()
-        db.session.commit()
-        current_circulation.loan_indexer().index(loan)
+    celery_logger.info(
+        "Cancelled {} expired loan requests, {} failed.".format(
+            total_cancelled, total_failed
+        )
+    )
+    return total_cancelled, total_failed
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""ILS circulation transitions."""
+
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+from invenio_circulation.transitions.transitions import ToCancelled
+
+
+@contextmanager
+def deferred_transitions():
+    """Defer the end of the transitions triggered in the block.
+
+    The loans changed by deferrable transitions are only committed to the
+    session: the caller commits the transaction, then indexes the loans and
+    sends the `loan_state_changed` signals of the yielded list of dicts with
+    `transition`, `initial_loan` and `loan` keys.
+    """
+    deferred = g.ils_deferred_transitions = []
+    try:
+        yield deferred
+    finally:
+        g.pop("ils_deferred_transitions", None)
+
+
+class DeferrableTransitionMixin(object):
+    """Transition whose end can be deferred with `deferred_transitions`."""
+
+    def after(self, loan, initial_loan):
+        """Commit record and index, unless deferred."""
+        deferred = g.get("ils_deferred_transitions") \
+            if has_app_context() else None
+        if deferred is None:
+            return super().after(loan, initial_loan)
+
+        initial_loan.date_fields2str()
+        loan.date_fields2str()
+        loan.commit()
+        deferred.append(
+            dict(transition=self, initial_loan=initial_loan, loan=loan)
+        )
+
+
+class DeferrableToCancelled(DeferrableTransitionMixin, ToCancelled):
+    """Cancel transition, deferrable when cancelling loans in bulk."""
@@ -103,20 +103,29 @@ def circulation_transaction_user_validator(transaction_user_pid):
         return True
 
 
-def resolve_item_from_loan(item_pid):
-    """Resolve the item referenced in loan based on its PID type."""
+def get_loan_item_record_class(item_pid):
+    """Return the class of the item referenced in loan based on its PID type.
+
+    :raises UnknownItemPidTypeError: if the item is not an Item or a
+        BorrowingRequest.
+    """
     from invenio_app_ils.ill.api import BORROWING_REQUEST_PID_TYPE
     from invenio_app_ils.ill.proxies import current_ils_ill
     from invenio_app_ils.items.api import ITEM_PID_TYPE
     from invenio_app_ils.proxies import current_app_ils
 
     if item_pid["type"] == ITEM_PID_TYPE:
-        rec_cls = current_app_ils.item_record_cls
+        return current_app_ils.item_record_cls
     elif item_pid["type"] == BORROWING_REQUEST_PID_TYPE:
-        rec_cls = current_ils_ill.borrowing_request_record_cls
+        return current_ils_ill.borrowing_request_record_cls
     else:
         from invenio_app_ils.errors import UnknownItemPidTypeError
         raise UnknownItemPidTypeError(pid_type=item_pid["type"])
+
+
+def resolve_item_from_loan(item_pid):
+    """Resolve the item referenced in loan based on its PID type."""
+    rec_cls = get_loan_item_record_class(item_pid)
     return rec_cls.get_record_by_pid(item_pid["value"])
 
 
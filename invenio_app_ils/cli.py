@@ -8,9 +8,11 @@
 """CLI for Invenio App ILS."""
 
 import json
+import multiprocessing
 import os
 import random
 import re
+import time
 from datetime import datetime, timedelta
 from random import randint
 
@@ -18,7 +20,7 @@ import arrow
 import click
 import lorem
 from flask import current_app
-from flask.cli import with_appcontext
+from flask.cli import ScriptInfo, with_appcontext
 from invenio_accounts.models import User
 from invenio_circulation.api import Loan
 from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
@@ -30,6 +32,8 @@ from invenio_pidstore.providers.recordid_v2 import RecordIdProviderV2
 from invenio_search import current_search
 from invenio_userprofiles.models import UserProfile
 from lorem.text import TextLorem
+from sqlalchemy import func
+from werkzeug.utils import import_string
 
 from .acquisition.api import ORDER_PID_TYPE, VENDOR_PID_TYPE, Order, Vendor
 from .document_requests.api import DOCUMENT_REQUEST_PID_TYPE, DocumentRequest
@@ -37,11 +41,13 @@ from .documents.api import DOCUMENT_PID_TYPE, Document
 from .eitems.api import EITEM_PID_TYPE, EItem
 from .ill.api import BORROWING_REQUEST_PID_TYPE, LIBRARY_PID_TYPE, \
     BorrowingRequest, Library
+from .indexer import bulk_index_records, chunks
 from .internal_locations.api import INTERNAL_LOCATION_PID_TYPE, \
     InternalLocation
 from .items.api import ITEM_PID_TYPE, Item
 from .locations.api import LOCATION_PID_TYPE, Location
-from .patrons.indexer import PatronIndexer
+from .patrons.api import PATRON_PID_TYPE, stream_patrons
+from .patrons.indexer import PatronIndexer, index_referenced_records
 from .proxies import current_app_ils
 from .records_relations.api import RecordRelationsParentChild, \
     RecordRelationsSiblings
@@ -1289,18 +1295,318 @@ def patrons():
 
 
 @patrons.command()
+@click.option(
+    "--chunk-size",
+    default=None,
+    type=int,
+    help="Number of patrons in each bulk request.",
+)
+@click.option(
+    "--with-referenced",
+    is_flag=True,
+    default=False,
+    help="Also reindex the records referencing each patron.",
+)
 @with_appcontext
-def index():
+def index(chunk_size, with_referenced):
     """Index patrons."""
-    patrons = User.query.all()
-    indexer = PatronIndexer()
+    click.secho(
+        "Now indexing {0} patrons".format(User.query.count()), fg="green"
+    )
+
+    def _schedule_referenced(patrons):
+        """Schedule the indexing of the records referencing each patron."""
+        scheduler = current_app_ils.referenced_records_scheduler
+        for patron in patrons:
+            scheduler.schedule(
+                index_referenced_records, PATRON_PID_TYPE, patron
+            )
+            yield patron
 
-    click.secho("Now indexing {0} patrons".format(len(patrons)), fg="green")
+    patrons = stream_patrons(chunk_size=chunk_size)
+    if with_referenced:
+        patrons = _schedule_referenced(patrons)
+
+    indexed = failed = 0
+    for _, success, errors in bulk_index_records(
+        patrons, record_indexer=PatronIndexer(), chunk_size=chunk_size
+    ):
+        indexed += success
+        failed += len(errors)
+    click.secho(
+        "Indexed {0} patrons, {1} failed".format(indexed, failed),
+        fg="red" if failed else "green",
+    )
+
+
+REBUILD_INDEX_PID_TYPES = [
+    LOCATION_PID_TYPE,
+    INTERNAL_LOCATION_PID_TYPE,
+    VENDOR_PID_TYPE,
+    LIBRARY_PID_TYPE,
+    PATRON_PID_TYPE,
+    SERIES_PID_TYPE,
+    CIRCULATION_LOAN_PID_TYPE,
+    DOCUMENT_REQUEST_PID_TYPE,
+    BORROWING_REQUEST_PID_TYPE,
+    ITEM_PID_TYPE,
+    EITEM_PID_TYPE,
+    ORDER_PID_TYPE,
+    DOCUMENT_PID_TYPE,
+]
+"""PID types rebuilt by `indices rebuild`, in indexing order.
+
+Items embed the loans, and documents embed the loans and the items, searching
+their indices: they are indexed after them.
+"""
+
+
+def rebuild_index_partitions(pid_type, partition_size):
+    """Split the records of the given pid type in ranges of IDs.
+
+    Records are partitioned on the ID of their persistent identifier, while
+    patrons are partitioned on the ID of their user.
+
+    :returns: a list of (first ID, last ID) tuples.
+    """
+    if pid_type == PATRON_PID_TYPE:
+        query = db.session.query(func.min(User.id), func.max(User.id))
+    else:
+        query = db.session.query(
+            func.min(PersistentIdentifier.id),
+            func.max(PersistentIdentifier.id),
+        ).filter_by(
+            pid_type=pid_type,
+            object_type="rec",
+            status=PIDStatus.REGISTERED,
+        )
+    min_id, max_id = query.one()
+    if min_id is None:
+        return []
+    return [
+        (first, min(first + partition_size - 1, max_id))
+        for first in range(min_id, max_id + 1, partition_size)
+    ]
 
-    Patron = current_app_ils.patron_cls
-    for pat in patrons:
-        patron = Patron(pat.id)
-        indexer.index(patron)
+
+def _rebuild_index_records(pid_type, first, last, chunk_size):
+    """Return a generator of the records of a partition."""
+    if pid_type == PATRON_PID_TYPE:
+        users = User.query.filter(User.id.between(first, last))
+        return stream_patrons(users, chunk_size=chunk_size)
+
+    record_cls = current_app_ils.record_class_by_pid_type(pid_type)
+    pids = PersistentIdentifier.query.filter(
+        PersistentIdentifier.pid_type == pid_type,
+        PersistentIdentifier.object_type == "rec",
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+        PersistentIdentifier.id.between(first, last),
+    )
+    uuids = [uuid for (uuid,) in pids.with_entities(
+        PersistentIdentifier.object_uuid
+    )]
+    return (
+        record
+        for chunk in chunks(uuids, chunk_size)
+        for record in record_cls.get_records(chunk)
+    )
+
+
+def rebuild_index_partition(partition):
+    """Bulk index the records of a partition.
+
+    :param partition: a (pid type, first ID, last ID, chunk size) tuple.
+    :returns: the partition with the number of indexed and failed records.
+    """
+    pid_type, first, last, chunk_size = partition
+    chunk_size = (
+        chunk_size or current_app.config["ILS_INDEXER_BULK_CHUNK_SIZE"]
+    )
+    records = _rebuild_index_records(pid_type, first, last, chunk_size)
+    record_indexer = current_app_ils.indexer_by_pid_type(pid_type)
+    success = failed = 0
+    for _, chunk_success, errors in bulk_index_records(
+        records, record_indexer=record_indexer, chunk_size=chunk_size
+    ):
+        success += chunk_success
+        failed += len(errors)
+    db.session.remove()
+    return pid_type, first, last, success, failed
+
+
+def _rebuild_index_worker_init(app_factory=None):
+    """Create the application of a rebuild worker process.
+
+    :param app_factory: the import path of the application factory. When not
+        given, the application is loaded from `FLASK_APP`.
+    """
+    if app_factory:
+        app = import_string(app_factory)()
+    else:
+        app = ScriptInfo(app_import_path=os.environ["FLASK_APP"]).load_app()
+    app.app_context().push()
+
+
+def _load_rebuild_checkpoint(path, partition_size):
+    """Return the partitions already indexed, stored in the checkpoint.
+
+    The partitions depend on their size, so the rebuild can only be resumed
+    with the size of the checkpoint.
+    """
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, "r") as fp:
+        checkpoint = json.load(fp)
+    if checkpoint.get("partition_size") != partition_size:
+        raise click.BadParameter(
+            "The checkpoint was created with a partition size of {0}.".format(
+                checkpoint.get("partition_size")
+            ),
+            param_hint="--partition-size",
+        )
+    return set(checkpoint["done"])
+
+
+def _save_rebuild_checkpoint(path, partition_size, done):
+    """Store the partitions already indexed in the checkpoint."""
+    tmp_path = "{}.tmp".format(path)
+    with open(tmp_path, "w") as fp:
+        json.dump(dict(partition_size=partition_size, done=sorted(done)), fp)
+    os.replace(tmp_path, path)
+
+
+@click.group()
+def indices():
+    """ILS indices CLI."""
+
+
+@indices.command("rebuild")
+@click.option(
+    "--pid-type",
+    "-t",
+    "pid_types",
+    multiple=True,
+    type=click.Choice(REBUILD_INDEX_PID_TYPES),
+    help="PID type to reindex. Default: all.",
+)
+@click.option(
+    "--processes",
+    "-p",
+    default=os.cpu_count(),
+    type=int,
+    help="Number of indexing processes.",
+)
+@click.option(
+    "--partition-size",
+    default=10000,
+    type=int,
+    help="Size of the ID ranges indexed by each process.",
+)
+@click.option(
+    "--chunk-size",
+    default=None,
+    type=int,
+    help="Number of records in each bulk request.",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    help="File storing the progress. If it exists, the rebuild resumes.",
+)
+@click.option(
+    "--app-factory",
+    default=None,
+    help="Import path of the application factory of the indexing processes."
+    " Default: the FLASK_APP application if set, else the ils one.",
+)
+@with_appcontext
+def rebuild_index(pid_types, processes, partition_size, chunk_size,
+                  checkpoint, app_factory):
+    """Reindex all ILS records with parallel bulk indexing.
+
+    The records are indexed one PID type after the other, and the indices
+    refreshed in between, so that the records built from searches, e.g. the
+    circulation of the documents, see the records indexed before.
+    """
+    pid_types = [t for t in REBUILD_INDEX_PID_TYPES if t in pid_types] or \
+        REBUILD_INDEX_PID_TYPES
+    done = _load_rebuild_checkpoint(checkpoint, partition_size)
+    if done:
+        click.secho(
+            "Resuming from {0} indexed partitions".format(len(done)),
+            fg="yellow",
+        )
+
+    total_failed = 0
+    pool = None
+    if processes > 1:
+        if not app_factory and not os.environ.get("FLASK_APP"):
+            app_factory = "invenio_app.factory:create_app"
+        ctx = multiprocessing.get_context("spawn")
+        pool = ctx.Pool(
+            processes,
+            initializer=_rebuild_index_worker_init,
+            initargs=(app_factory,),
+        )
+    try:
+        for pid_type in pid_types:
+            partitions = [
+                (pid_type, first, last, chunk_size)
+                for first, last in rebuild_index_partitions(
+                    pid_type, partition_size
+                )
+                if "{0}:{1}-{2}".format(pid_type, first, last) not in done
+            ]
+            click.secho(
+                "Indexing {0} ({1} partitions)...".format(
+                    pid_type, len(partitions)
+                ),
+                fg="green",
+            )
+            start = time.time()
+            indexed = failed = 0
+            results = (
+                pool.imap_unordered(rebuild_index_partition, partitions)
+                if pool
+                else map(rebuild_index_partition, partitions)
+            )
+            for _, first, last, success, errors in results:
+                indexed += success
+                failed += errors
+                if checkpoint and not errors:
+                    # partitions with failures are indexed again on resume
+                    done.add("{0}:{1}-{2}".format(pid_type, first, last))
+                    _save_rebuild_checkpoint(checkpoint, partition_size, done)
+            total_failed += failed
+            current_search.flush_and_refresh(index="*")
+
+            elapsed = time.time() - start
+            click.secho(
+                "Indexed {0} {1} in {2:.1f}s ({3:.1f} docs/sec), "
+                "{4} failed".format(
+                    indexed,
+                    pid_type,
+                    elapsed,
+                    indexed / elapsed if elapsed else 0,
+                    failed,
+                ),
+                fg="red" if failed else "green",
+            )
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    if total_failed:
+        if checkpoint:
+            click.secho(
+                "{0} records failed, run again with the same checkpoint to "
+                "retry them".format(total_failed),
+                fg="red",
+            )
+    elif checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.secho("Rebuild finished", fg="blue")
 
 
 def create_userprofile_for(email, username, full_name):
@@ -127,6 +127,10 @@ MAIL_NOTIFY_BCC = []
 ILS_MAIL_ENABLE_TEST_RECIPIENTS = False
 #: When ILS_MAIL_ENABLE_TEST_RECIPIENTS=True, all emails are sent here
 ILS_MAIL_NOTIFY_TEST_RECIPIENTS = ["onlyme@inveniosoftware.org"]
+#: Maximum number of emails sent by each task, over one SMTP connection
+ILS_MAIL_BATCH_SIZE = 100
+#: Maximum number of emails sent per second by each worker, not limited if None
+ILS_MAIL_RATE_LIMIT = None
 
 #: Document request message creator class
 ILS_DOCUMENT_REQUEST_MAIL_MSG_CREATOR = "invenio_app_ils.document_requests.mail.factory:default_document_request_message_creator"
@@ -181,6 +185,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "invenio_app_ils.circulation.mail.tasks.send_overdue_loans_mail_reminder",
         "schedule": timedelta(days=1),
     },
+    "reconcile_documents_circulation": {
+        "task": "invenio_app_ils.documents.tasks.reconcile_documents_circulation",
+        "schedule": timedelta(hours=1),
+    },
     "stats-process-events": {
         "task": "invenio_stats.tasks.process_events",
         "schedule": timedelta(minutes=30),
@@ -848,6 +856,53 @@ ILS_VIEWS_PERMISSIONS_FACTORY = views_permissions_factory
 ILS_INDEXER_TASK_DELAY = timedelta(seconds=5)
 """Time delay that indexers spawning their asynchronous celery tasks."""
 
+ILS_INDEXER_COALESCE_CASCADES = True
+"""Merge the referenced records indexing of a record in the queued task."""
+
+ILS_INDEXER_PENDING_CASCADES_STORE = (
+    "invenio_app_ils.indexer:LocalPendingCascadesStore"
+)
+"""Store of the queued referenced records indexing tasks."""
+
+ILS_INDEXER_BULK_CHUNK_SIZE = 500
+"""Number of referenced records sent to Elasticsearch in each bulk request."""
+
+ILS_RECORDS_BULK_LOAD_CHUNK_SIZE = 1000
+"""Number of records fetched from the database with each bulk query."""
+
+ILS_PATRONS_CACHE_TTL = None
+"""Seconds patrons are cached in each process. Disabled when not set.
+
+Patrons are always cached for the duration of a request. Changes of users and
+profiles only invalidate the cache of the process where they happen.
+"""
+
+ILS_PATRONS_CACHE_MAXSIZE = 10000
+"""Maximum number of patrons cached in each process."""
+
+ILS_LOCATIONS_DIRECTORY_TTL = 300
+"""Seconds the locations directory is kept in each process. Disabled when not
+set.
+
+Changes of locations and internal locations reload the directory of the
+process where they happen only.
+"""
+
+ILS_DOCUMENT_ITEMS_MAX_HITS = None
+"""Maximum number of items embedded in each document. All when not set.
+
+When set, the totals by location are aggregated and the embedded items have a
+`more` flag telling if some items of the document are not embedded.
+"""
+
+ILS_DOCUMENTS_CIRCULATION_STORE = None
+"""Store of the materialized documents circulation. Disabled when not set.
+
+E.g. `invenio_app_ils.documents.circulation:RedisDocumentsCirculationStore`.
+The store is updated on loans and items changes, and rebuilt periodically by
+the `reconcile_documents_circulation` task.
+"""
+
 # Accounts REST
 # ==============
 ACCOUNTS_REST_READ_USER_PROPERTIES_PERMISSION_FACTORY = backoffice_permission
@@ -7,10 +7,7 @@
 
 """DocumentRequest indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
 from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
@@ -21,8 +18,12 @@ from .api import DOCUMENT_REQUEST_PID_TYPE
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(docreq):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    docreq = scheduler.started(pid_type, pid_value, revision_id)
+    if docreq is None:
+        return
     indexer = ReferencedRecordsIndexer()
     indexed = dict(pid_type=DOCUMENT_REQUEST_PID_TYPE, record=docreq)
 
@@ -35,6 +36,7 @@ def index_referenced_records(docreq):
         referenced.append(dict(pid_type=DOCUMENT_PID_TYPE, record=document))
 
     indexer.index(indexed, referenced)
+    scheduler.processed(pid_type, docreq)
 
 
 class DocumentRequestIndexer(RecordIndexer):
@@ -43,5 +45,6 @@ class DocumentRequestIndexer(RecordIndexer):
     def index(self, docreq, arguments=None, **kwargs):
         """Index a DocumentRequest."""
         super().index(docreq)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((docreq,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, DOCUMENT_REQUEST_PID_TYPE, docreq
+        )
@@ -11,6 +11,7 @@ import jsonresolver
 from werkzeug.routing import Rule
 
 from invenio_app_ils.documents.api import Document
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default
@@ -29,7 +30,7 @@ def jsonresolver_loader(url_map):
     @get_pid_or_default(default_value=dict())
     def get_document(document_pid):
         """Return the Document record."""
-        document = Document.get_record_by_pid(document_pid)
+        document = get_cached_record(Document, document_pid)
         authors = []
         for author in document.get("authors", []):
             if "full_name" in author:
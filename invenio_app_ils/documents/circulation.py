@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Documents circulation summary."""
+
+import json
+import threading
+from collections import defaultdict
+from copy import deepcopy
+from datetime import datetime
+
+from elasticsearch_dsl import A, MultiSearch, Q
+from flask import current_app
+from invenio_circulation.proxies import current_circulation
+from invenio_search import current_search_client
+
+from invenio_app_ils.proxies import current_app_ils
+
+
+def _loans_summary_search(document_pids):
+    """Return the search aggregating the loans of each document by state."""
+    active_states = current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"]
+    completed_states = current_app.config["CIRCULATION_STATES_LOAN_COMPLETED"]
+    is_active = Q("terms", state=active_states)
+
+    states = A(
+        "filters",
+        filters=dict(
+            past=Q("terms", state=completed_states),
+            active=is_active,
+            pending=Q("terms", state=["PENDING"]),
+            overdue=is_active & Q("range", end_date=dict(lt="now/d")),
+        ),
+    )
+    next_available = A("filter", is_active).metric(
+        "first",
+        "top_hits",
+        size=1,
+        sort=[{"end_date": {"order": "asc"}}],
+        _source=["end_date"],
+    )
+    documents = A("terms", field="document_pid", size=len(document_pids))
+    documents.bucket("states", states)
+    documents.bucket("next_available", next_available)
+
+    search = current_circulation.loan_search_cls().filter(
+        "terms", document_pid=document_pids
+    )[:0]
+    search.aggs.bucket("documents", documents)
+    return search
+
+
+def _items_summary_search(document_pids):
+    """Return the search aggregating the items of each document by status."""
+    statuses = A(
+        "filters",
+        filters=dict(
+            unavailable=~Q("terms", status=["CAN_CIRCULATE"]),
+            reference_only=Q("terms", status=["FOR_REFERENCE_ONLY"]),
+        ),
+    )
+    documents = A("terms", field="document_pid", size=len(document_pids))
+    documents.bucket("statuses", statuses)
+
+    search = current_app_ils.item_search_cls().filter(
+        "terms", document_pid=document_pids
+    )[:0]
+    search.aggs.bucket("documents", documents)
+    return search
+
+
+def _buckets_by_document(response):
+    """Return the aggregation buckets of the response by document pid."""
+    aggregations = response.to_dict()["aggregations"]
+    return {b["key"]: b for b in aggregations["documents"]["buckets"]}
+
+
+def _aggregated_counts(loans, items):
+    """Return the counts and next available date of a document's buckets."""
+    loans_states = loans["states"]["buckets"] if loans else {}
+    items_statuses = items["statuses"]["buckets"] if items else {}
+
+    def _count(buckets, name):
+        return buckets[name]["doc_count"] if name in buckets else 0
+
+    counts = dict(
+        past=_count(loans_states, "past"),
+        active=_count(loans_states, "active"),
+        pending=_count(loans_states, "pending"),
+        overdue=_count(loans_states, "overdue"),
+        items=items["doc_count"] if items else 0,
+        unavailable=_count(items_statuses, "unavailable"),
+        reference_only=_count(items_statuses, "reference_only"),
+    )
+    next_available_date = None
+    first_hits = (
+        loans["next_available"]["first"]["hits"]["hits"] if loans else []
+    )
+    if first_hits and "end_date" in first_hits[0]["_source"]:
+        next_available_date = first_hits[0]["_source"]["end_date"]
+    return counts, next_available_date
+
+
+def _materialized_counts(circulation):
+    """Return the counts and next available date of a stored circulation."""
+    active_states = current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"]
+    loans = circulation["loans"].values()
+    statuses = list(circulation["items"].values())
+    end_dates = [
+        loan.get("end_date") or ""
+        for loan in loans
+        if loan["state"] in active_states
+    ]
+    today = datetime.utcnow().date().isoformat()
+
+    counts = dict(
+        past=circulation["past_loans_count"],
+        active=len(end_dates),
+        pending=sum(1 for loan in loans if loan["state"] == "PENDING"),
+        overdue=sum(1 for end_date in end_dates if "" < end_date[:10] < today),
+        items=len(statuses),
+        unavailable=sum(1 for s in statuses if s != "CAN_CIRCULATE"),
+        reference_only=statuses.count("FOR_REFERENCE_ONLY"),
+    )
+    end_dates = [end_date for end_date in end_dates if end_date]
+    return counts, min(end_dates) if end_dates else None
+
+
+def _circulation_summary(counts, next_available_date):
+    """Build the circulation summary of a document from its counts."""
+    has_items_for_loan = (
+        counts["items"] - counts["active"] - counts["unavailable"]
+    )
+
+    circulation = {
+        "active_loans": counts["active"],
+        "can_circulate_items_count": counts["items"] - counts["unavailable"],
+        "has_items_for_loan": has_items_for_loan,
+        "overbooked": counts["pending"] > has_items_for_loan,
+        "overdue_loans": counts["overdue"],
+        "past_loans_count": counts["past"],
+        "pending_loans": counts["pending"],
+        "has_items_on_site": counts["reference_only"],
+    }
+
+    if (
+        circulation["overbooked"]
+        or circulation["active_loans"] >= circulation["has_items_for_loan"]
+    ):
+        if next_available_date:
+            circulation["next_available_date"] = next_available_date
+    return circulation
+
+
+def get_documents_circulation(document_pids):
+    """Return the circulation summary of each of the given documents.
+
+    The summaries materialized in `ILS_DOCUMENTS_CIRCULATION_STORE` are read
+    from the store. The loans and the items of the other documents are
+    aggregated with a single multi search request.
+
+    :param document_pids: the pids of the documents.
+    :returns: a dict with the circulation summary of each document pid.
+    """
+    document_pids = list(dict.fromkeys(document_pids))
+    if not document_pids:
+        return {}
+
+    summaries = {}
+    store = current_app_ils.documents_circulation_store
+    if store is not None:
+        for pid, circulation in store.get_many(document_pids).items():
+            summaries[pid] = _circulation_summary(
+                *_materialized_counts(circulation)
+            )
+    missing_pids = [pid for pid in document_pids if pid not in summaries]
+    if not missing_pids:
+        return summaries
+
+    multi_search = (
+        MultiSearch(using=current_search_client)
+        .add(_loans_summary_search(missing_pids))
+        .add(_items_summary_search(missing_pids))
+    )
+    loans_response, items_response = multi_search.execute()
+    loans = _buckets_by_document(loans_response)
+    items = _buckets_by_document(items_response)
+    for pid in missing_pids:
+        summaries[pid] = _circulation_summary(
+            *_aggregated_counts(loans.get(pid), items.get(pid))
+        )
+    return summaries
+
+
+def _stored_loan_states():
+    """Return the states of the loans kept in the stored circulation."""
+    return current_app.config["CIRCULATION_STATES_LOAN_ACTIVE"] + ["PENDING"]
+
+
+def update_loan_circulation(initial_loan, loan):
+    """Update the stored circulation of the document of a changed loan.
+
+    :param initial_loan: the loan before the change of state.
+    :param loan: the loan after the change of state.
+    """
+    store = current_app_ils.documents_circulation_store
+    if store is None or not loan.get("document_pid"):
+        return
+
+    completed_states = current_app.config["CIRCULATION_STATES_LOAN_COMPLETED"]
+    state = loan["state"]
+    if state in _stored_loan_states():
+        store.set_loan(
+            loan["document_pid"], loan["pid"], state, loan.get("end_date")
+        )
+    else:
+        completed = (
+            state in completed_states
+            and initial_loan.get("state") not in completed_states
+        )
+        store.remove_loan(
+            loan["document_pid"], loan["pid"], completed=completed
+        )
+
+
+def update_item_circulation(item, deleted=False):
+    """Update the stored circulation of the document of a changed item.
+
+    :param item: the changed item.
+    :param deleted: True if the item has been deleted.
+    """
+    store = current_app_ils.documents_circulation_store
+    if store is None:
+        return
+    if deleted:
+        store.remove_item(item["pid"])
+    else:
+        store.set_item(item["document_pid"], item["pid"], item["status"])
+
+
+def materialize_documents_circulation(document_pids):
+    """Rebuild the stored circulation of the given documents.
+
+    The active and pending loans, the items and the number of past loans of
+    the documents are fetched from the search indices. Documents changed
+    while they are fetched are left as they are, to not lose the change: the
+    next rebuild will pick them up.
+
+    :param document_pids: the pids of the documents.
+    :returns: the pids of the documents whose stored circulation differed.
+    """
+    store = current_app_ils.documents_circulation_store
+    document_pids = list(dict.fromkeys(document_pids))
+    if store is None or not document_pids:
+        return []
+
+    circulations = {
+        pid: dict(loans={}, items={}, past_loans_count=0)
+        for pid in document_pids
+    }
+    loan_search = current_circulation.loan_search_cls()
+    item_search = current_app_ils.item_search_cls()
+    # the changes stored before this point must be searchable
+    versions = store.get_versions(document_pids)
+    current_search_client.indices.refresh(
+        index=loan_search._index + item_search._index
+    )
+    loans = (
+        loan_search.filter("terms", document_pid=document_pids)
+        .filter("terms", state=_stored_loan_states())
+        .source(includes=["pid", "document_pid", "state", "end_date"])
+    )
+    for hit in loans.scan():
+        circulations[hit["document_pid"]]["loans"][hit["pid"]] = dict(
+            state=hit["state"], end_date=hit.to_dict().get("end_date")
+        )
+
+    items = (
+        item_search.filter("terms", document_pid=document_pids)
+        .source(includes=["pid", "document_pid", "status"])
+    )
+    for hit in items.scan():
+        circulations[hit["document_pid"]]["items"][hit["pid"]] = hit["status"]
+
+    completed_states = current_app.config["CIRCULATION_STATES_LOAN_COMPLETED"]
+    past_loans = (
+        loan_search.filter("terms", document_pid=document_pids)
+        .filter("terms", state=completed_states)[:0]
+    )
+    past_loans.aggs.bucket(
+        "documents", "terms", field="document_pid", size=len(document_pids)
+    )
+    for pid, bucket in _buckets_by_document(past_loans.execute()).items():
+        circulations[pid]["past_loans_count"] = bucket["doc_count"]
+
+    stored = store.get_many(document_pids)
+    drifted = []
+    for pid, circulation in circulations.items():
+        if not store.replace(pid, circulation, version=versions[pid]):
+            continue
+        if pid in stored and stored[pid] != circulation:
+            drifted.append(pid)
+    return drifted
+
+
+class LocalDocumentsCirculationStore(object):
+    """In-memory store of the materialized documents circulation.
+
+    The circulation of a document is kept as its active and pending loans,
+    its items statuses and its number of past loans. Changes only apply to
+    the documents materialized by `materialize_documents_circulation`.
+
+    Each change of a document increments its version, so that a rebuilt
+    circulation is only stored if the document did not change meanwhile.
+
+    It is only suitable for a single process, e.g. in tests: processes
+    sharing the materialized circulation need a shared store, such as
+    `RedisDocumentsCirculationStore`.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._documents = {}
+        self._item_documents = {}
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get_many(self, document_pids):
+        """Return the circulation of the materialized documents."""
+        with self._lock:
+            return {
+                pid: deepcopy(self._documents[pid])
+                for pid in document_pids
+                if pid in self._documents
+            }
+
+    def get_versions(self, document_pids):
+        """Return the current version of each of the documents."""
+        with self._lock:
+            return {pid: self._versions[pid] for pid in document_pids}
+
+    def set_loan(self, document_pid, loan_pid, state, end_date):
+        """Store an active or pending loan of the document."""
+        with self._lock:
+            self._versions[document_pid] += 1
+            if document_pid in self._documents:
+                self._documents[document_pid]["loans"][loan_pid] = dict(
+                    state=state, end_date=end_date
+                )
+
+    def remove_loan(self, document_pid, loan_pid, completed=False):
+        """Remove a loan of the document, counting it if completed."""
+        with self._lock:
+            self._versions[document_pid] += 1
+            circulation = self._documents.get(document_pid)
+            if circulation is not None:
+                circulation["loans"].pop(loan_pid, None)
+                if completed:
+                    circulation["past_loans_count"] += 1
+
+    def set_item(self, document_pid, item_pid, status):
+        """Store the status of an item, moved to the document if needed."""
+        with self._lock:
+            previous_pid = self._item_documents.get(item_pid)
+            if previous_pid is not None:
+                self._versions[previous_pid] += 1
+            if previous_pid in self._documents:
+                self._documents[previous_pid]["items"].pop(item_pid, None)
+            self._item_documents[item_pid] = document_pid
+            self._versions[document_pid] += 1
+            if document_pid in self._documents:
+                self._documents[document_pid]["items"][item_pid] = status
+
+    def remove_item(self, item_pid):
+        """Remove an item from its document."""
+        with self._lock:
+            document_pid = self._item_documents.pop(item_pid, None)
+            if document_pid is not None:
+                self._versions[document_pid] += 1
+            if document_pid in self._documents:
+                self._documents[document_pid]["items"].pop(item_pid, None)
+
+    def replace(self, document_pid, circulation, version=None):
+        """Store the whole circulation of the document.
+
+        :param version: the version of the document, as returned by
+            `get_versions` before its circulation was fetched. The
+            circulation is not stored if the document changed since.
+        :returns: True if the circulation has been stored.
+        """
+        with self._lock:
+            if version is not None and self._versions[document_pid] != version:
+                return False
+            self._versions[document_pid] += 1
+            self._documents[document_pid] = deepcopy(circulation)
+            for item_pid in circulation["items"]:
+                self._item_documents[item_pid] = document_pid
+            return True
+
+
+class RedisDocumentsCirculationStore(object):
+    """Redis store of the materialized documents circulation.
+
+    Each document has a hash of its loans, a hash of its items statuses and
+    a hash of counters, updated in constant time. The counters hold the
+    version of the document, incremented by each change, which a rebuilt
+    circulation is compared and set against. The Redis instance is the one
+    of `CACHE_REDIS_URL`.
+    """
+
+    prefix = "ils:documents_circulation"
+
+    def __init__(self):
+        """Constructor."""
+        import redis
+
+        self._redis = redis.StrictRedis.from_url(
+            current_app.config["CACHE_REDIS_URL"], decode_responses=True
+        )
+        self._item_documents_key = "{}:item_documents".format(self.prefix)
+
+    def _keys(self, document_pid):
+        """Return the keys of the loans, items and counters hashes."""
+        return [
+            "{}:{}:{}".format(self.prefix, document_pid, name)
+            for name in ("loans", "items", "counters")
+        ]
+
+    def get_many(self, document_pids):
+        """Return the circulation of the materialized documents."""
+        pipe = self._redis.pipeline(transaction=False)
+        for pid in document_pids:
+            for key in self._keys(pid):
+                pipe.hgetall(key)
+        results = iter(pipe.execute())
+
+        circulations = {}
+        for pid in document_pids:
+            loans, items = next(results), next(results)
+            counters = next(results)
+            if "materialized" not in counters:
+                continue
+            circulations[pid] = dict(
+                loans={k: json.loads(v) for k, v in loans.items()},
+                items=items,
+                past_loans_count=int(counters.get("past_loans_count", 0)),
+            )
+        return circulations
+
+    def get_versions(self, document_pids):
+        """Return the current version of each of the documents."""
+        pipe = self._redis.pipeline(transaction=False)
+        for pid in document_pids:
+            _, _, counters_key = self._keys(pid)
+            pipe.hget(counters_key, "version")
+        return {
+            pid: int(version or 0)
+            for pid, version in zip(document_pids, pipe.execute())
+        }
+
+    def set_loan(self, document_pid, loan_pid, state, end_date):
+        """Store an active or pending loan of the document."""
+        loans_key, _, counters_key = self._keys(document_pid)
+        loan = json.dumps(dict(state=state, end_date=end_date))
+        pipe = self._redis.pipeline()
+        pipe.hset(loans_key, loan_pid, loan)
+        pipe.hincrby(counters_key, "version", 1)
+        pipe.execute()
+
+    def remove_loan(self, document_pid, loan_pid, completed=False):
+        """Remove a loan of the document, counting it if completed."""
+        loans_key, _, counters_key = self._keys(document_pid)
+        pipe = self._redis.pipeline()
+        pipe.hdel(loans_key, loan_pid)
+        if completed:
+            pipe.hincrby(counters_key, "past_loans_count", 1)
+        pipe.hincrby(counters_key, "version", 1)
+        pipe.execute()
+
+    def set_item(self, document_pid, item_pid, status):
+        """Store the status of an item, moved to the document if needed."""
+        previous_pid = self._redis.hget(self._item_documents_key, item_pid)
+        pipe = self._redis.pipeline()
+        if previous_pid is not None and previous_pid != document_pid:
+            _, previous_items_key, previous_counters_key = self._keys(
+                previous_pid
+            )
+            pipe.hdel(previous_items_key, item_pid)
+            pipe.hincrby(previous_counters_key, "version", 1)
+        _, items_key, counters_key = self._keys(document_pid)
+        pipe.hset(items_key, item_pid, status)
+        pipe.hincrby(counters_key, "version", 1)
+        pipe.hset(self._item_documents_key, item_pid, document_pid)
+        pipe.execute()
+
+    def remove_item(self, item_pid):
+        """Remove an item from its document."""
+        document_pid = self._redis.hget(self._item_documents_key, item_pid)
+        pipe = self._redis.pipeline()
+        if document_pid is not None:
+            _, items_key, counters_key = self._keys(document_pid)
+            pipe.hdel(items_key, item_pid)
+            pipe.hincrby(counters_key, "version", 1)
+        pipe.hdel(self._item_documents_key, item_pid)
+        pipe.execute()
+
+    def replace(self, document_pid, circulation, version=None):
+        """Store the whole circulation of the document.
+
+        :param version: the version of the document, as returned by
+            `get_versions` before its circulation was fetched. The
+            circulation is not stored if the document changed since.
+        :returns: True if the circulation has been stored.
+        """
+        from redis.exceptions import WatchError
+
+        loans_key, items_key, counters_key = self._keys(document_pid)
+        loans = {
+            pid: json.dumps(loan) for pid, loan in circulation["loans"].items()
+        }
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(counters_key)
+                current = int(pipe.hget(counters_key, "version") or 0)
+                if version is not None and current != version:
+                    return False
+                pipe.multi()
+                pipe.delete(loans_key, items_key)
+                if loans:
+                    pipe.hset(loans_key, mapping=loans)
+                if circulation["items"]:
+                    pipe.hset(items_key, mapping=circulation["items"])
+                    pipe.hset(
+                        self._item_documents_key,
+                        mapping={
+                            pid: document_pid for pid in circulation["items"]
+                        },
+                    )
+                pipe.hset(
+                    counters_key,
+                    mapping=dict(
+                        materialized=1,
+                        past_loans_count=circulation["past_loans_count"],
+                    ),
+                )
+                pipe.hincrby(counters_key, "version", 1)
+                pipe.execute()
+            except WatchError:
+                return False
+        return True
@@ -7,12 +7,10 @@
 
 """ILS Document indexer APIs."""
 
-from datetime import datetime
+from itertools import chain
 
 from celery import shared_task
-from flask import current_app
 from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
-from invenio_circulation.proxies import current_circulation
 from invenio_circulation.search.api import search_by_pid as search_loans_by_pid
 from invenio_indexer.api import RecordIndexer
 
@@ -23,133 +21,194 @@ from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
 from invenio_app_ils.eitems.api import EITEM_PID_TYPE
 from invenio_app_ils.ill.api import BORROWING_REQUEST_PID_TYPE
 from invenio_app_ils.ill.proxies import current_ils_ill
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    related_referenced_records, search_referenced_records
 from invenio_app_ils.items.api import ITEM_PID_TYPE
 from invenio_app_ils.proxies import current_app_ils
-from invenio_app_ils.records.api import IlsRecord
+from invenio_app_ils.records_relations.api import RecordRelationsExtraMetadata
+
+RELATED_RECORDS = "relations"
+"""Key of the records related to the document in `REFERENCED_FIELDS`."""
+
+REFERENCED_FIELDS = {
+    CIRCULATION_LOAN_PID_TYPE: [
+        "authors",
+        "cover_metadata",
+        "document_type",
+        "edition",
+        "identifiers",
+        "open_access",
+        "pid",
+        "publication_year",
+        "title",
+    ],
+    ITEM_PID_TYPE: [
+        "authors",
+        "cover_metadata",
+        "edition",
+        "pid",
+        "publication_year",
+        "title",
+    ],
+    DOCUMENT_REQUEST_PID_TYPE: ["authors", "pid", "title"],
+    EITEM_PID_TYPE: [
+        "authors",
+        "cover_metadata",
+        "edition",
+        "pid",
+        "publication_year",
+        "title",
+    ],
+    RELATED_RECORDS: [
+        "document_type",
+        "edition",
+        "languages",
+        "mode_of_issuance",
+        "publication_year",
+        RecordRelationsExtraMetadata.field_name(),
+        "title",
+    ],
+    ORDER_PID_TYPE: ["cover_metadata", "pid", "title"],
+    BORROWING_REQUEST_PID_TYPE: [
+        "cover_metadata",
+        "edition",
+        "pid",
+        "publication_year",
+        "title",
+    ],
+}
+"""Document fields embedded in the referenced records, by pid type.
+
+When a document changes, only the referenced records embedding at least one
+of the changed fields are re-indexed.
+"""
+
+
+def get_changed_referenced_pid_types(document, processed_revision_id):
+    """Return the pid types of the referenced records to re-index.
+
+    The document is compared with the revision whose referenced records were
+    last indexed, so that the changes of all the revisions committed since
+    then are taken into account.
+
+    :param document: the document that has been indexed.
+    :param processed_revision_id: the revision of the document whose
+        referenced records were last indexed, None if unknown.
+    :returns: the sorted list of the pid types in `REFERENCED_FIELDS`
+        embedding a changed field, or None when the processed revision of the
+        document is not available and all referenced records must be indexed.
+    """
+    if processed_revision_id is None:
+        return None
+    if processed_revision_id == document.revision_id:
+        return []
+    try:
+        previous = document.revisions[processed_revision_id]
+    except (AttributeError, IndexError):
+        # record versioning disabled or revision not found
+        return None
+
+    return sorted(
+        pid_type
+        for pid_type, fields in REFERENCED_FIELDS.items()
+        if any(document.get(f) != previous.get(f) for f in fields)
+    )
 
 
 def get_items(document_pid):
     """Get referenced items."""
-    referenced = []
-    item_search_cls = current_app_ils.item_search_cls
-    item_record_cls = current_app_ils.item_record_cls
-    for item in (
-        item_search_cls()
-        .search_by_document_pid(document_pid=document_pid)
-        .scan()
-    ):
-        item = item_record_cls.get_record_by_pid(item["pid"])
-        referenced.append(dict(pid_type=ITEM_PID_TYPE, record=item))
-    return referenced
+    search = current_app_ils.item_search_cls().search_by_document_pid(
+        document_pid=document_pid
+    )
+    return search_referenced_records(ITEM_PID_TYPE, search)
 
 
 def get_eitems(document_pid):
     """Get referenced items."""
-    referenced = []
-    eitem_search_cls = current_app_ils.eitem_search_cls
-    eitem_record_cls = current_app_ils.eitem_record_cls
-    for eitem in (
-        eitem_search_cls()
-        .search_by_document_pid(document_pid=document_pid)
-        .scan()
-    ):
-        eitem = eitem_record_cls.get_record_by_pid(eitem["pid"])
-        referenced.append(dict(pid_type=EITEM_PID_TYPE, record=eitem))
-    return referenced
+    search = current_app_ils.eitem_search_cls().search_by_document_pid(
+        document_pid=document_pid
+    )
+    return search_referenced_records(EITEM_PID_TYPE, search)
 
 
 def get_related_records(document_pid):
     """Get referenced records via relations."""
-    referenced = []
     doc_record_cls = current_app_ils.document_record_cls
     record = doc_record_cls.get_record_by_pid(document_pid)
-    relations = record.relations
-    for relation_type, related_records in relations.items():
-        for obj in related_records:
-            rec = IlsRecord.get_record_by_pid(
-                obj["pid_value"], pid_type=obj["pid_type"]
-            )
-            referenced.append(dict(pid_type=obj["pid_type"], record=rec))
-    return referenced
+    return related_referenced_records(record)
 
 
 def get_document_requests(document_pid):
     """Get referenced documents requests."""
-    referenced = []
     docreq_search_cls = current_app_ils.document_request_search_cls
-    docreq_record_cls = current_app_ils.document_request_record_cls
-    for request in (
-        docreq_search_cls()
-        .search_by_document_pid(document_pid=document_pid)
-        .scan()
-    ):
-        docreq = docreq_record_cls.get_record_by_pid(request["pid"])
-        referenced.append(
-            dict(pid_type=DOCUMENT_REQUEST_PID_TYPE, record=docreq)
-        )
-    return referenced
+    search = docreq_search_cls().search_by_document_pid(
+        document_pid=document_pid
+    )
+    return search_referenced_records(DOCUMENT_REQUEST_PID_TYPE, search)
 
 
 def get_loans(document_pid):
     """Get referenced loans."""
-    referenced = []
-    loan_record_cls = current_circulation.loan_record_cls
-    for loan in search_loans_by_pid(document_pid=document_pid).scan():
-        loan = loan_record_cls.get_record_by_pid(loan["pid"])
-        referenced.append(
-            dict(pid_type=CIRCULATION_LOAN_PID_TYPE, record=loan)
-        )
-    return referenced
+    search = search_loans_by_pid(document_pid=document_pid)
+    return search_referenced_records(CIRCULATION_LOAN_PID_TYPE, search)
 
 
 def get_acquisition_orders(document_pid):
     """Get referenced acquisition orders."""
-    referenced = []
-    order_record_cls = current_ils_acq.order_record_cls
     order_search_cls = current_ils_acq.order_search_cls
     search = order_search_cls().search_by_document_pid(document_pid)
-    for hit in search.scan():
-        order = order_record_cls.get_record_by_pid(hit["pid"])
-        referenced.append(
-            dict(pid_type=ORDER_PID_TYPE, record=order)
-        )
-    return referenced
+    return search_referenced_records(ORDER_PID_TYPE, search)
 
 
 def get_ill_borrowing_requests(document_pid):
     """Get referenced ILL borrowing requests."""
-    referenced = []
-    brw_req_record_cls = current_ils_ill.borrowing_request_record_cls
     brw_req_search_cls = current_ils_ill.borrowing_request_search_cls
     search = brw_req_search_cls().search_by_document_pid(document_pid)
-    for hit in search.scan():
-        brw_req = brw_req_record_cls.get_record_by_pid(hit["pid"])
-        referenced.append(
-            dict(pid_type=BORROWING_REQUEST_PID_TYPE, record=brw_req)
-        )
-    return referenced
+    return search_referenced_records(BORROWING_REQUEST_PID_TYPE, search)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(document):
-    """Index referenced records."""
+def index_referenced_records(pid_type, pid_value, revision_id):
+    """Index referenced records.
+
+    Only the referenced records embedding fields changed since the revision
+    last processed are indexed, or all of them when it is unknown.
+
+    :param pid_type: the pid type of the document that has been indexed.
+    :param pid_value: the pid value of the document.
+    :param revision_id: the revision of the document that has been indexed.
+    """
+    scheduler = current_app_ils.referenced_records_scheduler
+    document = scheduler.started(pid_type, pid_value, revision_id)
+    if document is None:
+        return
+    pid_types = get_changed_referenced_pid_types(
+        document, scheduler.processed_revision_id(pid_type, document)
+    )
     indexer = ReferencedRecordsIndexer()
 
     document_pid = document["pid"]
     indexed = dict(pid_type=DOCUMENT_PID_TYPE, record=document)
 
     # keep loans and items as first
-    # Note: this can be quite inefficient because it potentially retrieves
-    # a lot of records. Might be a place where performance can be improved
-    # (bulk indexing, less DB queries, etc...)
-    indexer.index(indexed, get_loans(document_pid))
-    indexer.index(indexed, get_items(document_pid))
-    indexer.index(indexed, get_document_requests(document_pid))
-    indexer.index(indexed, get_eitems(document_pid))
-    indexer.index(indexed, get_related_records(document_pid))
-    indexer.index(indexed, get_acquisition_orders(document_pid))
-    indexer.index(indexed, get_ill_borrowing_requests(document_pid))
+    getters = [
+        (CIRCULATION_LOAN_PID_TYPE, get_loans),
+        (ITEM_PID_TYPE, get_items),
+        (DOCUMENT_REQUEST_PID_TYPE, get_document_requests),
+        (EITEM_PID_TYPE, get_eitems),
+        (RELATED_RECORDS, get_related_records),
+        (ORDER_PID_TYPE, get_acquisition_orders),
+        (BORROWING_REQUEST_PID_TYPE, get_ill_borrowing_requests),
+    ]
+    indexer.index(
+        indexed,
+        chain.from_iterable(
+            getter(document_pid)
+            for referenced_type, getter in getters
+            if pid_types is None or referenced_type in pid_types
+        ),
+    )
+    scheduler.processed(pid_type, document)
 
 
 class DocumentIndexer(RecordIndexer):
@@ -158,5 +217,14 @@ class DocumentIndexer(RecordIndexer):
     def index(self, document, arguments=None, **kwargs):
         """Index a Document."""
         super().index(document)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((document,), eta=eta)
+        scheduler = current_app_ils.referenced_records_scheduler
+        pid_types = get_changed_referenced_pid_types(
+            document,
+            scheduler.processed_revision_id(DOCUMENT_PID_TYPE, document),
+        )
+        if pid_types == []:
+            # no embedded field changed since the last processed revision
+            return
+        scheduler.schedule(
+            index_referenced_records, DOCUMENT_PID_TYPE, document
+        )
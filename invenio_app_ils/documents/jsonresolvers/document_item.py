@@ -8,10 +8,156 @@
 """Resolve the Item referenced in the Document."""
 
 import jsonresolver
+from elasticsearch import VERSION as ES_VERSION
+from elasticsearch_dsl import A
 from werkzeug.routing import Rule
 
 from invenio_app_ils.proxies import current_app_ils
 
+lt_es7 = ES_VERSION[0] < 7
+
+ITEM_SOURCE_FIELDS = [
+    "barcode",
+    "circulation.state",
+    "circulation_restriction",
+    "internal_location.location.name",
+    "internal_location.name",
+    "internal_location_pid",
+    "isbn",
+    "medium",
+    "pid",
+    "shelf",
+    "status",
+]
+"""Item fields needed to build the embedded items."""
+
+LOCATIONS_PAGE_SIZE = 100
+"""Number of location groups aggregated with each request."""
+
+
+def item_to_obj(item):
+    """Return the representation of an item embedded in the document."""
+    circulation = item.get("circulation", {})
+    obj = {
+        "pid": item.get("pid"),
+        "isbn": item.get("isbn"),
+        "internal_location_pid": item.get("internal_location_pid"),
+        "circulation_restriction": item.get("circulation_restriction"),
+        "barcode": item.get("barcode"),
+        "medium": item.get("medium"),
+        "status": item.get("status"),
+        "shelf": item.get("shelf"),
+        "internal_location": {
+            "name": item.get("internal_location", {}).get("name", ""),
+            "location": {
+                "name": item.get("internal_location", {})
+                .get("location", {})
+                .get("name", "")
+            },
+        },
+    }
+    if circulation:
+        include_circulation_keys = ["state"]
+        obj["circulation"] = {}
+        for key in include_circulation_keys:
+            obj["circulation"][key] = circulation.get(key)
+    return obj
+
+
+def group_by_location(by_location, obj):
+    """Add the item to the group of its location and internal location."""
+    location_name = obj["internal_location"]["location"]["name"]
+    internal_location_name = obj["internal_location"]["name"]
+    location = by_location.setdefault(location_name, {"total": 0})
+    location.setdefault(internal_location_name, []).append(obj)
+    return location
+
+
+def get_locations_totals(search):
+    """Return the number of items by location and internal location.
+
+    The totals are computed with a composite aggregation, paginated when
+    the items are stored in many internal locations.
+
+    :returns: a list of (location name, internal location name, total).
+    """
+    sources = [
+        {
+            "location": A(
+                "terms",
+                field="internal_location.location.name",
+                missing_bucket=True,
+            )
+        },
+        {
+            "internal_location": A(
+                "terms", field="internal_location.name", missing_bucket=True
+            )
+        },
+    ]
+    totals = []
+    after = None
+    while True:
+        params = dict(size=LOCATIONS_PAGE_SIZE, sources=sources)
+        if after:
+            params["after"] = after
+        page = search[:0]
+        page.aggs.bucket("locations", "composite", **params)
+        aggregation = page.execute().to_dict()["aggregations"]["locations"]
+        for bucket in aggregation["buckets"]:
+            totals.append((
+                bucket["key"]["location"] or "",
+                bucket["key"]["internal_location"] or "",
+                bucket["doc_count"],
+            ))
+        after = aggregation.get("after_key")
+        if not after or len(aggregation["buckets"]) < LOCATIONS_PAGE_SIZE:
+            return totals
+
+
+def get_all_items(search):
+    """Return all the items of the document, grouped by location."""
+    items = []
+    by_location = {}
+    for hit in search.scan():
+        obj = item_to_obj(hit.to_dict())
+        items.append(obj)
+        # grouping by location (can circulate and not on loan)
+        group_by_location(by_location, obj)["total"] += 1
+    return {"total": len(items), "hits": items, "on_shelf": by_location}
+
+
+def get_items_capped(search, max_hits):
+    """Return at most `max_hits` items of the document.
+
+    Totals by location are aggregated, while only the returned items are
+    listed in their location group. The `more` flag tells if some items of
+    the document are not returned.
+    """
+    by_location = {}
+    for location_name, internal_location_name, total in get_locations_totals(
+        search
+    ):
+        location = by_location.setdefault(location_name, {"total": 0})
+        location.setdefault(internal_location_name, [])
+        location["total"] += total
+
+    search = search[:max_hits]
+    if not lt_es7:
+        search = search.extra(track_total_hits=True)
+    response = search.execute()
+    items = [item_to_obj(hit.to_dict()) for hit in response.hits]
+    for obj in items:
+        group_by_location(by_location, obj)
+
+    total = response.hits.total if lt_es7 else response.hits.total.value
+    return {
+        "total": total,
+        "hits": items,
+        "on_shelf": by_location,
+        "more": total > len(items),
+    }
+
 
 @jsonresolver.hookimpl
 def jsonresolver_loader(url_map):
@@ -20,59 +166,14 @@ def jsonresolver_loader(url_map):
 
     def items_resolver(document_pid):
         """Search and return the total number of items."""
-        items = []
-        by_location = {}
-
         item_search = current_app_ils.item_search_cls()
-        for hit in item_search.search_by_document_pid(document_pid).scan():
-            item = hit.to_dict()
-            circulation = item.get("circulation", {})
-            obj = {
-                "pid": item.get("pid"),
-                "isbn": item.get("isbn"),
-                "internal_location_pid": item.get("internal_location_pid"),
-                "circulation_restriction": item.get("circulation_restriction"),
-                "barcode": item.get("barcode"),
-                "medium": item.get("medium"),
-                "status": item.get("status"),
-                "description": item.get("description"),
-                "shelf": item.get("shelf"),
-                "internal_location": {
-                    "name": item.get("internal_location", {}).get("name", ""),
-                    "location": {
-                        "name": item.get("internal_location", {})
-                        .get("location", {})
-                        .get("name", "")
-                    },
-                },
-            }
-            if circulation:
-                include_circulation_keys = ["state"]
-                obj["circulation"] = {}
-                for key in include_circulation_keys:
-                    obj["circulation"][key] = circulation.get(key)
-            items.append(obj)
-
-            # grouping by location (can circulate and not on loan)
-            location_name = (
-                item.get("internal_location", {})
-                .get("location", {})
-                .get("name", "")
-            )
-            internal_location_name = item.get("internal_location", {}).get(
-                "name", ""
-            )
-            if location_name not in by_location:
-                by_location[location_name] = {
-                    internal_location_name: [],
-                    "total": 0,
-                }
-            if internal_location_name not in by_location[location_name]:
-                by_location[location_name][internal_location_name] = []
-            del obj["description"]
-            by_location[location_name][internal_location_name].append(obj)
-            by_location[location_name]["total"] += 1
-        return {"total": len(items), "hits": items, "on_shelf": by_location}
+        search = item_search.search_by_document_pid(document_pid).source(
+            includes=ITEM_SOURCE_FIELDS
+        )
+        max_hits = current_app.config["ILS_DOCUMENT_ITEMS_MAX_HITS"]
+        if max_hits is None:
+            return get_all_items(search)
+        return get_items_capped(search, max_hits)
 
     url_map.add(
         Rule(
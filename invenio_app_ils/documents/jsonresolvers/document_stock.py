@@ -10,7 +10,7 @@
 import jsonresolver
 from werkzeug.routing import Rule
 
-from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.documents.stock import get_document_stock
 
 # Note: there must be only one resolver per file,
 # otherwise only the last one is registered
@@ -23,21 +23,7 @@ def jsonresolver_loader(url_map):
 
     def stock_resolver(document_pid):
         """Search and return the mediums of the document."""
-        item_search = current_app_ils.item_search_cls()
-        eitem_search = current_app_ils.eitem_search_cls()
-
-        search = item_search.search_by_document_pid(document_pid)
-        search.aggs.bucket("mediums", "terms", field="medium")
-        search_response = search.execute()
-        mediums = [bucket.key for bucket in
-                   search_response.aggregations.mediums.buckets]
-        eitems_count = eitem_search.search_by_document_pid(
-            document_pid).count()
-        if eitems_count > 0:
-            mediums.append("ELECTRONIC_VERSION")
-        return {
-            "mediums": mediums,
-        }
+        return get_document_stock(document_pid)
 
     url_map.add(
         Rule(
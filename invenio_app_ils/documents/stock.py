@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Documents stock."""
+
+from elasticsearch_dsl import A, MultiSearch
+from invenio_search import current_search_client
+
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.cache import cached_resolution, \
+    current_ref_cache
+
+
+def _stock_key(document_pid):
+    """Return the resolution cache key of the stock of a document."""
+    return ("stock", str(document_pid))
+
+
+def get_documents_stock(document_pids):
+    """Return the stock of each of the given documents.
+
+    The mediums of the items and the number of eitems of all the documents
+    are aggregated with a single multi search request.
+
+    :param document_pids: the pids of the documents.
+    :returns: a dict with the stock of each document pid.
+    """
+    document_pids = list(dict.fromkeys(document_pids))
+    if not document_pids:
+        return {}
+
+    items_documents = A(
+        "terms", field="document_pid", size=len(document_pids)
+    )
+    items_documents.bucket("mediums", "terms", field="medium")
+    items_search = current_app_ils.item_search_cls().filter(
+        "terms", document_pid=document_pids
+    )[:0]
+    items_search.aggs.bucket("documents", items_documents)
+
+    eitems_search = current_app_ils.eitem_search_cls().filter(
+        "terms", document_pid=document_pids
+    )[:0]
+    eitems_search.aggs.bucket(
+        "documents", "terms", field="document_pid", size=len(document_pids)
+    )
+
+    items_response, eitems_response = (
+        MultiSearch(using=current_search_client)
+        .add(items_search)
+        .add(eitems_search)
+        .execute()
+    )
+    mediums = {
+        bucket.key: [medium.key for medium in bucket.mediums.buckets]
+        for bucket in items_response.aggregations.documents.buckets
+    }
+    with_eitems = {
+        bucket.key for bucket in eitems_response.aggregations.documents.buckets
+    }
+
+    stock = {}
+    for pid in document_pids:
+        document_mediums = mediums.get(pid, [])
+        if pid in with_eitems:
+            document_mediums.append("ELECTRONIC_VERSION")
+        stock[pid] = {"mediums": document_mediums}
+    return stock
+
+
+def get_document_stock(document_pid):
+    """Return the stock of the document, prefetched with its chunk if any."""
+    return cached_resolution(
+        _stock_key(document_pid),
+        lambda: get_documents_stock([document_pid])[document_pid],
+    )
+
+
+def prefetch_documents_stock(document_pids):
+    """Compute the stock of the documents and store it in the current cache.
+
+    :param document_pids: the pids of the documents.
+    """
+    cache = current_ref_cache()
+    if cache is None or not document_pids:
+        return
+    for pid, stock in get_documents_stock(document_pids).items():
+        cache.set(_stock_key(pid), stock)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Documents tasks."""
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from invenio_app_ils.documents.circulation import \
+    materialize_documents_circulation
+from invenio_app_ils.indexer import chunks
+from invenio_app_ils.proxies import current_app_ils
+
+celery_logger = get_task_logger(__name__)
+
+
+@shared_task(ignore_result=True)
+def reconcile_documents_circulation(chunk_size=500):
+    """Rebuild the materialized circulation of all documents.
+
+    It fixes the drift of the circulation updated on loans and items changes,
+    e.g. after changes done outside of the circulation actions.
+
+    :param chunk_size: the number of documents rebuilt at once.
+    :returns: the number of documents rebuilt and of drifted ones.
+    """
+    if current_app_ils.documents_circulation_store is None:
+        return 0, 0
+
+    search = current_app_ils.document_search_cls().source(includes=["pid"])
+    pids = (hit["pid"] for hit in search.scan())
+    total = drifted = 0
+    for chunk in chunks(pids, chunk_size):
+        drifted += len(materialize_documents_circulation(chunk))
+        total += len(chunk)
+
+    celery_logger.info(
+        "Reconciled the circulation of {} documents, {} drifted.".format(
+            total, drifted
+        )
+    )
+    return total, drifted
@@ -7,10 +7,7 @@
 
 """EItem indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
 from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
@@ -21,8 +18,12 @@ from .api import EITEM_PID_TYPE
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(eitem):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    eitem = scheduler.started(pid_type, pid_value, revision_id)
+    if eitem is None:
+        return
     indexer = ReferencedRecordsIndexer()
     indexed = dict(pid_type=EITEM_PID_TYPE, record=eitem)
 
@@ -32,6 +33,7 @@ def index_referenced_records(eitem):
     referenced = [dict(pid_type=DOCUMENT_PID_TYPE, record=document)]
 
     indexer.index(indexed, referenced)
+    scheduler.processed(pid_type, eitem)
 
 
 class EItemIndexer(RecordIndexer):
@@ -40,8 +42,9 @@ class EItemIndexer(RecordIndexer):
     def index(self, eitem, arguments=None, **kwargs):
         """Index an EItem."""
         super().index(eitem)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((eitem,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, EITEM_PID_TYPE, eitem
+        )
 
 
 @shared_task(ignore_result=True)
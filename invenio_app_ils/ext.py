@@ -11,6 +11,7 @@ import logging
 
 from flask import Blueprint, current_app
 from invenio_indexer.signals import before_record_index
+from invenio_records_rest.utils import obj_or_import_string
 from invenio_rest.errors import RESTException
 from werkzeug.utils import cached_property
 
@@ -27,6 +28,8 @@ from .internal_locations.api import INTERNAL_LOCATION_PID_TYPE
 from .items.api import ITEM_PID_TYPE
 from .locations.api import LOCATION_PID_TYPE
 from .patrons.api import PATRON_PID_TYPE
+from .patrons.cache import clear_request_patrons
+from .records.jsonresolvers.cache import clear_request_ref_cache
 from .series.api import SERIES_PID_TYPE
 
 
@@ -61,6 +64,44 @@ class _InvenioAppIlsState(object):
             raise KeyError("There are no locations defined in the system.")
         return pid.pid_value, pid
 
+    @cached_property
+    def patrons_cache(self):
+        """Return the process-wide patrons cache, None when disabled."""
+        from .patrons.cache import PatronsCache
+
+        ttl = self.app.config["ILS_PATRONS_CACHE_TTL"]
+        if not ttl:
+            return None
+        return PatronsCache(self.app.config["ILS_PATRONS_CACHE_MAXSIZE"], ttl)
+
+    @cached_property
+    def locations_directory(self):
+        """Return the process-wide locations directory, None when disabled."""
+        from .locations.directory import LocationsDirectory
+
+        ttl = self.app.config["ILS_LOCATIONS_DIRECTORY_TTL"]
+        if not ttl:
+            return None
+        return LocationsDirectory(ttl)
+
+    @cached_property
+    def documents_circulation_store(self):
+        """Return the materialized documents circulation store, if any."""
+        store = self.app.config["ILS_DOCUMENTS_CIRCULATION_STORE"]
+        if not store:
+            return None
+        return obj_or_import_string(store)()
+
+    @cached_property
+    def referenced_records_scheduler(self):
+        """Return the referenced records indexing tasks scheduler."""
+        from .indexer import ReferencedRecordsScheduler
+
+        store_cls = obj_or_import_string(
+            self.app.config["ILS_INDEXER_PENDING_CASCADES_STORE"]
+        )
+        return ReferencedRecordsScheduler(store_cls())
+
     def record_class_by_pid_type(self, pid_type):
         endpoints = current_app.config.get("RECORDS_REST_ENDPOINTS", {})
         return endpoints[pid_type]["record_class"]
@@ -207,6 +248,8 @@ class InvenioAppIls(object):
                 template_folder="templates",
             )
         )
+        app.teardown_request(clear_request_patrons)
+        app.teardown_request(clear_request_ref_cache)
         # disable warnings being logged to Sentry
         logging.getLogger("py.warnings").propagate = False
 
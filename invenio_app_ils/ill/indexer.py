@@ -7,13 +7,12 @@
 
 """ILL indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
+from invenio_app_ils.proxies import current_app_ils
 
 from .api import BORROWING_REQUEST_PID_TYPE, LIBRARY_PID_TYPE
 from .proxies import current_ils_ill
@@ -21,27 +20,24 @@ from .proxies import current_ils_ill
 
 def get_borrowing_requests(library_pid):
     """Get referenced borrowing requests."""
-    referenced = []
     search_cls = current_ils_ill.borrowing_request_search_cls
-    rec_cls = current_ils_ill.borrowing_request_record_cls
-    for brw_request in (
-        search_cls().search_by_library_pid(library_pid=library_pid).scan()
-    ):
-        rec = rec_cls.get_record_by_pid(brw_request["pid"])
-        referenced.append(
-            dict(pid_type=BORROWING_REQUEST_PID_TYPE, record=rec)
-        )
-    return referenced
+    search = search_cls().search_by_library_pid(library_pid=library_pid)
+    return search_referenced_records(BORROWING_REQUEST_PID_TYPE, search)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(library):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    library = scheduler.started(pid_type, pid_value, revision_id)
+    if library is None:
+        return
     indexer = ReferencedRecordsIndexer()
 
     indexed = dict(pid_type=LIBRARY_PID_TYPE, record=library)
 
     indexer.index(indexed, get_borrowing_requests(library["pid"]))
+    scheduler.processed(pid_type, library)
 
 
 class LibraryIndexer(RecordIndexer):
@@ -50,5 +46,6 @@ class LibraryIndexer(RecordIndexer):
     def index(self, library, arguments=None, **kwargs):
         """Index a Library."""
         super().index(library)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((library,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, LIBRARY_PID_TYPE, library
+        )
@@ -10,6 +10,7 @@
 import jsonresolver
 from werkzeug.routing import Rule
 
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default, pick
@@ -34,7 +35,7 @@ def jsonresolver_loader(url_map):
         )
 
         library_record_cls = current_ils_ill.library_record_cls
-        library = library_record_cls.get_record_by_pid(library_pid)
+        library = get_cached_record(library_record_cls, library_pid)
 
         return pick(library, "pid", "name")
 
@@ -11,6 +11,7 @@ import jsonresolver
 from werkzeug.routing import Rule
 
 from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default
@@ -35,7 +36,9 @@ def jsonresolver_loader(url_map):
         )
 
         Patron = current_app_ils.patron_cls
-        patron = Patron.get_patron(patron_pid)
+        patron = get_cached_record(
+            Patron, patron_pid, getter=Patron.get_patron
+        )
         return patron.dumps_loader()
 
     url_map.add(
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 #
-# Copyright (C) 2018-2019 CERN.
+# Copyright (C) 2018-2020 CERN.
 #
 # invenio-app-ils is free software; you can redistribute it and/or modify it
 # under the terms of the MIT License; see LICENSE file for more details.
@@ -8,30 +8,189 @@
 """Ils Records API."""
 
 import json
+import threading
 import uuid
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+from itertools import islice
 
+from elasticsearch import VERSION as ES_VERSION
+from elasticsearch.helpers import bulk
+from elasticsearch.helpers import expand_action as default_expand_action
 from flask import current_app
 from invenio_indexer.api import RecordIndexer
+from invenio_indexer.utils import _es7_expand_action
+from invenio_pidstore.errors import PersistentIdentifierError
+from invenio_records.api import Record
+from sqlalchemy.orm.exc import NoResultFound
+
+from invenio_app_ils.errors import PatronNotFoundError
+from invenio_app_ils.patrons.api import PATRON_PID_TYPE
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.api import IlsRecord
+from invenio_app_ils.records.jsonresolvers.api import \
+    prefetch_referenced_records
+from invenio_app_ils.records.jsonresolvers.cache import ref_resolution_cache
+from invenio_app_ils.relations.api import SIBLINGS_RELATION_TYPES, \
+    RelationGraph
 
 indexer = RecordIndexer()
 
 
+def chunks(iterable, size):
+    """Yield successive lists of at most `size` elements of an iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def record_index_action(record, record_indexer=None):
+    """Build the Elasticsearch bulk action to index a record.
+
+    :param record: the record to index.
+    :param record_indexer: the indexer preparing the record, by default a
+        `RecordIndexer`.
+    """
+    record_indexer = record_indexer or indexer
+    index, doc_type = record_indexer.record_to_index(record)
+    arguments = {}
+    body = record_indexer._prepare_record(record, index, doc_type, arguments)
+    index, doc_type = record_indexer._prepare_index(index, doc_type)
+
+    action = {
+        "_op_type": "index",
+        "_index": index,
+        "_type": doc_type,
+        "_id": str(record.id),
+        "_version": record.revision_id,
+        "_version_type": record_indexer._version_type,
+        "_source": body,
+    }
+    action.update(arguments)
+    return action
+
+
+def bulk_index_records(records, record_indexer=None, chunk_size=None):
+    """Index records in chunks using the Elasticsearch bulk API.
+
+    Each chunk of records is sent with a single bulk request.
+
+    :param records: an iterable of records. It is consumed lazily.
+    :param record_indexer: the indexer preparing the records, by default a
+        `RecordIndexer`.
+    :param chunk_size: the number of records in each chunk, by default
+        `ILS_INDEXER_BULK_CHUNK_SIZE`.
+    :returns: a generator yielding, for each chunk, a tuple with the number
+        of records, the number of successfully indexed records and the list
+        of errors.
+    """
+    record_indexer = record_indexer or indexer
+    chunk_size = (
+        chunk_size or current_app.config["ILS_INDEXER_BULK_CHUNK_SIZE"]
+    )
+    req_timeout = current_app.config["INDEXER_BULK_REQUEST_TIMEOUT"]
+    expand_action = (
+        _es7_expand_action if ES_VERSION[0] >= 7 else default_expand_action
+    )
+    for chunk in chunks(records, chunk_size):
+        # references shared by the records are resolved once per chunk
+        with ref_resolution_cache():
+            prefetch_referenced_records(chunk)
+            actions = [
+                record_index_action(record, record_indexer)
+                for record in chunk
+            ]
+        success, errors = bulk(
+            record_indexer.client,
+            actions,
+            chunk_size=len(actions),
+            raise_on_error=False,
+            raise_on_exception=False,
+            request_timeout=req_timeout,
+            expand_action_callback=expand_action,
+        )
+        yield len(actions), success, errors
+
+
+def search_referenced_records(pid_type, search):
+    """Stream the records matching the search as referenced records.
+
+    Only the PIDs are retrieved from Elasticsearch, the records are then
+    loaded in bulk from the database.
+
+    :param pid_type: the pid type of the records returned by the search.
+    :param search: the search returning the referenced records.
+    :returns: a generator of dicts containing `pid_type` and `record` keys.
+    """
+    pids = (hit["pid"] for hit in search.source(includes=["pid"]).scan())
+    for record in IlsRecord.get_records_by_pids(pids, pid_type=pid_type):
+        yield dict(pid_type=pid_type, record=record)
+
+
+def related_referenced_records(record):
+    """Stream the records related to the given one as referenced records.
+
+    :param record: the record with relations.
+    :returns: a generator of dicts containing `pid_type` and `record` keys.
+    """
+    graph = RelationGraph.load(
+        [record.pid], component_types=SIBLINGS_RELATION_TYPES
+    )
+    pids_by_type = {}
+    for _, pid in graph.related(record.pid):
+        pids = pids_by_type.setdefault(pid.pid_type, set())
+        pids.add(pid.pid_value)
+
+    for pid_type, pids in pids_by_type.items():
+        for rec in IlsRecord.get_records_by_pids(pids, pid_type=pid_type):
+            yield dict(pid_type=pid_type, record=rec)
+
+
 class ReferencedRecordsIndexer:
-    """Indexer with logging."""
+    """Indexer with logging.
+
+    By default, referenced records are sent to Elasticsearch in chunks using
+    the bulk API, one request per chunk of `ILS_INDEXER_BULK_CHUNK_SIZE`
+    records. Set `bulk=False` to index each record with a separate request.
+    """
 
     name = "referenced_records_indexer"
     _uuid = str(uuid.uuid4())
 
+    def __init__(self, bulk=True, chunk_size=None):
+        """Constructor."""
+        self.bulk = bulk
+        self._chunk_size = chunk_size
+
+    @property
+    def chunk_size(self):
+        """Return the number of records sent in each bulk request."""
+        return (
+            self._chunk_size
+            or current_app.config["ILS_INDEXER_BULK_CHUNK_SIZE"]
+        )
+
+    @staticmethod
+    def _origin(indexed):
+        """Return the logged origin of the indexing."""
+        if "pid_values" in indexed:
+            return dict(
+                pid_type=indexed["pid_type"], pid_values=indexed["pid_values"]
+            )
+        return dict(
+            pid_type=indexed["pid_type"], pid_value=indexed["record"]["pid"]
+        )
+
     def log(self, indexed, referenced, before=True):
         """Log indexing action."""
         structured_msg = dict(
             name=self.name,
             uuid=self._uuid,
             action="before_indexing" if before else "after_indexing",
-            origin=dict(
-                pid_type=indexed["pid_type"],
-                pid_value=indexed["record"]["pid"]
-            ),
+            origin=self._origin(indexed),
             referenced=dict(
                 pid_type=referenced["pid_type"],
                 pid_value=referenced["record"]["pid"]
@@ -39,17 +198,255 @@ class ReferencedRecordsIndexer:
         )
         current_app.logger.info(json.dumps(structured_msg, sort_keys=True))
 
+    def log_chunk(self, indexed, chunk_number, total, success, errors):
+        """Log the outcome of a bulk indexing request."""
+        structured_msg = dict(
+            name=self.name,
+            uuid=self._uuid,
+            action="bulk_indexing",
+            origin=self._origin(indexed),
+            chunk=dict(
+                number=chunk_number,
+                total=total,
+                success=success,
+                failed=len(errors),
+            )
+        )
+        if errors:
+            structured_msg["errors"] = errors
+            current_app.logger.warning(
+                json.dumps(structured_msg, sort_keys=True)
+            )
+        else:
+            current_app.logger.info(json.dumps(structured_msg, sort_keys=True))
+
+    def _bulk_index(self, indexed, referenced):
+        """Index referenced records in chunks using the bulk API."""
+        stats = dict(success=0, failed=0)
+        records = (r["record"] for r in referenced)
+        for number, (total, success, errors) in enumerate(
+            bulk_index_records(records, chunk_size=self.chunk_size)
+        ):
+            self.log_chunk(indexed, number, total, success, errors)
+            stats["success"] += success
+            stats["failed"] += len(errors)
+        return stats
+
     def index(self, indexed, referenced):
         """Index record logging action before and after.
 
         :param indexed: origin record indexed. A dict containing `pid_type`
-            and `record` keys.
-        :param referenced: referenced records to index. A list of dicts
+            and `record` keys, or `pid_type` and `pid_values` keys when the
+            referenced records of many records are indexed at once.
+        :param referenced: referenced records to index. An iterable of dicts
             containing `pid_type` and `record` keys of the records that will
             be indexed.
+        :returns: a dict with the number of `success` and `failed` indexed
+            records.
         """
+        if self.bulk:
+            return self._bulk_index(indexed, referenced)
+
+        stats = dict(success=0, failed=0)
         for r in referenced:
             self.log(indexed, r)
             record_to_index = r["record"]
             indexer.index(record_to_index)
             self.log(indexed, r, before=False)
+            stats["success"] += 1
+        return stats
+
+
+class LocalPendingCascadesStore:
+    """In-memory store of the pending referenced records indexing tasks.
+
+    It also keeps the last revision processed by the tasks of each record.
+    It is a stand-in for a store shared between processes: triggers are only
+    coalesced, and stale tasks skipped, when they happen in the same process.
+    """
+
+    purge_threshold = 1024
+    processed_maxsize = 10000
+
+    def __init__(self):
+        """Constructor."""
+        self._pending = {}
+        self._processed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        """Remove the expired keys."""
+        expired = [k for k, exp in self._pending.items() if exp <= now]
+        for key in expired:
+            del self._pending[key]
+
+    def add(self, key, expires_at):
+        """Mark the key as pending until the given expiration date.
+
+        A key pending until the given date or later is not replaced.
+
+        :returns: False if the key is already pending until the given date
+            or later, True otherwise.
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            current = self._pending.get(key)
+            if current is not None and current >= expires_at:
+                return False
+            if len(self._pending) >= self.purge_threshold:
+                self._purge(now)
+            self._pending[key] = expires_at
+            return True
+
+    def discard(self, key):
+        """Remove the key from the pending ones."""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def get_processed(self, key):
+        """Return the record id and last revision processed, if any."""
+        with self._lock:
+            return self._processed.get(key)
+
+    def set_processed(self, key, processed):
+        """Store the record id and last revision processed for the key."""
+        with self._lock:
+            self._processed[key] = processed
+            self._processed.move_to_end(key)
+            while len(self._processed) > self.processed_maxsize:
+                self._processed.popitem(last=False)
+
+
+class ReferencedRecordsScheduler:
+    """Schedule the referenced records indexing tasks.
+
+    Each task runs `ILS_INDEXER_TASK_DELAY` after the indexing of its origin
+    record. When enabled with `ILS_INDEXER_COALESCE_CASCADES`, a trigger for
+    a record whose task is already queued is merged into the queued task:
+    the referenced records are fetched when the task runs, so that task will
+    also index the changes of the later trigger. A trigger is only merged
+    when the queued task still runs at least `ILS_INDEXER_TASK_DELAY` after
+    it, so that the changes are visible in the indices when the task runs.
+
+    Tasks receive the `(pid_type, pid_value, revision_id)` descriptor of the
+    origin record instead of the record itself, and load its current revision
+    when they start. A task is skipped when the record is gone or when a task
+    has already processed the same or a newer revision of it.
+    """
+
+    def __init__(self, store):
+        """Constructor."""
+        self.store = store
+        self._counters = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def _count(self, pid_type, name):
+        """Increment a counter."""
+        with self._lock:
+            self._counters[pid_type][name] += 1
+
+    @property
+    def counters(self):
+        """Return the number of scheduled, collapsed and skipped tasks."""
+        with self._lock:
+            return {k: dict(v) for k, v in self._counters.items()}
+
+    @staticmethod
+    def _key(pid_type, pid_value, task_kwargs):
+        """Return the key of a task in the pending store.
+
+        Tasks with different arguments are never merged.
+        """
+        if not task_kwargs:
+            return (pid_type, pid_value)
+        return (pid_type, pid_value, json.dumps(task_kwargs, sort_keys=True))
+
+    @staticmethod
+    def _revision_id(record):
+        """Return the revision of the record, None if it has no revisions."""
+        return record.revision_id if isinstance(record, Record) else None
+
+    @staticmethod
+    def _load(pid_type, pid_value):
+        """Return the current revision of the record."""
+        if pid_type == PATRON_PID_TYPE:
+            return current_app_ils.patron_cls.get_patron(pid_value)
+        record_cls = current_app_ils.record_class_by_pid_type(pid_type)
+        return record_cls.get_record_by_pid(pid_value)
+
+    def processed_revision_id(self, pid_type, record, **task_kwargs):
+        """Return the last revision of the record processed by a task.
+
+        :returns: the revision id, or None when unknown or processed for
+            another record with the same pid.
+        """
+        key = self._key(pid_type, record["pid"], task_kwargs)
+        processed = self.store.get_processed(key)
+        if processed is None:
+            return None
+        record_id, revision_id = processed
+        return revision_id if record_id == str(record.id) else None
+
+    def schedule(self, task, pid_type, record, **task_kwargs):
+        """Schedule the task indexing the records referenced by the record.
+
+        :param task: the Celery task to schedule, taking the pid type, the
+            pid value and the revision of the record as arguments.
+        :param pid_type: the pid type of the record.
+        :param record: the record that has been indexed.
+        :param task_kwargs: extra keyword arguments passed to the task.
+        :returns: False if the trigger was merged in an already queued task,
+            True otherwise.
+        """
+        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
+        coalesce = current_app.config["ILS_INDEXER_COALESCE_CASCADES"]
+        key = self._key(pid_type, record["pid"], task_kwargs)
+        if coalesce and not self.store.add(key, eta):
+            self._count(pid_type, "collapsed")
+            return False
+
+        self._count(pid_type, "scheduled")
+        descriptor = (pid_type, record["pid"], self._revision_id(record))
+        task.apply_async(descriptor, kwargs=task_kwargs, eta=eta)
+        return True
+
+    def started(self, pid_type, pid_value, revision_id=None, **task_kwargs):
+        """Notify that the task of the given record started.
+
+        Triggers happening from now on are not merged anymore in the running
+        task, given that it might have already fetched the referenced records.
+
+        :returns: the current revision of the record, or None when the task
+            can be skipped.
+        """
+        key = self._key(pid_type, pid_value, task_kwargs)
+        self.store.discard(key)
+
+        try:
+            record = self._load(pid_type, pid_value)
+        except (PersistentIdentifierError, NoResultFound, PatronNotFoundError):
+            self._count(pid_type, "skipped")
+            return None
+
+        processed = self.store.get_processed(key)
+        if revision_id is not None and processed is not None:
+            record_id, processed_revision_id = processed
+            if (
+                record_id == str(record.id)
+                and processed_revision_id >= revision_id
+            ):
+                self._count(pid_type, "skipped")
+                return None
+        return record
+
+    def processed(self, pid_type, record, **task_kwargs):
+        """Notify that the task of the given record revision completed.
+
+        The revision is stored with the record id, given that revisions of
+        another record with the same pid, e.g. restored from a backup, are
+        not comparable.
+        """
+        revision_id = self._revision_id(record)
+        if revision_id is not None:
+            key = self._key(pid_type, record["pid"], task_kwargs)
+            self.store.set_processed(key, (str(record.id), revision_id))
@@ -7,40 +7,40 @@
 
 """InternalLocation indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
 from invenio_app_ils.internal_locations.api import INTERNAL_LOCATION_PID_TYPE
 from invenio_app_ils.items.api import ITEM_PID_TYPE
+from invenio_app_ils.locations.directory import invalidate_locations_directory
 from invenio_app_ils.proxies import current_app_ils
 
 
 def get_items(intloc_pid):
     """Get referenced items."""
-    referenced = []
-    item_search_cls = current_app_ils.item_search_cls
-    item_record_cls = current_app_ils.item_record_cls
-    for item in (
-        item_search_cls()
-        .search_by_internal_location_pid(internal_location_pid=intloc_pid)
-        .scan()
-    ):
-        item = item_record_cls.get_record_by_pid(item["pid"])
-        referenced.append(dict(pid_type=ITEM_PID_TYPE, record=item))
-    return referenced
+    search = current_app_ils.item_search_cls().search_by_internal_location_pid(
+        internal_location_pid=intloc_pid
+    )
+    return search_referenced_records(ITEM_PID_TYPE, search)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(intloc):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    # the task may run in another process than the one that indexed the
+    # changed record: the referenced records must not see its old version
+    invalidate_locations_directory()
+    scheduler = current_app_ils.referenced_records_scheduler
+    intloc = scheduler.started(pid_type, pid_value, revision_id)
+    if intloc is None:
+        return
     indexer = ReferencedRecordsIndexer()
 
     indexed = dict(pid_type=INTERNAL_LOCATION_PID_TYPE, record=intloc)
     indexer.index(indexed, get_items(intloc["pid"]))
+    scheduler.processed(pid_type, intloc)
 
 
 class InternalLocationIndexer(RecordIndexer):
@@ -49,5 +49,13 @@ class InternalLocationIndexer(RecordIndexer):
     def index(self, intloc, arguments=None, **kwargs):
         """Index an InternalLocation."""
         super().index(intloc)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((intloc,), eta=eta)
+        invalidate_locations_directory()
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, INTERNAL_LOCATION_PID_TYPE, intloc
+        )
+
+    def delete(self, intloc, **kwargs):
+        """Delete an InternalLocation from the index."""
+        result = super().delete(intloc, **kwargs)
+        invalidate_locations_directory()
+        return result
@@ -10,10 +10,8 @@
 import jsonresolver
 from werkzeug.routing import Rule
 
-from invenio_app_ils.internal_locations.api import InternalLocation
-from invenio_app_ils.locations.api import Location
-from invenio_app_ils.records.jsonresolvers.api import \
-    get_field_value_for_record as get_field_value
+from invenio_app_ils.locations.directory import get_internal_location, \
+    get_location
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default
 
 # Note: there must be only one resolver per file,
@@ -28,9 +26,8 @@ def jsonresolver_loader(url_map):
     @get_pid_or_default(default_value=dict())
     def location_resolver(internal_loc_pid):
         """Return the Location record for the given Internal Loc. or raise."""
-        location_pid = get_field_value(InternalLocation, internal_loc_pid,
-                                       "location_pid")
-        location = Location.get_record_by_pid(location_pid)
+        internal_location = get_internal_location(internal_loc_pid)
+        location = get_location(internal_location["location_pid"])
         del location["$schema"]
 
         return location
@@ -7,36 +7,35 @@
 
 """Item indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
-from invenio_circulation.proxies import current_circulation
 from invenio_circulation.search.api import search_by_pid as search_loans_by_pid
 from invenio_indexer.api import RecordIndexer
 
 from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.documents.circulation import update_item_circulation
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
 from invenio_app_ils.items.api import ITEM_PID_TYPE
 from invenio_app_ils.proxies import current_app_ils
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(item):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    item = scheduler.started(pid_type, pid_value, revision_id)
+    if item is None:
+        return
     indexer = ReferencedRecordsIndexer()
     indexed = dict(pid_type=ITEM_PID_TYPE, record=item)
-    referenced = []
 
     # fetch and index loans
-    loan_record_cls = current_circulation.loan_record_cls
     item_pid = dict(type=ITEM_PID_TYPE, value=item["pid"])
-    for loan in search_loans_by_pid(item_pid=item_pid).scan():
-        loan = loan_record_cls.get_record_by_pid(loan["pid"])
-        referenced.append(
-            dict(pid_type=CIRCULATION_LOAN_PID_TYPE, record=loan)
-        )
+    search = search_loans_by_pid(item_pid=item_pid)
+    referenced = list(
+        search_referenced_records(CIRCULATION_LOAN_PID_TYPE, search)
+    )
 
     # fetch and index the document
     document_cls = current_app_ils.document_record_cls
@@ -44,6 +43,7 @@ def index_referenced_records(item):
     referenced.append(dict(pid_type=DOCUMENT_PID_TYPE, record=document))
 
     indexer.index(indexed, referenced)
+    scheduler.processed(pid_type, item)
 
 
 class ItemIndexer(RecordIndexer):
@@ -52,5 +52,13 @@ class ItemIndexer(RecordIndexer):
     def index(self, item, arguments=None, **kwargs):
         """Index an Item."""
         super().index(item)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((item,), eta=eta)
+        update_item_circulation(item)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, ITEM_PID_TYPE, item
+        )
+
+    def delete(self, item, **kwargs):
+        """Delete an Item from the index."""
+        result = super().delete(item, **kwargs)
+        update_item_circulation(item, deleted=True)
+        return result
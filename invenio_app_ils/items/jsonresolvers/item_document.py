@@ -12,6 +12,7 @@ from werkzeug.routing import Rule
 
 from invenio_app_ils.items.api import Item
 from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default, pick
@@ -29,7 +30,7 @@ def jsonresolver_loader(url_map):
     def get_document(document_pid):
         """Return the Document record."""
         Document = current_app_ils.document_record_cls
-        document = Document.get_record_by_pid(document_pid)
+        document = get_cached_record(Document, document_pid)
         return pick(
             document,
             "authors",
@@ -10,8 +10,9 @@
 import jsonresolver
 from werkzeug.routing import Rule
 
-from invenio_app_ils.internal_locations.api import InternalLocation
 from invenio_app_ils.items.api import Item
+from invenio_app_ils.locations.directory import \
+    get_internal_location as fetch_internal_location
 from invenio_app_ils.records.jsonresolvers.api import \
     get_field_value_for_record as get_field_value
 from invenio_app_ils.records.jsonresolvers.api import get_pid_or_default
@@ -28,9 +29,7 @@ def jsonresolver_loader(url_map):
     @get_pid_or_default(default_value=dict())
     def get_internal_location(internal_location_pid):
         """Return the InternalLocation record."""
-        internal_location = InternalLocation.get_record_by_pid(
-            internal_location_pid
-        )
+        internal_location = fetch_internal_location(internal_location_pid)
         del internal_location["$schema"]
 
         return internal_location
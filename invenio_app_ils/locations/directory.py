@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""ILS Locations directory."""
+
+import threading
+import time
+from copy import deepcopy
+
+from flask import current_app, has_app_context
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+
+from invenio_app_ils.proxies import current_app_ils
+
+
+class LocationsDirectory:
+    """Process-wide directory of all the locations and internal locations.
+
+    The directory is loaded at once, and loaded again when its version
+    changes, i.e. when a location or an internal location is indexed or
+    deleted in this process or when the indexing of its referenced records
+    starts, or when it expires: the time to live bounds how long other
+    processes can return outdated locations.
+    """
+
+    def __init__(self, ttl):
+        """Constructor.
+
+        :param ttl: the number of seconds the directory is kept.
+        """
+        self.ttl = ttl
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load():
+        """Return all the locations and internal locations by pid type."""
+        records = {}
+        for record_cls in (
+            current_app_ils.location_record_cls,
+            current_app_ils.internal_location_record_cls,
+        ):
+            pid_type = record_cls._pid_type
+            pids = PersistentIdentifier.query.filter_by(
+                pid_type=pid_type,
+                object_type="rec",
+                status=PIDStatus.REGISTERED,
+            ).with_entities(PersistentIdentifier.pid_value)
+            records[pid_type] = {
+                record["pid"]: deepcopy(dict(record))
+                for record in record_cls.get_records_by_pids(
+                    pid for pid, in pids
+                )
+            }
+        return records
+
+    def get(self, pid_type, pid_value):
+        """Return a copy of the record data, or None if not found."""
+        with self._lock:
+            snapshot = self._snapshot
+            if (
+                snapshot is None
+                or snapshot["version"] != self.version
+                or snapshot["expires_at"] <= time.monotonic()
+            ):
+                snapshot = self._snapshot = dict(
+                    version=self.version,
+                    expires_at=time.monotonic() + self.ttl,
+                    records=self._load(),
+                )
+        data = snapshot["records"].get(pid_type, {}).get(str(pid_value))
+        return deepcopy(data) if data is not None else None
+
+    def invalidate(self):
+        """Change the version of the directory, to load it again."""
+        with self._lock:
+            self.version += 1
+            self._snapshot = None
+
+
+def _get_from_directory(record_cls, pid_value):
+    """Return the record from the directory, fetching it if missing."""
+    state = current_app.extensions.get("invenio-app-ils")
+    directory = state.locations_directory if state is not None else None
+    if directory is not None:
+        data = directory.get(record_cls._pid_type, pid_value)
+        if data is not None:
+            return record_cls(data)
+    # raises the errors of deleted or not existing records
+    return record_cls.get_record_by_pid(pid_value)
+
+
+def get_location(location_pid):
+    """Return the location, from the directory when enabled."""
+    return _get_from_directory(
+        current_app_ils.location_record_cls, location_pid
+    )
+
+
+def get_internal_location(internal_location_pid):
+    """Return the internal location, from the directory when enabled."""
+    return _get_from_directory(
+        current_app_ils.internal_location_record_cls, internal_location_pid
+    )
+
+
+def invalidate_locations_directory():
+    """Load the directory again on the next lookup."""
+    if not has_app_context():
+        return
+    state = current_app.extensions.get("invenio-app-ils")
+    if state is not None and state.locations_directory is not None:
+        state.locations_directory.invalidate()
@@ -7,61 +7,57 @@
 
 """Location indexer APIs."""
 
-from datetime import datetime
+from itertools import chain
 
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
 from invenio_app_ils.internal_locations.api import INTERNAL_LOCATION_PID_TYPE
 from invenio_app_ils.items.api import ITEM_PID_TYPE
 from invenio_app_ils.locations.api import LOCATION_PID_TYPE
+from invenio_app_ils.locations.directory import invalidate_locations_directory
 from invenio_app_ils.proxies import current_app_ils
 
 
 def get_internal_locations(location_pid):
     """Get referenced internal location."""
-    referenced = []
     intloc_search_cls = current_app_ils.internal_location_search_cls
-    intloc_record_cls = current_app_ils.internal_location_record_cls
-    for iloc in (
-        intloc_search_cls()
-        .search_by_location_pid(location_pid=location_pid)
-        .scan()
-    ):
-        intloc = intloc_record_cls.get_record_by_pid(iloc["pid"])
-        referenced.append(
-            dict(pid_type=INTERNAL_LOCATION_PID_TYPE, record=intloc)
-        )
-    return referenced
+    search = intloc_search_cls().search_by_location_pid(
+        location_pid=location_pid
+    )
+    return search_referenced_records(INTERNAL_LOCATION_PID_TYPE, search)
 
 
 def get_items(location_pid):
     """Get referenced items."""
-    referenced = []
-    item_search_cls = current_app_ils.item_search_cls
-    item_record_cls = current_app_ils.item_record_cls
-    for item in (
-        item_search_cls()
-        .search_by_location_pid(location_pid=location_pid)
-        .scan()
-    ):
-        item = item_record_cls.get_record_by_pid(item["pid"])
-        referenced.append(dict(pid_type=ITEM_PID_TYPE, record=item))
-    return referenced
+    search = current_app_ils.item_search_cls().search_by_location_pid(
+        location_pid=location_pid
+    )
+    return search_referenced_records(ITEM_PID_TYPE, search)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(location):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    # the task may run in another process than the one that indexed the
+    # changed record: the referenced records must not see its old version
+    invalidate_locations_directory()
+    scheduler = current_app_ils.referenced_records_scheduler
+    location = scheduler.started(pid_type, pid_value, revision_id)
+    if location is None:
+        return
     indexer = ReferencedRecordsIndexer()
 
     location_pid = location["pid"]
     indexed = dict(pid_type=LOCATION_PID_TYPE, record=location)
 
-    indexer.index(indexed, get_internal_locations(location_pid))
-    indexer.index(indexed, get_items(location_pid))
+    indexer.index(
+        indexed,
+        chain(get_internal_locations(location_pid), get_items(location_pid)),
+    )
+    scheduler.processed(pid_type, location)
 
 
 class LocationIndexer(RecordIndexer):
@@ -70,5 +66,13 @@ class LocationIndexer(RecordIndexer):
     def index(self, location, arguments=None, **kwargs):
         """Index an Location."""
         super().index(location)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((location,), eta=eta)
+        invalidate_locations_directory()
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, LOCATION_PID_TYPE, location
+        )
+
+    def delete(self, location, **kwargs):
+        """Delete a Location from the index."""
+        result = super().delete(location, **kwargs)
+        invalidate_locations_directory()
+        return result
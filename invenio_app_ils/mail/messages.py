@@ -7,16 +7,58 @@
 
 """ILS mail message objects."""
 
+import json
 import uuid
+from functools import lru_cache
 
 from flask import current_app
 from flask_mail import Message
+from jinja2 import meta
 from jinja2.exceptions import TemplateError
 
 from invenio_app_ils.proxies import current_app_ils
 from invenio_app_ils.records.jsonresolvers.api import pick
 
 
+def _render(template, block_name, context):
+    """Render a block of the template with the given context."""
+    if block_name not in template.blocks:
+        raise TemplateError("No block with name '{}'".format(block_name))
+    return "".join(template.blocks[block_name](context))
+
+
+@lru_cache(maxsize=32)
+def _template_variables(template):
+    """Return the names of the context variables used by the template.
+
+    :returns: the names, or None when the template extends, includes or
+        imports other templates, whose variables are unknown.
+    """
+    env = template.environment
+    source = env.loader.get_source(env, template.name)[0]
+    ast = env.parse(source)
+    if any(True for _ in meta.find_referenced_templates(ast)):
+        return None
+    return frozenset(meta.find_undeclared_variables(ast))
+
+
+def _render_footers(template, context):
+    """Return the plain and HTML footers rendered with the context."""
+    footer_plain = _render(template, "footer_plain", context)
+    if "footer_html" in template.blocks:
+        footer_html = _render(template, "footer_html", context)
+    else:
+        footer_html = footer_plain
+    return footer_plain, footer_html
+
+
+@lru_cache(maxsize=128)
+def _render_memoized_footers(template, variables):
+    """Return the footers rendered with the JSON serialized variables."""
+    context = template.new_context(vars=json.loads(variables))
+    return _render_footers(template, context)
+
+
 class BlockTemplatedMessage(Message):
     """Templated message using Jinja2 blocks."""
 
@@ -45,21 +87,17 @@ class BlockTemplatedMessage(Message):
         ))
         self.ctx = ctx
 
+        # compiled templates are cached by the Jinja environment
         tmpl = current_app.jinja_env.get_template(template)
-        kwargs["subject"] = self.render_block(tmpl, "subject").strip()
-        kwargs["body"] = self.render_block(tmpl, "body_plain")
-        try:
-            kwargs["html"] = self.render_block(tmpl, "body_html")
-        except TemplateError:
+        context = tmpl.new_context(vars=self.ctx)
+        kwargs["subject"] = _render(tmpl, "subject", context).strip()
+        kwargs["body"] = _render(tmpl, "body_plain", context)
+        if "body_html" in tmpl.blocks:
+            kwargs["html"] = _render(tmpl, "body_html", context)
+        else:
             kwargs["html"] = kwargs["body"]
 
-        footer_tmpl = current_app.jinja_env.get_template(self.FOOTER_TEMPLATE)
-        footer_plain = self.render_block(footer_tmpl, "footer_plain")
-        try:
-            footer_html = self.render_block(footer_tmpl, "footer_html")
-        except TemplateError:
-            footer_html = footer_plain
-
+        footer_plain, footer_html = self.render_footer()
         kwargs["body"] += footer_plain
         kwargs["html"] += footer_html
 
@@ -72,13 +110,32 @@ class BlockTemplatedMessage(Message):
 
         super(BlockTemplatedMessage, self).__init__(**kwargs)
 
+    def render_footer(self):
+        """Return the plain and HTML footers.
+
+        The footers are the same for all the messages with the same values
+        of the variables used by the footer template, e.g. `spa_routes`: they
+        are rendered once per process for these values, when they can be
+        serialized to JSON.
+        """
+        tmpl = current_app.jinja_env.get_template(self.FOOTER_TEMPLATE)
+        names = _template_variables(tmpl)
+        if names is not None and names.issubset(self.ctx):
+            try:
+                variables = json.dumps(
+                    {name: self.ctx[name] for name in names}, sort_keys=True
+                )
+            except TypeError:
+                pass
+            else:
+                return _render_memoized_footers(tmpl, variables)
+        return _render_footers(tmpl, tmpl.new_context(vars=self.ctx))
+
     def render_block(self, template, block_name):
         """Return a Jinja2 block as a string."""
-        new_context = template.new_context
-        if block_name not in template.blocks:
-            raise TemplateError("No block with name '{}'".format(block_name))
-        lines = template.blocks[block_name](new_context(vars=self.ctx))
-        return "".join(lines)
+        return _render(
+            template, block_name, template.new_context(vars=self.ctx)
+        )
 
     def dump(self):
         """Dump email data."""
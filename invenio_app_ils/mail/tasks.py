@@ -8,18 +8,156 @@
 """ILS mail tasks."""
 
 import json
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
 
 from celery import shared_task
+from celery.signals import worker_process_shutdown
 from celery.utils.log import get_task_logger
-from flask import current_app
-from invenio_mail.tasks import send_email
+from flask import current_app, g, has_app_context
+from flask_mail import Message
 
 celery_logger = get_task_logger(__name__)
 
 
+class _SMTPConnectionState(threading.local):
+    """SMTP connection kept open by each worker, and its last sending time."""
+
+    app = None
+    connection = None
+    last_sent_at = 0.0
+
+
+_smtp = _SMTPConnectionState()
+
+
+def _close_smtp_connection():
+    """Close the SMTP connection of the worker, if any.
+
+    The connection is dropped even when the server or the socket fails to
+    close it.
+    """
+    connection, _smtp.connection = _smtp.connection, None
+    _smtp.app = None
+    if connection is not None:
+        try:
+            connection.__exit__(None, None, None)
+        except (smtplib.SMTPException, OSError):
+            pass
+
+
+@worker_process_shutdown.connect
+def _close_smtp_connection_on_shutdown(**kwargs):
+    """Close the SMTP connection when the worker process exits."""
+    _close_smtp_connection()
+
+
+def _smtp_connection():
+    """Return the SMTP connection of the worker, opening it if needed."""
+    app = current_app._get_current_object()
+    if _smtp.connection is not None and _smtp.app is not app:
+        _close_smtp_connection()
+    if _smtp.connection is None:
+        _smtp.connection = app.extensions["mail"].connect().__enter__()
+        _smtp.app = app
+    return _smtp.connection
+
+
+def _wait_rate_limit():
+    """Wait to send at most `ILS_MAIL_RATE_LIMIT` messages per second."""
+    rate_limit = current_app.config["ILS_MAIL_RATE_LIMIT"]
+    if rate_limit:
+        wait = _smtp.last_sent_at + 1.0 / rate_limit - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+    _smtp.last_sent_at = time.monotonic()
+
+
+def _send_message(data):
+    """Send the message over the SMTP connection of the worker.
+
+    The connection is opened again once when the server closed it, e.g.
+    after being idle between two batches.
+    """
+    msg = Message()
+    msg.__dict__.update(data)
+    _wait_rate_limit()
+    try:
+        _smtp_connection().send(msg)
+    except smtplib.SMTPServerDisconnected:
+        _close_smtp_connection()
+        _smtp_connection().send(msg)
+
+
+@shared_task(ignore_result=True)
+def send_ils_emails(messages):
+    """Send a batch of email messages over one SMTP connection.
+
+    :param messages: the data of the messages, with their dumps used for
+        logging.
+    """
+    success = []
+    failed = []
+    for message in messages:
+        dump = message["dump"]
+        try:
+            _send_message(message["data"])
+        except Exception as exc:
+            # do not reuse a connection in an unknown state
+            _close_smtp_connection()
+            _log_error_mail(exc, data=dump)
+            failed.append(dump["id"])
+        else:
+            _log_successful_mail(dump)
+            success.append(dump["id"])
+
+    log_msg = dict(
+        name="ils_mail",
+        action="batch",
+        success=len(success),
+        failed=len(failed),
+        failed_ids=failed,
+    )
+    if failed:
+        celery_logger.warning(json.dumps(log_msg, sort_keys=True))
+    else:
+        celery_logger.info(json.dumps(log_msg, sort_keys=True))
+
+
+def _send_ils_emails_in_batches(messages):
+    """Send the messages with one task per batch of ILS_MAIL_BATCH_SIZE."""
+    size = current_app.config["ILS_MAIL_BATCH_SIZE"]
+    for start in range(0, len(messages), size):
+        send_ils_emails.apply_async((messages[start:start + size],))
+
+
+@contextmanager
+def ils_email_batch():
+    """Batch the emails sent in the block.
+
+    The messages are sent at the end of the block, by tasks sending each up
+    to `ILS_MAIL_BATCH_SIZE` messages over one SMTP connection.
+    """
+    if g.get("ils_mail_batch") is not None:
+        yield
+        return
+
+    batch = g.ils_mail_batch = []
+    try:
+        yield
+    finally:
+        g.pop("ils_mail_batch", None)
+        if batch:
+            _send_ils_emails_in_batches(batch)
+
+
 def send_ils_email(message, name="ils_mail"):
     """Send an email async with Invenio-Mail and log success / errors.
 
+    Within `ils_email_batch`, the message is sent at the end of the batch.
+
     :param message: BlockTemplatedMessage mail message.
     :param name: The name used in the log message.
     """
@@ -34,11 +172,11 @@ def send_ils_email(message, name="ils_mail"):
         data=dump
     )
     celery_logger.debug(json.dumps(log_msg, sort_keys=True))
-    send_email.apply_async(
-        (full_data,),
-        link=log_successful_mail.s(dump),
-        link_error=log_error_mail.s(data=dump)
-    )
+    batch = g.get("ils_mail_batch") if has_app_context() else None
+    if batch is not None:
+        batch.append(dict(data=full_data, dump=dump))
+    else:
+        _send_ils_emails_in_batches([dict(data=full_data, dump=dump)])
 
 
 def get_recipients(recipients):
@@ -48,9 +186,8 @@ def get_recipients(recipients):
     return recipients
 
 
-@shared_task
-def log_successful_mail(_, data):
-    """Log successful email task."""
+def _log_successful_mail(data):
+    """Log a successfully sent email."""
     log_msg = dict(
         name="ils_mail",
         action="success",
@@ -60,9 +197,9 @@ def log_successful_mail(_, data):
     celery_logger.info(json.dumps(log_msg, sort_keys=True))
 
 
-@shared_task
-def log_error_mail(request, exc, traceback, data, **kwargs):
-    """Log error when sending email task."""
+def _log_error_mail(exc, data, request=None):
+    """Log an error when sending an email."""
+    request = request or {}
     error = dict(
         name="ils_mail",
         action="error",
@@ -76,3 +213,23 @@ def log_error_mail(request, exc, traceback, data, **kwargs):
         json.dumps(error, sort_keys=True),
         exc_info=exc
     )
+
+
+@shared_task
+def log_successful_mail(_, data):
+    """Log successful email task.
+
+    Deprecated: emails are logged by `send_ils_emails`. Kept for the
+    messages queued with this task as callback.
+    """
+    _log_successful_mail(data)
+
+
+@shared_task
+def log_error_mail(request, exc, traceback, data, **kwargs):
+    """Log error when sending email task.
+
+    Deprecated: emails are logged by `send_ils_emails`. Kept for the
+    messages queued with this task as error callback.
+    """
+    _log_error_mail(exc, data, request=request)
@@ -8,6 +8,7 @@
 """ILS Patrons APIs."""
 
 from functools import partial
+from itertools import islice
 
 from flask import current_app
 from invenio_accounts.models import User
@@ -17,7 +18,9 @@ from invenio_userprofiles.api import UserProfile
 
 from invenio_app_ils.errors import PatronNotFoundError
 from invenio_app_ils.fetchers import pid_fetcher
+from invenio_app_ils.patrons.cache import get_cached_patron
 from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.cache import cached_resolution
 
 PATRON_PID_TYPE = "patid"
 PATRON_PID_MINTER = "patid"
@@ -42,25 +45,47 @@ class Patron(dict):
     # Fake schema used to identify pid type from ES hit
     _schema = "patrons/patron-v1.0.0.json"
 
-    def __init__(self, id, revision_id=None):
+    def __init__(self, id, revision_id=None, user=None, profile=None):
         """Create a `Patron` instance.
 
         Patron instances are not stored in the database
         but are indexed in ElasticSearch.
+
+        :param user: the already fetched `User` of the patron. When given,
+            `profile` is used as is and no query is made.
+        :param profile: the `UserProfile` of the given user, if any.
         """
         _id = int(id)  # internally it is an int
-        _datastore = current_app.extensions["security"].datastore
-        # if not _id throw PatronNotFoundError(_id)
-        user = _datastore.get_user(_id)
-        if not user:
-            raise PatronNotFoundError(_id)
+        if user is None:
+            _datastore = current_app.extensions["security"].datastore
+            # if not _id throw PatronNotFoundError(_id)
+            user = _datastore.get_user(_id)
+            if not user:
+                raise PatronNotFoundError(_id)
+            profile = UserProfile.get_by_userid(_id)
+
+        self._load(user, profile)
+
+    @classmethod
+    def from_user(cls, user, profile=None):
+        """Create a `Patron` instance from an already fetched user.
+
+        Subclasses overriding `__init__` must accept the `user` and `profile`
+        keyword arguments and pass them on.
 
+        :param user: the `User` of the patron.
+        :param profile: the `UserProfile` of the user, if any.
+        """
+        return cls(user.id, user=user, profile=profile)
+
+    def _load(self, user, profile):
+        """Set the patron fields from the user and its profile."""
         self._user = user
         self.id = self._user.id
         # set revision as it is needed by the indexer but always to the same
         # value as we don't need it
         self.revision_id = 1
-        self._profile = UserProfile.get_by_userid(id)
+        self._profile = profile
         self.name = self._profile.full_name if self._profile else ""
         self.email = self._user.email
 
@@ -102,7 +127,7 @@ class Patron(dict):
         if str(patron_pid) == str(SystemAgent.id):
             return SystemAgent()
 
-        return Patron(patron_pid)
+        return get_cached_patron(patron_pid, lambda: Patron(patron_pid))
 
 
 class SystemAgent(Patron):
@@ -118,6 +143,49 @@ class SystemAgent(Patron):
         self.location_pid = ""
 
 
+def stream_patrons(query=None, chunk_size=None):
+    """Stream patrons, fetching users with their profile in a single query.
+
+    :param query: the `User` query to stream, by default all users.
+    :param chunk_size: the number of rows fetched at once from the database,
+        by default `ILS_RECORDS_BULK_LOAD_CHUNK_SIZE`.
+    :returns: a generator of patrons.
+    """
+    query = query if query is not None else User.query
+    chunk_size = (
+        chunk_size or current_app.config["ILS_RECORDS_BULK_LOAD_CHUNK_SIZE"]
+    )
+    rows = (
+        query.outerjoin(UserProfile, UserProfile.user_id == User.id)
+        .add_entity(UserProfile)
+        .order_by(User.id)
+        .yield_per(chunk_size)
+    )
+    cls = current_app_ils.patron_cls
+    for user, profile in rows:
+        yield cls.from_user(user, profile)
+
+
+def get_patrons_by_pids(patron_pids):
+    """Get patrons by pids, loading them in chunks.
+
+    Each chunk of pids is resolved with a single query. Pids of not existing
+    users are skipped.
+
+    :param patron_pids: an iterable of patron pids. It is consumed lazily.
+    :returns: a generator of patrons.
+    """
+    chunk_size = current_app.config["ILS_RECORDS_BULK_LOAD_CHUNK_SIZE"]
+    user_ids = (int(pid) for pid in patron_pids if str(pid).isdigit())
+    while True:
+        chunk = list(islice(user_ids, chunk_size))
+        if not chunk:
+            return
+        query = User.query.filter(User.id.in_(chunk))
+        for patron in stream_patrons(query, chunk_size=chunk_size):
+            yield patron
+
+
 def patron_exists(patron_pid):
     """Return True if the Patron exists given a PID."""
     return User.query.filter_by(id=patron_pid).first() is not None
@@ -129,6 +197,9 @@ def get_patron_or_empty_dict(patron_pid):
         return {}
     try:
         cls = current_app_ils.patron_cls
-        return cls.get_patron(patron_pid).dumps_loader()
+        patron = cached_resolution(
+            (cls, str(patron_pid)), lambda: cls.get_patron(patron_pid)
+        )
+        return patron.dumps_loader()
     except PatronNotFoundError:
         return {}
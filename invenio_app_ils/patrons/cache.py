@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""ILS Patrons cache."""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, has_app_context, has_request_context
+from invenio_accounts.models import User
+from invenio_userprofiles.models import UserProfile
+from sqlalchemy import event
+
+
+class PatronsCache:
+    """Process-wide LRU cache of patrons, expiring after a time to live.
+
+    Changes of users and profiles invalidate the cached patrons of the
+    process where they happen only: the time to live bounds how long other
+    processes can return outdated patrons.
+    """
+
+    def __init__(self, maxsize, ttl):
+        """Constructor.
+
+        :param maxsize: the maximum number of cached patrons.
+        :param ttl: the number of seconds a patron is cached.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._patrons = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached patron or None."""
+        with self._lock:
+            cached = self._patrons.get(key)
+            if cached is None:
+                return None
+            patron, expires_at = cached
+            if expires_at <= time.monotonic():
+                del self._patrons[key]
+                return None
+            self._patrons.move_to_end(key)
+            return patron
+
+    def set(self, key, patron):
+        """Cache the patron."""
+        with self._lock:
+            self._patrons[key] = (patron, time.monotonic() + self.ttl)
+            self._patrons.move_to_end(key)
+            while len(self._patrons) > self.maxsize:
+                self._patrons.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove the patron from the cache."""
+        with self._lock:
+            self._patrons.pop(key, None)
+
+    def clear(self):
+        """Remove all the patrons from the cache."""
+        with self._lock:
+            self._patrons.clear()
+
+
+def _request_patrons():
+    """Return the patrons memo of the current request, if any."""
+    if not has_request_context():
+        return {}
+    if "ils_patrons" not in g:
+        g.ils_patrons = {}
+    return g.ils_patrons
+
+
+def clear_request_patrons(exc=None):
+    """Clear the patrons memo at the end of the request."""
+    g.pop("ils_patrons", None)
+
+
+def get_cached_patron(patron_pid, loader):
+    """Return the patron from the caches, loading and caching it if missing.
+
+    Patrons are memoized for the duration of the current request, and in the
+    process-wide cache when enabled with `ILS_PATRONS_CACHE_TTL`.
+
+    :param patron_pid: the pid of the patron.
+    :param loader: a function returning the patron, called on cache miss.
+    """
+    if not has_app_context():
+        return loader()
+
+    key = str(patron_pid)
+    memo = _request_patrons()
+    patron = memo.get(key)
+    if patron is not None:
+        return patron
+
+    state = current_app.extensions.get("invenio-app-ils")
+    process_cache = state.patrons_cache if state is not None else None
+    if process_cache is not None:
+        patron = process_cache.get(key)
+    if patron is None:
+        patron = loader()
+        if process_cache is not None:
+            process_cache.set(key, patron)
+    memo[key] = patron
+    return patron
+
+
+def invalidate_cached_patron(patron_pid):
+    """Remove the patron from the caches."""
+    if not has_app_context():
+        return
+
+    key = str(patron_pid)
+    _request_patrons().pop(key, None)
+    state = current_app.extensions.get("invenio-app-ils")
+    if state is not None and state.patrons_cache is not None:
+        state.patrons_cache.invalidate(key)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, user):
+    """Invalidate the cached patron of the changed user."""
+    invalidate_cached_patron(user.id)
+
+
+@event.listens_for(UserProfile, "after_insert")
+@event.listens_for(UserProfile, "after_update")
+@event.listens_for(UserProfile, "after_delete")
+def _invalidate_profile(mapper, connection, profile):
+    """Invalidate the cached patron of the changed user profile."""
+    invalidate_cached_patron(profile.user_id)
@@ -7,13 +7,11 @@
 
 """Patron indexer APIs."""
 
-from datetime import datetime
+from itertools import chain
 
 from celery import shared_task
 from elasticsearch import VERSION as ES_VERSION
-from flask import current_app
 from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
-from invenio_circulation.proxies import current_circulation
 from invenio_circulation.search.api import search_by_patron_pid
 from invenio_indexer.api import RecordIndexer
 
@@ -22,7 +20,8 @@ from invenio_app_ils.acquisition.proxies import current_ils_acq
 from invenio_app_ils.document_requests.api import DOCUMENT_REQUEST_PID_TYPE
 from invenio_app_ils.ill.api import BORROWING_REQUEST_PID_TYPE
 from invenio_app_ils.ill.proxies import current_ils_ill
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    search_referenced_records
 from invenio_app_ils.patrons.api import PATRON_PID_TYPE
 from invenio_app_ils.proxies import current_app_ils
 
@@ -31,71 +30,53 @@ lt_es7 = ES_VERSION[0] < 7
 
 def get_loans(patron_pid):
     """Get referenced loans."""
-    referenced = []
-    loan_record_cls = current_circulation.loan_record_cls
-    for hit in search_by_patron_pid(patron_pid=patron_pid).scan():
-        loan = loan_record_cls.get_record_by_pid(hit["pid"])
-        referenced.append(
-            dict(pid_type=CIRCULATION_LOAN_PID_TYPE, record=loan)
-        )
-    return referenced
+    search = search_by_patron_pid(patron_pid=patron_pid)
+    return search_referenced_records(CIRCULATION_LOAN_PID_TYPE, search)
 
 
 def get_document_requests(patron_pid):
     """Get referenced documents requests."""
-    referenced = []
     docreq_search_cls = current_app_ils.document_request_search_cls
-    docreq_record_cls = current_app_ils.document_request_record_cls
-    for request in (
-        docreq_search_cls()
-        .search_by_patron_pid(patron_pid=patron_pid)
-        .scan()
-    ):
-        docreq = docreq_record_cls.get_record_by_pid(request["pid"])
-        referenced.append(
-            dict(pid_type=DOCUMENT_REQUEST_PID_TYPE, record=docreq)
-        )
-    return referenced
+    search = docreq_search_cls().search_by_patron_pid(patron_pid=patron_pid)
+    return search_referenced_records(DOCUMENT_REQUEST_PID_TYPE, search)
 
 
 def get_acquisition_orders(patron_pid):
     """Get referenced acquisition orders."""
-    referenced = []
-    order_record_cls = current_ils_acq.order_record_cls
     order_search_cls = current_ils_acq.order_search_cls
     search = order_search_cls().search_by_patron_pid(patron_pid)
-    for hit in search.scan():
-        order = order_record_cls.get_record_by_pid(hit["pid"])
-        referenced.append(dict(pid_type=ORDER_PID_TYPE, record=order))
-    return referenced
+    return search_referenced_records(ORDER_PID_TYPE, search)
 
 
 def get_ill_borrowing_requests(patron_pid):
     """Get referenced ILL borrowing requests."""
-    referenced = []
-    brw_req_record_cls = current_ils_ill.borrowing_request_record_cls
     brw_req_search_cls = current_ils_ill.borrowing_request_search_cls
     search = brw_req_search_cls().search_by_patron_pid(patron_pid)
-    for hit in search.scan():
-        brw_req = brw_req_record_cls.get_record_by_pid(hit["pid"])
-        referenced.append(
-            dict(pid_type=BORROWING_REQUEST_PID_TYPE, record=brw_req)
-        )
-    return referenced
+    return search_referenced_records(BORROWING_REQUEST_PID_TYPE, search)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(patron):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    patron = scheduler.started(pid_type, pid_value, revision_id)
+    if patron is None:
+        return
     indexer = ReferencedRecordsIndexer()
 
     patron_pid = patron["pid"]
     indexed = dict(pid_type=PATRON_PID_TYPE, record=patron)
 
-    indexer.index(indexed, get_loans(patron_pid))
-    indexer.index(indexed, get_document_requests(patron_pid))
-    indexer.index(indexed, get_acquisition_orders(patron_pid))
-    indexer.index(indexed, get_ill_borrowing_requests(patron_pid))
+    indexer.index(
+        indexed,
+        chain(
+            get_loans(patron_pid),
+            get_document_requests(patron_pid),
+            get_acquisition_orders(patron_pid),
+            get_ill_borrowing_requests(patron_pid),
+        ),
+    )
+    scheduler.processed(pid_type, patron)
 
 
 class PatronIndexer(RecordIndexer):
@@ -125,5 +106,6 @@ class PatronIndexer(RecordIndexer):
     def index(self, patron, arguments=None, **kwargs):
         """Index a Patron."""
         super().index(patron)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((patron,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, PATRON_PID_TYPE, patron
+        )
@@ -7,16 +7,21 @@
 
 """Ils Records API."""
 
+from itertools import islice
+
 from flask import current_app
+from invenio_db import db
 from invenio_jsonschemas import current_jsonschemas
-from invenio_pidstore.models import PersistentIdentifier
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
 from invenio_pidstore.resolver import Resolver
-from invenio_records.api import Record
+from invenio_records.api import Record, _records_state
 from invenio_rest.errors import FieldError
+from jsonref import JsonRef
 from jsonschema.exceptions import ValidationError
 from werkzeug.utils import cached_property
 
 from invenio_app_ils.errors import IlsValidationError
+from invenio_app_ils.records.jsonresolvers.cache import CachedRefLoader
 
 
 class RecordValidator(object):
@@ -68,6 +73,127 @@ class IlsRecord(Record):
         _, record = resolver.resolve(str(pid_value))
         return record
 
+    @classmethod
+    def get_records_by_pids(cls, pid_values, with_deleted=False,
+                            pid_type=None):
+        """Get ils records by pid values, loading them in chunks.
+
+        Each chunk of pid values is resolved with a single query joining the
+        persistent identifiers with the records metadata. PIDs that are not
+        registered are skipped.
+
+        :param pid_values: an iterable of pid values. It is consumed lazily.
+        :param with_deleted: If `True` then it includes deleted records.
+        :param pid_type: the pid type of the records, when different from
+            the one of the class.
+        :returns: a generator of records.
+        """
+        if pid_type is None:
+            pid_type = cls._pid_type
+            record_cls = cls
+        else:
+            record_cls = cls.pid_type_to_record_class(pid_type)
+
+        model_cls = record_cls.model_cls
+        for chunk, rows in cls._query_by_pids(
+            pid_values, pid_type, model_cls, [model_cls], with_deleted
+        ):
+            objs = {pid_value: obj for pid_value, obj in rows}
+            for pid_value in chunk:
+                obj = objs.pop(pid_value, None)
+                if obj is not None:
+                    yield record_cls(obj.json, model=obj)
+
+    @classmethod
+    def get_fields_by_pids(cls, pid_values, fields, pid_type=None):
+        """Get some top-level fields of ils records by pid values.
+
+        On PostgreSQL, only the given fields are fetched from the database,
+        without loading the records. PIDs that are not registered are
+        skipped, as well as deleted records.
+
+        :param pid_values: an iterable of pid values. It is consumed lazily.
+        :param fields: the names of the fields to get.
+        :param pid_type: the pid type of the records, when different from
+            the one of the class.
+        :returns: a generator of dicts with the fields of each record.
+        """
+        if pid_type is None:
+            pid_type = cls._pid_type
+            record_cls = cls
+        else:
+            record_cls = cls.pid_type_to_record_class(pid_type)
+
+        model_cls = record_cls.model_cls
+        project = db.engine.dialect.name == "postgresql"
+        if project:
+            columns = [model_cls.json[field] for field in fields]
+        else:
+            columns = [model_cls.json]
+        for chunk, rows in cls._query_by_pids(
+            pid_values, pid_type, model_cls, columns
+        ):
+            objs = {}
+            for pid_value, *values in rows:
+                if project:
+                    objs[pid_value] = {
+                        field: value
+                        for field, value in zip(fields, values)
+                        if value is not None
+                    }
+                else:
+                    objs[pid_value] = {
+                        field: values[0][field]
+                        for field in fields
+                        if field in values[0]
+                    }
+            for pid_value in chunk:
+                obj = objs.pop(pid_value, None)
+                if obj is not None:
+                    yield obj
+
+    @staticmethod
+    def _query_by_pids(
+        pid_values, pid_type, model_cls, columns, with_deleted=False
+    ):
+        """Query the given columns of the records, in chunks of pid values.
+
+        :returns: a generator of tuples with the chunk of pid values and the
+            rows of the pid value and the columns of each record.
+        """
+        chunk_size = current_app.config["ILS_RECORDS_BULK_LOAD_CHUNK_SIZE"]
+        pid_values = iter(pid_values)
+        while True:
+            chunk = [str(pid) for pid in islice(pid_values, chunk_size)]
+            if not chunk:
+                return
+            with db.session.no_autoflush:
+                query = (
+                    db.session.query(PersistentIdentifier.pid_value, *columns)
+                    .join(
+                        model_cls,
+                        model_cls.id == PersistentIdentifier.object_uuid,
+                    )
+                    .filter(
+                        PersistentIdentifier.pid_type == pid_type,
+                        PersistentIdentifier.object_type == "rec",
+                        PersistentIdentifier.status == PIDStatus.REGISTERED,
+                        PersistentIdentifier.pid_value.in_(chunk),
+                    )
+                )
+                if not with_deleted:
+                    query = query.filter(model_cls.json != None)  # noqa
+                rows = query.all()
+            yield chunk, rows
+
+    def replace_refs(self):
+        """Replace the ``$ref`` keys within the JSON.
+
+        References are resolved once per request or indexing batch.
+        """
+        loader = CachedRefLoader(_records_state.loader_cls())
+        return JsonRef.replace_refs(self, loader=loader)
+
     @classmethod
     def create(cls, data, id_=None, **kwargs):
         """Create IlsRecord record."""
@@ -7,12 +7,99 @@
 
 """Invenio App ILS jsonresolver module."""
 
+from collections import defaultdict
+from copy import deepcopy
+
 from invenio_pidstore.errors import PersistentIdentifierError
+from invenio_records.api import Record
+
+from invenio_app_ils.documents.stock import prefetch_documents_stock
+from invenio_app_ils.patrons.api import get_patrons_by_pids
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.api import IlsRecord
+
+from .cache import cached_resolution, current_ref_cache
+
+
+def get_cached_record(record_cls, record_pid, getter=None):
+    """Return the record, fetched once per request or indexing batch.
+
+    :param record_cls: the class of the record.
+    :param record_pid: the pid value of the record.
+    :param getter: the function fetching the record given its pid, by
+        default `record_cls.get_record_by_pid`.
+    """
+    getter = getter or record_cls.get_record_by_pid
+    return cached_resolution(
+        (record_cls, str(record_pid)), lambda: getter(record_pid)
+    )
+
+
+def _referenced_pids(record):
+    """Return the (pid_type, pid_value) of the records the record refers to.
+
+    Referenced patrons have a None pid type.
+    """
+    if record.get("document_pid"):
+        document_cls = current_app_ils.document_record_cls
+        yield document_cls._pid_type, record["document_pid"]
+    item_pid = record.get("item_pid")
+    if isinstance(item_pid, dict) and item_pid.get("value"):
+        yield item_pid["type"], item_pid["value"]
+    if record.get("patron_pid"):
+        yield None, record["patron_pid"]
+
+
+def prefetch_referenced_records(records):
+    """Fetch in bulk the records that the given records refer to.
+
+    The records, and the documents, items and patrons they refer to, are
+    stored in the current resolution cache with one query per record type:
+    resolving the references of the records then hits the cache. The stock
+    of the documents is aggregated at once as well.
+
+    Copies of the given records are cached, given that resolvers may enrich
+    the fields they return.
+
+    :param records: the records whose references will be resolved.
+    """
+    cache = current_ref_cache()
+    if cache is None:
+        return
+
+    document_cls = current_app_ils.document_record_cls
+    prefetch_documents_stock(
+        [r["pid"] for r in records if isinstance(r, document_cls)]
+    )
+
+    pids_by_type = defaultdict(set)
+    for record in records:
+        if not isinstance(record, dict):
+            # patrons do not refer to other records
+            continue
+        cached = deepcopy(dict(record))
+        if isinstance(record, Record):
+            cached = type(record)(cached, model=record.model)
+        cache.set((type(record), str(record["pid"])), cached)
+        for pid_type, pid_value in _referenced_pids(record):
+            pids_by_type[pid_type].add(str(pid_value))
+
+    patron_pids = pids_by_type.pop(None, set())
+    for pid_type, pids in pids_by_type.items():
+        record_cls = IlsRecord.pid_type_to_record_class(pid_type)
+        for referenced in IlsRecord.get_records_by_pids(
+            pids, pid_type=pid_type
+        ):
+            cache.set((record_cls, referenced["pid"]), referenced)
+
+    patron_cls = current_app_ils.patron_cls
+    for patron in get_patrons_by_pids(patron_pids):
+        cache.set((patron_cls, str(patron.id)), patron)
 
 
 def get_field_value_for_record(record_cls, record_pid, field_name):
     """Return the given field value for a given record PID."""
-    record = record_cls.get_record_by_pid(record_pid)
+    record = get_cached_record(record_cls, record_pid)
 
     if not record or field_name not in record:
         message = "{0} not found in record {1}".format(field_name, record_pid)
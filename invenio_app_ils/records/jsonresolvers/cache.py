@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Cache of the resolved JSON references."""
+
+import json
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class RefResolutionCache:
+    """Cache of resolved references, counting hits and misses."""
+
+    def __init__(self):
+        """Constructor."""
+        self._resolved = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """Return the cached value of the key, loading it on cache miss."""
+        if key in self._resolved:
+            self.hits += 1
+            return self._resolved[key]
+        self.misses += 1
+        value = loader()
+        self._resolved[key] = value
+        return value
+
+    def set(self, key, value):
+        """Store an already resolved value."""
+        self._resolved[key] = value
+
+    def clear(self):
+        """Remove the cached values, keeping the counters."""
+        self._resolved.clear()
+
+    @property
+    def stats(self):
+        """Return the hit and miss counters."""
+        return dict(hits=self.hits, misses=self.misses)
+
+
+def _log_stats(cache, scope):
+    """Log the counters of a cache going out of scope."""
+    if cache.hits or cache.misses:
+        structured_msg = dict(name="ref_resolution_cache", scope=scope)
+        structured_msg.update(cache.stats)
+        current_app.logger.debug(json.dumps(structured_msg, sort_keys=True))
+
+
+def current_ref_cache():
+    """Return the cache of the current request or indexing batch, if any."""
+    if not has_app_context():
+        return None
+    cache = g.get("ils_ref_cache")
+    if cache is None and has_request_context():
+        cache = g.ils_ref_cache = RefResolutionCache()
+    return cache
+
+
+@contextmanager
+def ref_resolution_cache():
+    """Cache the references resolved in the block, e.g. an indexing batch.
+
+    Within a request, the cache of the request is used.
+    """
+    cache = current_ref_cache()
+    if cache is not None:
+        yield cache
+        return
+
+    cache = g.ils_ref_cache = RefResolutionCache()
+    try:
+        yield cache
+    finally:
+        g.pop("ils_ref_cache", None)
+        _log_stats(cache, "batch")
+
+
+def clear_request_ref_cache(exc=None):
+    """Drop the cache at the end of the request."""
+    cache = g.pop("ils_ref_cache", None)
+    if cache is not None:
+        _log_stats(cache, "request")
+
+
+def cached_resolution(key, loader):
+    """Return the resolved value from the current cache, if any.
+
+    :param key: the key of the resolved value, e.g. the `$ref` URL.
+    :param loader: a function resolving the value, called on cache miss.
+    """
+    cache = current_ref_cache()
+    if cache is None:
+        return loader()
+    return cache.get(key, loader)
+
+
+class CachedRefLoader:
+    """JSON references loader using the current resolution cache."""
+
+    def __init__(self, loader):
+        """Constructor.
+
+        :param loader: the loader resolving the references on cache miss.
+        """
+        self.loader = loader
+
+    def __call__(self, uri, **kwargs):
+        """Return the resolved reference."""
+        return cached_resolution(uri, lambda: self.loader(uri, **kwargs))
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_after_flush(session, flush_context):
+    """Drop the cached values after changes, so they are resolved again."""
+    if has_app_context():
+        cache = g.get("ils_ref_cache")
+        if cache is not None:
+            cache.clear()
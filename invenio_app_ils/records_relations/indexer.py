@@ -15,6 +15,8 @@ from invenio_indexer.api import RecordIndexer
 
 from invenio_app_ils.indexer import ReferencedRecordsIndexer
 from invenio_app_ils.records.api import IlsRecord
+from invenio_app_ils.relations.api import SIBLINGS_RELATION_TYPES, \
+    RelationGraph
 
 
 @shared_task(ignore_result=True)
@@ -50,6 +52,11 @@ class RecordRelationIndexer(RecordIndexer):
             if not same_record and pid not in referenced:
                 referenced.add(pid)
 
+        # the relations of all the records are loaded at once
+        graph = RelationGraph.load(
+            [rec.pid for rec in records],
+            component_types=SIBLINGS_RELATION_TYPES,
+        )
         for rec in records:
             add_referenced(rec["pid"], rec._pid_type)
             # TODO: we are indexing too many records here. The records to index
@@ -58,10 +65,8 @@ class RecordRelationIndexer(RecordIndexer):
             # * for siblings -> all
             # * for sequence -> only previous or next
             # this code should be moved up to the relation
-            relations = rec.relations
-            for relation_type, related_records in relations.items():
-                for obj in related_records:
-                    add_referenced(obj["pid_value"], obj["pid_type"])
+            for _, pid in graph.related(rec.pid):
+                add_referenced(pid.pid_value, pid.pid_type)
 
         eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
         index_related_records.apply_async((indexed, list(referenced)), eta=eta)
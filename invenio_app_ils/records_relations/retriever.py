@@ -7,14 +7,76 @@
 
 """APIs to retrieve records relations."""
 
+from collections import defaultdict
+
 from invenio_app_ils.records.jsonresolvers.api import pick
 from invenio_app_ils.relations.api import PARENT_CHILD_RELATION_TYPES, \
-    SEQUENCE_RELATION_TYPES, SIBLINGS_RELATION_TYPES, ParentChildRelation, \
-    SequenceRelation, SiblingsRelation
+    SEQUENCE_RELATION_TYPES, SIBLINGS_RELATION_TYPES, RelationGraph
 
 from .api import RecordRelationsExtraMetadata as RelationsExtraMetadata
 
 
+class RelationsLoader(object):
+    """Load the relations of a record and the related records in bulk.
+
+    The relations of all types are fetched with one query, including the
+    other siblings of the record. Only the parents of the record are
+    fetched for the parent-child types. The related records are fetched with
+    one query per pid type.
+    """
+
+    def __init__(self, record, graph=None):
+        """Constructor.
+
+        :param record: the record with relations.
+        :param graph: the `RelationGraph` with the relations of the record,
+            loaded when not given.
+        """
+        self.record = record
+        self.pid = record.pid
+        self.graph = graph or RelationGraph.load(
+            [self.pid], component_types=SIBLINGS_RELATION_TYPES
+        )
+        self.records = self._load_records()
+
+    def _load_records(self):
+        """Return the related records by pid type and pid value."""
+        from invenio_app_ils.records.api import IlsRecord
+
+        pid_values_by_type = defaultdict(set)
+        for _, pid in self.graph.related(self.pid):
+            pid_values_by_type[pid.pid_type].add(pid.pid_value)
+
+        records = {}
+        for pid_type, pid_values in pid_values_by_type.items():
+            for record in IlsRecord.get_records_by_pids(
+                pid_values, pid_type=pid_type
+            ):
+                records[(pid_type, record["pid"])] = record
+        return records
+
+    def get_relations(self, relation_type):
+        """Return the relations of the given type of the record.
+
+        For siblings, all the relations of the siblings group are returned.
+        """
+        if relation_type in SIBLINGS_RELATION_TYPES:
+            return self.graph.component(self.pid, relation_type)
+        return self.graph.relations_of(self.pid, relation_type)
+
+    def get_record(self, pid):
+        """Return the related record of the given PID."""
+        record = self.records.get((pid.pid_type, pid.pid_value))
+        if record is None:
+            # raises the errors of deleted or not existing records
+            from invenio_app_ils.records.api import IlsRecord
+
+            record = IlsRecord.get_record_by_pid(
+                pid.pid_value, pid_type=pid.pid_type
+            )
+        return record
+
+
 class RelationObjectBuilderMixin(object):
     """Relations object builder."""
 
@@ -47,9 +109,10 @@ class RelationObjectBuilderMixin(object):
 class ParentChildRetriever(RelationObjectBuilderMixin):
     """Retrieve relations of type ParentChild."""
 
-    def __init__(self, child_record):
+    def __init__(self, child_record, loader=None):
         """Constructor."""
         self.child_record = child_record
+        self.loader = loader or RelationsLoader(child_record)
 
     def _build_relation_obj(self, child, parent_pid, relation_type):
         """Return the relation object with any extra metadata."""
@@ -64,9 +127,8 @@ class ParentChildRetriever(RelationObjectBuilderMixin):
         # copy the extra metadata into the relation, if any
         r.update(metadata)
 
-        # fetch the parent to retrieve useful metadata (title, ...)
-        from invenio_app_ils.records.api import IlsRecord
-        parent = IlsRecord.get_record_by_pid(pid_value, pid_type=pid_type)
+        # the parent has useful metadata (title, ...)
+        parent = self.loader.get_record(parent_pid)
 
         # copy relevant fields from parent into the relation
         relevant_fields = self.get_relevant_fields_from(parent)
@@ -82,12 +144,13 @@ class ParentChildRetriever(RelationObjectBuilderMixin):
         """
         relations = {}
         for relation_type in PARENT_CHILD_RELATION_TYPES:
-            pcr = ParentChildRelation(relation_type)
             name = relation_type.name
 
-            for parent_pid in pcr.get_parents_of(self.child_record.pid):
+            for relation in self.loader.get_relations(relation_type):
+                if relation.child_id != self.loader.pid.id:
+                    continue
                 r = self._build_relation_obj(
-                    self.child_record, parent_pid, name
+                    self.child_record, relation.parent, name
                 )
                 relations.setdefault(name, [])
                 relations[name].append(r)
@@ -97,15 +160,16 @@ class ParentChildRetriever(RelationObjectBuilderMixin):
 class SiblingsRetriever(RelationObjectBuilderMixin):
     """Retrieve relations of type Siblings."""
 
-    def __init__(self, record):
+    def __init__(self, record, loader=None):
         """Constructor."""
         self.record = record
+        self.loader = loader or RelationsLoader(record)
 
     @staticmethod
-    def _get_extra_metadata(record, sibling, relation_type):
+    def _get_extra_metadata(
+        record, record_pid, sibling, sibling_pid, relation_type
+    ):
         """Retrieve any extra metadata in the current record or sibling."""
-        record_pid = record.pid
-        sibling_pid = sibling.pid
         # we don't know it extra metadata are stored in this record or in the
         # sibling. Need to check both.
         metadata = {}
@@ -142,13 +206,12 @@ class SiblingsRetriever(RelationObjectBuilderMixin):
 
         r = self.build_relations_object(pid_value, pid_type, relation_type)
 
-        # fetch the sibling to retrieve useful metadata (title, ...) and also
-        # any optional extra metadata for this relation
-        from invenio_app_ils.records.api import IlsRecord
-        sibling = IlsRecord.get_record_by_pid(pid_value, pid_type=pid_type)
+        # the sibling has useful metadata (title, ...) and also any optional
+        # extra metadata for this relation
+        sibling = self.loader.get_record(sibling_pid)
 
         metadata = self._get_extra_metadata(
-            self.record, sibling, relation_type
+            self.record, self.loader.pid, sibling, sibling_pid, relation_type
         )
         # copy the extra metadata into the relation, if any
         r.update(metadata)
@@ -162,10 +225,16 @@ class SiblingsRetriever(RelationObjectBuilderMixin):
         """Get all sibling relations with the current record."""
         relations = {}
         for relation_type in SIBLINGS_RELATION_TYPES:
-            sr = SiblingsRelation(relation_type)
             name = relation_type.name
 
-            for sibling_pid in sr.all(self.record.pid):
+            sibling_pids = {}
+            for relation in self.loader.get_relations(relation_type):
+                for pid in (relation.parent, relation.child):
+                    # exclude itself
+                    if pid.id != self.loader.pid.id:
+                        sibling_pids[pid.id] = pid
+
+            for sibling_pid in sibling_pids.values():
                 r = self._build_relation_obj(sibling_pid, name)
                 relations.setdefault(name, [])
                 relations[name].append(r)
@@ -179,9 +248,10 @@ class SequenceRetriever(RelationObjectBuilderMixin):
     ORDER_VALUE_NEXT = "continues"
     ORDER_VALUE_PREVIOUS = "is_continued_by"
 
-    def __init__(self, record):
+    def __init__(self, record, loader=None):
         """Constructor."""
         self.record = record
+        self.loader = loader or RelationsLoader(record)
 
     def _build_relation_obj(self, related_pid, relation_type):
         """Return the relation object with metadata."""
@@ -190,9 +260,8 @@ class SequenceRetriever(RelationObjectBuilderMixin):
 
         r = self.build_relations_object(pid_value, pid_type, relation_type)
 
-        # fetch the sequence to retrieve useful metadata (title, ...)
-        from invenio_app_ils.records.api import IlsRecord
-        seq_rec = IlsRecord.get_record_by_pid(pid_value, pid_type=pid_type)
+        # the sequence record has useful metadata (title, ...)
+        seq_rec = self.loader.get_record(related_pid)
 
         # copy relevant fields from the sequence record into the relation
         relevant_fields = self.get_relevant_fields_from(seq_rec)
@@ -203,19 +272,23 @@ class SequenceRetriever(RelationObjectBuilderMixin):
         """Get all sequence relations with the current record."""
         relations = {}
         for relation_type in SEQUENCE_RELATION_TYPES:
-            sqr = SequenceRelation(relation_type)
             name = relation_type.name
+            sequence = self.loader.get_relations(relation_type)
 
             # pid_5 --- is previous of ---> [next_6, next_7, ...]
-            for pid in sqr.pid_is_previous(self.record.pid):
-                r = self._build_relation_obj(pid, name)
+            for relation in sequence:
+                if relation.parent_id != self.loader.pid.id:
+                    continue
+                r = self._build_relation_obj(relation.child, name)
                 r[self.ORDER_FIELD_NAME] = self.ORDER_VALUE_PREVIOUS
                 relations.setdefault(name, [])
                 relations[name].append(r)
 
             # pid_5 --- is next of ---> [previous_3, previous_4, ...]
-            for pid in sqr.pid_is_next(self.record.pid):
-                r = self._build_relation_obj(pid, name)
+            for relation in sequence:
+                if relation.child_id != self.loader.pid.id:
+                    continue
+                r = self._build_relation_obj(relation.parent, name)
                 r[self.ORDER_FIELD_NAME] = self.ORDER_VALUE_NEXT
                 relations.setdefault(name, [])
                 relations[name].append(r)
@@ -225,14 +298,15 @@ class SequenceRetriever(RelationObjectBuilderMixin):
 def get_relations(record):
     """Get all relations for the given record."""
     relations = {}
+    loader = RelationsLoader(record)
 
-    pc_rels = ParentChildRetriever(record).get()
+    pc_rels = ParentChildRetriever(record, loader).get()
     relations.update(pc_rels)
 
-    sibl_rels = SiblingsRetriever(record).get()
+    sibl_rels = SiblingsRetriever(record, loader).get()
     relations.update(sibl_rels)
 
-    seq_rels = SequenceRetriever(record).get()
+    seq_rels = SequenceRetriever(record, loader).get()
     relations.update(seq_rels)
 
     return relations
@@ -7,12 +7,14 @@
 
 """PIDRelation APIs wrapper."""
 
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 
 from invenio_db import db
 from invenio_pidrelations.api import PIDRelation
 from invenio_pidrelations.config import RelationType
+from invenio_pidstore.models import PersistentIdentifier
 from sqlalchemy import and_, or_
+from sqlalchemy.orm import aliased, joinedload
 
 from invenio_app_ils.errors import RecordRelationsError
 
@@ -83,6 +85,184 @@ ILS_PIDRELATIONS_TYPES = (
 )
 
 
+class RelationGraph(object):
+    """In-memory graph of PID relations.
+
+    The relations are indexed by PID and relation type, to traverse them
+    without querying the database.
+    """
+
+    def __init__(self, relations, pids=()):
+        """Constructor.
+
+        :param relations: the `PIDRelation` objects of the graph.
+        :param pids: the already fetched PIDs of the relations, kept so that
+            they are found in the session instead of being fetched again.
+        """
+        self.relations = list(relations)
+        self._pids = list(pids)
+        self._adjacency = defaultdict(list)
+        for r in self.relations:
+            self._adjacency[(r.parent_id, r.relation_type)].append(r)
+            self._adjacency[(r.child_id, r.relation_type)].append(r)
+
+    @classmethod
+    def load(cls, pids, relation_types=None, component_types=None):
+        """Load the relations of the given PIDs with a single query.
+
+        The relations connected to the PIDs, directly or through other
+        relations of the same type, are fetched with a recursive query. For
+        the parent-child types, only the relations where the PIDs are
+        children are fetched: the children of a parent, e.g. the volumes of
+        a serial, are not needed to build the relations of the PIDs.
+
+        :param pids: the PIDs whose relations are loaded.
+        :param relation_types: the relation types to load, by default all.
+        :param component_types: the relation types whose connected relations
+            are loaded, by default all but the parent-child types. Only the
+            relations involving the PIDs are loaded for the other types.
+        :returns: a `RelationGraph`.
+        """
+        relation_types = relation_types or ILS_PIDRELATIONS_TYPES
+        if component_types is None:
+            component_types = relation_types
+        component_types = [
+            t for t in component_types if t not in PARENT_CHILD_RELATION_TYPES
+        ]
+        pid_ids = [pid.id for pid in pids]
+        if not pid_ids:
+            return cls([])
+        parent_child_type_ids = [t.id for t in PARENT_CHILD_RELATION_TYPES]
+
+        edges = (
+            db.session.query(
+                PIDRelation.parent_id,
+                PIDRelation.child_id,
+                PIDRelation.relation_type,
+            )
+            .filter(
+                PIDRelation.relation_type.in_([t.id for t in relation_types]),
+                or_(
+                    PIDRelation.child_id.in_(pid_ids),
+                    and_(
+                        PIDRelation.parent_id.in_(pid_ids),
+                        ~PIDRelation.relation_type.in_(parent_child_type_ids),
+                    ),
+                ),
+            )
+            .cte("relation_edges", recursive=True)
+        )
+        if component_types:
+            connected = aliased(PIDRelation)
+            edges = edges.union(
+                db.session.query(
+                    connected.parent_id,
+                    connected.child_id,
+                    connected.relation_type,
+                )
+                .join(
+                    edges,
+                    and_(
+                        connected.relation_type == edges.c.relation_type,
+                        or_(
+                            connected.parent_id == edges.c.parent_id,
+                            connected.parent_id == edges.c.child_id,
+                            connected.child_id == edges.c.parent_id,
+                            connected.child_id == edges.c.child_id,
+                        ),
+                    ),
+                )
+                .filter(
+                    edges.c.relation_type.in_(
+                        [t.id for t in component_types]
+                    )
+                )
+            )
+
+        relations = (
+            PIDRelation.query.options(joinedload(PIDRelation.parent))
+            .join(
+                edges,
+                and_(
+                    PIDRelation.parent_id == edges.c.parent_id,
+                    PIDRelation.child_id == edges.c.child_id,
+                    PIDRelation.relation_type == edges.c.relation_type,
+                ),
+            )
+            .all()
+        )
+        # the children of the parent-child relations are the given PIDs:
+        # only the other children, e.g. siblings, are fetched
+        known_ids = set(pid_ids) | {r.parent_id for r in relations}
+        child_ids = {r.child_id for r in relations} - known_ids
+        children = (
+            PersistentIdentifier.query.filter(
+                PersistentIdentifier.id.in_(child_ids)
+            ).all()
+            if child_ids
+            else []
+        )
+        return cls(relations, pids=children)
+
+    def relations_of(self, pid, relation_type):
+        """Return the relations of the type where the PID is parent or child.
+
+        :param pid: the PID.
+        :param relation_type: `RelationType` named tuple.
+        """
+        return list(self._adjacency[(pid.id, relation_type.id)])
+
+    def component(self, pid, relation_type):
+        """Return the relations of the type connected to the PID.
+
+        :param pid: the PID.
+        :param relation_type: `RelationType` named tuple.
+        """
+        visited = {pid.id}
+        to_visit = [pid.id]
+        relations = {}
+        while to_visit:
+            pid_id = to_visit.pop()
+            for r in self._adjacency[(pid_id, relation_type.id)]:
+                relations[(r.parent_id, r.child_id)] = r
+                for other_id in (r.parent_id, r.child_id):
+                    if other_id not in visited:
+                        visited.add(other_id)
+                        to_visit.append(other_id)
+        return list(relations.values())
+
+    def related(self, pid):
+        """Return the PIDs related to the PID as in the record relations.
+
+        They are the parents of the PID, its siblings and the previous and
+        next PIDs of its sequences.
+
+        :param pid: the PID.
+        :returns: a list of (`RelationType`, PID) tuples.
+        """
+        related = []
+        for relation_type in PARENT_CHILD_RELATION_TYPES:
+            for r in self.relations_of(pid, relation_type):
+                if r.child_id == pid.id:
+                    related.append((relation_type, r.parent))
+
+        for relation_type in SIBLINGS_RELATION_TYPES:
+            siblings = {}
+            for r in self.component(pid, relation_type):
+                for sibling in (r.parent, r.child):
+                    if sibling.id != pid.id:
+                        siblings[sibling.id] = sibling
+            related.extend(
+                (relation_type, sibling) for sibling in siblings.values()
+            )
+
+        for relation_type in SEQUENCE_RELATION_TYPES:
+            for r in self.relations_of(pid, relation_type):
+                other = r.child if r.parent_id == pid.id else r.parent
+                related.append((relation_type, other))
+        return related
+
+
 class Relation(object):
     """Manage related records."""
 
@@ -118,25 +298,28 @@ class Relation(object):
     def get_any_relation_of(self, *pids):
         """Get any relation when given PIDs are parent or child.
 
+        For the parent-child types, only the relations where the given PIDs
+        are children are returned, as loaded by `RelationGraph.load`.
+
         :arg pids: one or multiple PIDs
         """
         all_relation_pids = set()
+        graph = RelationGraph.load(pids, [self.relation_type])
 
         for pid in pids:
-            query = PIDRelation.query.filter_by(
-                relation_type=self.relation_type.id
-            ).filter(or_(PIDRelation.parent == pid, PIDRelation.child == pid))
-
-            results = query.all()
+            results = graph.relations_of(pid, self.relation_type)
             if results:
                 parent = results[0].parent
-                if parent == pid:
+                if parent.id == pid.id:
                     for result in results:
                         all_relation_pids.add(result)
                 else:
                     # get relations of the parent
-                    for result in self.get_relations_by_parent(parent):
-                        all_relation_pids.add(result)
+                    for result in graph.relations_of(
+                        parent, self.relation_type
+                    ):
+                        if result.parent_id == parent.id:
+                            all_relation_pids.add(result)
 
         return list(all_relation_pids)
 
@@ -280,7 +463,10 @@ class SiblingsRelation(Relation):
             # parent or child has no relations yet
             PIDRelation.create(first_pid, second_pid, self.relation_type.id)
         else:
-            if self.relation_exists(first_pid, second_pid):
+            pids = {first_pid.id, second_pid.id}
+            if any(
+                {rel.parent_id, rel.child_id} == pids for rel in all_relations
+            ):
                 # there should be only one possible relation for this PID
                 # for a given `relation_type`
                 # do not raise because it might be that user is just adding
@@ -7,40 +7,34 @@
 
 """Series indexer APIs."""
 
-from datetime import datetime
-
 from celery import shared_task
-from flask import current_app
 from invenio_indexer.api import RecordIndexer
 
-from invenio_app_ils.indexer import ReferencedRecordsIndexer
+from invenio_app_ils.indexer import ReferencedRecordsIndexer, \
+    related_referenced_records
 from invenio_app_ils.proxies import current_app_ils
-from invenio_app_ils.records.api import IlsRecord
 from invenio_app_ils.series.api import SERIES_PID_TYPE
 
 
 def get_related_records(series_pid):
     """Get referenced records via relations."""
-    referenced = []
     series_record_cls = current_app_ils.series_record_cls
     record = series_record_cls.get_record_by_pid(series_pid)
-    relations = record.relations
-    for relation_type, related_records in relations.items():
-        for obj in related_records:
-            rec = IlsRecord.get_record_by_pid(
-                obj["pid_value"], pid_type=obj["pid_type"]
-            )
-            referenced.append(dict(pid_type=obj["pid_type"], record=rec))
-    return referenced
+    return related_referenced_records(record)
 
 
 @shared_task(ignore_result=True)
-def index_referenced_records(series):
+def index_referenced_records(pid_type, pid_value, revision_id):
     """Index referenced records."""
+    scheduler = current_app_ils.referenced_records_scheduler
+    series = scheduler.started(pid_type, pid_value, revision_id)
+    if series is None:
+        return
     indexer = ReferencedRecordsIndexer()
 
     indexed = dict(pid_type=SERIES_PID_TYPE, record=series)
     indexer.index(indexed, get_related_records(series["pid"]))
+    scheduler.processed(pid_type, series)
 
 
 class SeriesIndexer(RecordIndexer):
@@ -49,5 +43,6 @@ class SeriesIndexer(RecordIndexer):
     def index(self, series, arguments=None, **kwargs):
         """Index an Series."""
         super().index(series)
-        eta = datetime.utcnow() + current_app.config["ILS_INDEXER_TASK_DELAY"]
-        index_referenced_records.apply_async((series,), eta=eta)
+        current_app_ils.referenced_records_scheduler.schedule(
+            index_referenced_records, SERIES_PID_TYPE, series
+        )
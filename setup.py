@@ -84,6 +84,8 @@ install_requires = [
     "sentry-sdk>=0.10.2",
     # needed to have namedtuple json serialized as dict
     "simplejson>=3",
+    # needed to set many fields of a hash at once
+    "redis>=3.5.0",
 ]
 
 packages = find_packages()
@@ -118,6 +120,7 @@ setup(
             'stats = invenio_stats.cli:stats',
             "vocabulary = invenio_app_ils.vocabularies.cli:vocabulary",
             "fixtures = invenio_app_ils.cli:fixtures",
+            "indices = invenio_app_ils.cli:indices",
         ],
         "invenio_base.apps": [
             "ils_ui = invenio_app_ils.ext:InvenioAppIlsUI",
@@ -142,6 +145,12 @@ setup(
             "00_invenio_app_ils = invenio_app_ils.config",
             "00_invenio_app_ils_circulation = invenio_app_ils.circulation.config"
         ],
+        "invenio_db.alembic": [
+            "invenio_app_ils = invenio_app_ils:alembic",
+        ],
+        "invenio_db.models": [
+            "ils_circulation = invenio_app_ils.circulation.models",
+        ],
         "invenio_i18n.translations": ["messages = invenio_app_ils"],
         "invenio_jsonschemas.schemas": [
             "acquisition = invenio_app_ils.acquisition.schemas",
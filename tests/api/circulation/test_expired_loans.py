@@ -10,7 +10,7 @@
 from datetime import timedelta
 
 import arrow
-from flask import url_for
+from flask import current_app, g, url_for
 from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search
 from tests.helpers import user_login
@@ -18,9 +18,23 @@ from tests.helpers import user_login
 from invenio_app_ils.circulation.tasks import cancel_expired_loan_requests
 from invenio_app_ils.patrons.api import SystemAgent
 
+from invenio_app_ils.circulation.transitions import (  # isort:skip
+    DeferrableTransitionMixin,
+    deferred_transitions,
+)
 
-def test_cancel_expired_loans(client, json_headers, db, users, testdata):
+
+def test_cancel_expired_loans(
+    client, json_headers, db, users, testdata, mocker
+):
     """Test cancellation of loan requests after expiration date."""
+    mocker.patch.dict(
+        current_app.config, ILS_CIRCULATION_EXPIRED_LOAN_REQUESTS_CHUNK_SIZE=2
+    )
+    cascades = mocker.patch(
+        "invenio_app_ils.circulation.indexer."
+        "index_loans_referenced_records.apply_async"
+    )
 
     user_login(client, "admin", users)
 
@@ -66,7 +80,12 @@ def test_cancel_expired_loans(client, json_headers, db, users, testdata):
     expired_pids, not_expired_pids = prepare_data()
 
     # trigger cancel expired loan requests
-    cancel_expired_loan_requests.apply_async()
+    cancelled, failed = cancel_expired_loan_requests.apply_async().get()
+    assert cancelled == len(expired_pids)
+    assert failed == 0
+    # one indexing of the referenced records per chunk
+    assert cascades.call_count == 2
+    current_search.flush_and_refresh(index="*")
 
     for pid_value in expired_pids:
         res = client.get(
@@ -86,3 +105,32 @@ def test_cancel_expired_loans(client, json_headers, db, users, testdata):
         loan = res.get_json()["metadata"]
         assert loan["state"] == "PENDING"
         assert "cancel_reason" not in loan
+
+
+def test_deferred_transitions(app, mocker):
+    """Test that the end of deferrable transitions is deferred."""
+    ended = []
+
+    class Transition(object):
+        def after(self, loan, initial_loan):
+            ended.append(loan)
+
+    class DeferrableTransition(DeferrableTransitionMixin, Transition):
+        pass
+
+    transition = DeferrableTransition()
+    initial_loan, loan = mocker.Mock(), mocker.Mock()
+    transition.after(loan, initial_loan)
+    assert ended == [loan]
+    assert not loan.commit.called
+
+    with deferred_transitions() as deferred:
+        transition.after(loan, initial_loan)
+    assert ended == [loan]
+    assert deferred == [
+        dict(transition=transition, initial_loan=initial_loan, loan=loan)
+    ]
+    assert initial_loan.date_fields2str.called
+    assert loan.date_fields2str.called
+    assert loan.commit.called
+    assert "ils_deferred_transitions" not in g
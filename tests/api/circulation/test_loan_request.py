@@ -12,10 +12,13 @@ from copy import deepcopy
 from datetime import timedelta
 
 import arrow
+import pytest
 from flask import url_for
 from invenio_search import current_search
 from tests.helpers import user_login
 
+from invenio_app_ils.circulation.api import get_patron_loans_states
+
 NEW_LOAN = {
     "document_pid": "CHANGE ME IN EACH TEST",
     "patron_pid": "3",
@@ -235,3 +238,26 @@ def test_request_loan_with_active_loan_or_loan_request(
     params["transaction_user_pid"] = str(user.id)
     res = client.post(url, headers=json_headers, data=json.dumps(params))
     assert res.status_code == 400
+
+
+def test_request_loan_twice_before_refresh(
+    app, db, client, json_headers, users, testdata
+):
+    """Test that a loan request is found before Elasticsearch is refreshed."""
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("Loans are looked up in the database on PostgreSQL only")
+    url = url_for("invenio_app_ils_circulation.loan_request")
+    user = user_login(client, "patron1", users)
+    params = deepcopy(NEW_LOAN)
+    params["document_pid"] = "docid-4"
+    params["transaction_user_pid"] = str(user.id)
+    res = client.post(url, headers=json_headers, data=json.dumps(params))
+    assert res.status_code == 202
+    states = get_patron_loans_states(
+        params["patron_pid"],
+        app.config["CIRCULATION_STATES_LOAN_REQUEST"],
+        document_pid="docid-4",
+    )
+    assert states == ["PENDING"]
+    res = client.post(url, headers=json_headers, data=json.dumps(params))
+    assert res.status_code == 400
@@ -12,17 +12,28 @@ from datetime import timedelta
 
 import arrow
 from flask import current_app
+from invenio_cache import current_cache
 from invenio_circulation.api import Loan
 from invenio_circulation.proxies import current_circulation
 from invenio_indexer.api import RecordIndexer
 from invenio_search import current_search
 from tests.helpers import user_login
 
+from invenio_app_ils.circulation.search import get_all_expiring_loans, \
+    get_overdue_loans_to_remind
 from invenio_app_ils.patrons.api import Patron
+from invenio_app_ils.records.jsonresolvers.api import pick
 
 from invenio_app_ils.circulation.mail.tasks import (  # isort:skip
+    LOAN_NOTIFICATION_INITIAL_FIELDS,
+    get_loans_mail_reminders_counts,
+    loan_notifications_batch,
+    notify_loan_change,
     send_expiring_loans_mail_reminder,
+    send_loans_change_mails,
+    send_loans_mail_reminders,
     send_overdue_loans_mail_reminder,
+    stream_loans,
 )
 
 
@@ -88,6 +99,13 @@ def test_email_on_overdue_loans(app_with_mail, db, users, testdata, mocker):
 
     prepare_data()
 
+    days = current_app.config["ILS_CIRCULATION_MAIL_OVERDUE_REMINDER_INTERVAL"]
+    to_remind = get_overdue_loans_to_remind(days).execute()
+    assert {hit.pid for hit in to_remind.hits} == {
+        testdata["loans"][0]["pid"],
+        testdata["loans"][1]["pid"],
+    }
+
     with app_with_mail.extensions["mail"].record_messages() as outbox:
         assert len(outbox) == 0
         send_overdue_loans_mail_reminder.apply_async()
@@ -141,3 +159,131 @@ def test_email_on_expiring_loans(app_with_mail, db, users, testdata, mocker):
         assert len(outbox) == 0
         send_expiring_loans_mail_reminder.apply_async()
         assert len(outbox) == 3
+
+
+def test_loans_mail_reminders_in_chunks(
+    app_with_mail, db, users, testdata, mocker
+):
+    """Test that the reminders are sent in chunks and can be resumed."""
+    mocker.patch(
+        "invenio_app_ils.patrons.api.Patron.get_patron",
+        return_value=Patron(users["patron1"].id),
+    )
+    mocker.patch.dict(
+        app_with_mail.config, ILS_CIRCULATION_MAIL_REMINDERS_CHUNK_SIZE=2
+    )
+    days = app_with_mail.config["ILS_CIRCULATION_LOAN_WILL_EXPIRE_DAYS"]
+    date = (arrow.utcnow() + timedelta(days=days)).date().isoformat()
+    loans = testdata["loans"][:5]
+    for loan in loans:
+        loan["end_date"] = date
+        loan["state"] = "ITEM_ON_LOAN"
+        loan.commit()
+    db.session.commit()
+    indexer = RecordIndexer()
+    for loan in loans:
+        indexer.index(loan)
+    current_search.flush_and_refresh(index="*")
+
+    search = get_all_expiring_loans(days)
+    expiring = [loan["pid"] for chunk in stream_loans(search)
+                for loan in chunk]
+    assert expiring == sorted(expiring)
+
+    with app_with_mail.extensions["mail"].record_messages() as outbox:
+        run = send_loans_mail_reminders("expiring", search)
+        assert run["matched"] == len(expiring)
+        assert run["chunks"] == (len(expiring) + 1) // 2
+        assert len(outbox) == len(expiring)
+    counts = get_loans_mail_reminders_counts("expiring", run["run_id"])
+    assert counts == dict(sent=len(expiring), skipped=0, failed=0)
+
+    # resume an interrupted run after the first chunk
+    current_cache.set(
+        "ils:circulation:mail_reminders:expiring",
+        dict(
+            run_id=run["run_id"],
+            date=arrow.now().date().isoformat(),
+            after=expiring[1],
+            matched=2,
+            chunks=1,
+        ),
+    )
+    with app_with_mail.extensions["mail"].record_messages() as outbox:
+        resumed = send_loans_mail_reminders("expiring", search)
+        assert resumed["run_id"] == run["run_id"]
+        assert resumed["matched"] == len(expiring)
+        assert len(outbox) == len(expiring) - 2
+    assert current_cache.get("ils:circulation:mail_reminders:expiring") is None
+
+
+def test_loan_change_notifications(app_with_mail, testdata, mocker):
+    """Test that loan emails are built by tasks, in batches."""
+    mocker.patch.dict(app_with_mail.config, ILS_MAIL_BATCH_SIZE=2)
+    task = mocker.patch(
+        "invenio_app_ils.circulation.mail.tasks."
+        "send_loans_change_mails.apply_async"
+    )
+    available_item = mocker.patch(
+        "invenio_app_ils.circulation.mail.messages."
+        "get_available_item_by_doc_pid",
+        return_value=None,
+    )
+    loans = [
+        Loan.get_record_by_pid(loan["pid"]) for loan in testdata["loans"][:3]
+    ]
+
+    notify_loan_change(loans[0], loans[0], "request")
+    (notifications,), = task.call_args[0]
+    assert notifications == [
+        dict(
+            loan_pid=loans[0]["pid"],
+            revision_id=loans[0].revision_id,
+            trigger="request",
+            no_available_items=True,
+            initial_loan=pick(loans[0], *LOAN_NOTIFICATION_INITIAL_FIELDS),
+        )
+    ]
+
+    task.reset_mock()
+    available_item.return_value = "itemid-1"
+    with loan_notifications_batch():
+        for loan in loans:
+            notify_loan_change(loan, loan, "request")
+        # the available items are checked when the loans change
+        available_item.return_value = None
+        assert not task.called
+    assert task.call_count == 2
+    notifications = [n for call in task.call_args_list for n in call[0][0][0]]
+    assert len(task.call_args_list[0][0][0][0]) == 2
+    assert [n["trigger"] for n in notifications] == ["request"] * len(loans)
+    assert not any(n["no_available_items"] for n in notifications)
+    # the notifications of each patron are next to each other
+    patron_pids = [
+        Loan.get_record_by_pid(n["loan_pid"])["patron_pid"]
+        for n in notifications
+    ]
+    assert patron_pids == sorted(patron_pids)
+
+
+def test_loan_change_mails_task(app_with_mail, testdata, mocker):
+    """Test that the emails are built with the trigger and the loan."""
+    send_loan_mail = mocker.patch(
+        "invenio_app_ils.circulation.mail.tasks.send_loan_mail"
+    )
+    loan = Loan.get_record_by_pid(testdata["loans"][0]["pid"])
+
+    send_loans_change_mails([
+        dict(
+            loan_pid=loan["pid"],
+            revision_id=loan.revision_id,
+            trigger="request",
+            no_available_items=True,
+            initial_loan=pick(loan, *LOAN_NOTIFICATION_INITIAL_FIELDS),
+        )
+    ])
+    kwargs = send_loan_mail.call_args[1]
+    assert kwargs["action"] == "request"
+    assert isinstance(kwargs["loan"], current_circulation.loan_record_cls)
+    assert kwargs["loan"]["pid"] == loan["pid"]
+    assert kwargs["message_ctx"]["no_available_items"]
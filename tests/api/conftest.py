@@ -35,6 +35,7 @@ from invenio_app_ils.internal_locations.api import INTERNAL_LOCATION_PID_TYPE, \
     InternalLocation
 from invenio_app_ils.items.api import ITEM_PID_TYPE, Item
 from invenio_app_ils.locations.api import LOCATION_PID_TYPE, Location
+from invenio_app_ils.locations.directory import invalidate_locations_directory
 from invenio_app_ils.series.api import SERIES_PID_TYPE, Series
 
 
@@ -143,6 +144,8 @@ def testdata(app, db, es_clear, users):
         ri.index(rec)
 
     current_search.flush_and_refresh(index="*")
+    # the directory is kept across tests, while the database is not
+    invalidate_locations_directory()
 
     return {
         "document_requests": doc_reqs,
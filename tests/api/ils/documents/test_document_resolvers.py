@@ -7,7 +7,21 @@
 
 """Tests for document resolvers."""
 
+from invenio_app_ils.circulation.search import get_active_loans_by_doc_pid, \
+    get_overdue_loans_by_doc_pid, get_past_loans_by_doc_pid, \
+    get_pending_loans_by_doc_pid
 from invenio_app_ils.documents.api import Document
+from invenio_app_ils.documents.stock import get_document_stock, \
+    get_documents_stock, prefetch_documents_stock
+from invenio_app_ils.documents.tasks import reconcile_documents_circulation
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.cache import ref_resolution_cache
+
+from invenio_app_ils.documents.circulation import (  # isort:skip
+    LocalDocumentsCirculationStore,
+    get_documents_circulation,
+    update_loan_circulation,
+)
 
 
 def test_document_resolvers(app, testdata):
@@ -30,3 +44,104 @@ def test_document_resolvers(app, testdata):
     mediums = set([item["medium"] for item in document["items"]["hits"]])
     mediums.add("ELECTRONIC_VERSION")
     assert set(document["stock"]["mediums"]) == mediums
+
+
+def test_documents_circulation(app, testdata):
+    """Test the circulation summary of many documents at once."""
+    doc_pids = [doc["pid"] for doc in testdata["documents"]]
+    summaries = get_documents_circulation(doc_pids + ["not-existing-pid"])
+    assert set(summaries) == set(doc_pids + ["not-existing-pid"])
+
+    item_search = current_app_ils.item_search_cls()
+    for doc_pid in doc_pids:
+        circulation = summaries[doc_pid]
+        assert circulation["past_loans_count"] == \
+            get_past_loans_by_doc_pid(doc_pid).count()
+        assert circulation["active_loans"] == \
+            get_active_loans_by_doc_pid(doc_pid).count()
+        assert circulation["pending_loans"] == \
+            get_pending_loans_by_doc_pid(doc_pid).count()
+        assert circulation["overdue_loans"] == \
+            get_overdue_loans_by_doc_pid(doc_pid).count()
+
+        items_count = item_search.search_by_document_pid(doc_pid).count()
+        unavailable = item_search.get_unavailable_items_by_document_pid(
+            doc_pid
+        ).count()
+        assert circulation["can_circulate_items_count"] == \
+            items_count - unavailable
+
+    assert summaries["not-existing-pid"]["active_loans"] == 0
+    assert summaries["not-existing-pid"]["can_circulate_items_count"] == 0
+
+
+def test_document_items_resolver_max_hits(app, testdata):
+    """Test that the embedded items are capped."""
+    doc_pid = testdata["documents"][0]["pid"]
+    app.config["ILS_DOCUMENT_ITEMS_MAX_HITS"] = 2
+    try:
+        document = Document.get_record_by_pid(doc_pid).replace_refs()
+    finally:
+        app.config["ILS_DOCUMENT_ITEMS_MAX_HITS"] = None
+
+    items = document["items"]
+    assert items["total"] == 9
+    assert len(items["hits"]) == 2
+    assert items["more"]
+    on_shelf_total = sum(
+        location["total"] for location in items["on_shelf"].values()
+    )
+    assert on_shelf_total == 9
+
+
+def test_materialized_documents_circulation(app, testdata, mocker):
+    """Test the circulation summaries read from the materialized store."""
+    doc_pids = [doc["pid"] for doc in testdata["documents"]]
+    aggregated = get_documents_circulation(doc_pids)
+
+    store = LocalDocumentsCirculationStore()
+    state = app.extensions["invenio-app-ils"]
+    mocker.patch.dict(state.__dict__, documents_circulation_store=store)
+    assert reconcile_documents_circulation() == (len(doc_pids), 0)
+    assert get_documents_circulation(doc_pids) == aggregated
+
+    doc_pid = doc_pids[0]
+    pending_loans = aggregated[doc_pid]["pending_loans"]
+    loan = dict(pid="not-indexed", document_pid=doc_pid, state="PENDING")
+    versions = store.get_versions([doc_pid])
+    update_loan_circulation(dict(state="CREATED"), loan)
+    circulation = get_documents_circulation([doc_pid])[doc_pid]
+    assert circulation["pending_loans"] == pending_loans + 1
+
+    # a circulation fetched before the change does not overwrite it
+    stale = dict(loans={}, items={}, past_loans_count=0)
+    assert not store.replace(doc_pid, stale, version=versions[doc_pid])
+    circulation = get_documents_circulation([doc_pid])[doc_pid]
+    assert circulation["pending_loans"] == pending_loans + 1
+
+    # the loan is not indexed: the reconciliation fixes the drift
+    assert reconcile_documents_circulation() == (len(doc_pids), 1)
+    assert get_documents_circulation(doc_pids) == aggregated
+
+
+def test_documents_stock(app, testdata):
+    """Test the stock of many documents at once."""
+    doc_pids = [doc["pid"] for doc in testdata["documents"]]
+    stocks = get_documents_stock(doc_pids + ["not-existing-pid"])
+    assert stocks["not-existing-pid"] == {"mediums": []}
+
+    item_search = current_app_ils.item_search_cls()
+    eitem_search = current_app_ils.eitem_search_cls()
+    for doc_pid in doc_pids:
+        items = item_search.search_by_document_pid(doc_pid).scan()
+        mediums = {item.to_dict().get("medium") for item in items}
+        mediums.discard(None)
+        if eitem_search.search_by_document_pid(doc_pid).count():
+            mediums.add("ELECTRONIC_VERSION")
+        assert set(stocks[doc_pid]["mediums"]) == mediums
+
+    with ref_resolution_cache() as cache:
+        prefetch_documents_stock(doc_pids)
+        for doc_pid in doc_pids:
+            assert get_document_stock(doc_pid) == stocks[doc_pid]
+        assert cache.misses == 0
@@ -12,6 +12,12 @@ import json
 from flask import url_for
 from tests.helpers import user_login
 
+from invenio_app_ils.documents.api import Document
+from invenio_app_ils.records_relations.retriever import RelationsLoader
+from invenio_app_ils.relations.api import MULTIPART_MONOGRAPH_RELATION, \
+    ParentChildRelation, RelationGraph
+from invenio_app_ils.series.api import Series
+
 from .helpers import recrel_assert_record_relations, \
     recrel_choose_endpoints_and_do_request
 
@@ -526,3 +532,26 @@ def test_parent_child_relations(client, json_headers, testdata, users):
         },
     ]
     _test_pc_invalid_relations_should_fail(client, json_headers, invalids)
+
+
+def test_relations_loader_parent_child(testdata):
+    """Test that only the parents of a child are loaded."""
+    parent = Series.get_record_by_pid("serid-1")
+    first, second = [
+        Document.get_record_by_pid(pid) for pid in ("docid-1", "docid-2")
+    ]
+    relation = ParentChildRelation(MULTIPART_MONOGRAPH_RELATION)
+    relation.add(parent.pid, first.pid)
+    relation.add(parent.pid, second.pid)
+
+    loader = RelationsLoader(first)
+    assert [
+        (r.parent.pid_value, r.child.pid_value) for r in loader.graph.relations
+    ] == [("serid-1", "docid-1")]
+    assert {r["pid"] for r in loader.records.values()} == {"serid-1"}
+
+    # the children of a parent are not loaded
+    assert RelationsLoader(parent).graph.relations == []
+    # nor the other children of the parents
+    graph = RelationGraph.load([first.pid])
+    assert [r.child.pid_value for r in graph.relations] == ["docid-1"]
@@ -12,6 +12,10 @@ import json
 from flask import url_for
 from tests.helpers import get_test_record, user_login
 
+from invenio_app_ils.documents.api import Document
+from invenio_app_ils.relations.api import LANGUAGE_RELATION, \
+    SEQUENCE_RELATION, RelationGraph, SequenceRelation, SiblingsRelation
+
 from .helpers import recrel_assert_record_relations, \
     recrel_choose_endpoints_and_do_request
 
@@ -297,3 +301,38 @@ def test_sequence_relations(client, json_headers, testdata, users):
     _test_sequence_invalid_relations_should_fail(
         client, json_headers, invalids, status_code=400
     )
+
+
+def test_relation_graph(testdata):
+    """Test loading the connected relations of many PIDs at once."""
+    pids = [
+        Document.get_record_by_pid("docid-{}".format(i)).pid
+        for i in range(1, 6)
+    ]
+    # sequence 1 -> 2 -> 3 and siblings 3, 4, 5
+    sequence = SequenceRelation(SEQUENCE_RELATION)
+    sequence.add(pids[0], pids[1])
+    sequence.add(pids[1], pids[2])
+    siblings = SiblingsRelation(LANGUAGE_RELATION)
+    siblings.add(pids[2], pids[3])
+    siblings.add(pids[2], pids[4])
+
+    graph = RelationGraph.load([pids[0], pids[4]])
+    assert len(graph.relations) == 4
+    assert len(graph.component(pids[0], SEQUENCE_RELATION)) == 2
+    assert len(graph.relations_of(pids[0], SEQUENCE_RELATION)) == 1
+    assert {pid.pid_value for _, pid in graph.related(pids[4])} == {
+        "docid-3",
+        "docid-4",
+    }
+
+    # only the relations of the PIDs for types without components
+    graph = RelationGraph.load(
+        [pids[0]], [SEQUENCE_RELATION], component_types=[]
+    )
+    assert len(graph.relations) == 1
+    assert [pid.pid_value for _, pid in graph.related(pids[0])] == [
+        "docid-2"
+    ]
+
+    assert len(siblings.get_any_relation_of(pids[3], pids[4])) == 2
@@ -13,6 +13,10 @@ from flask import url_for
 from tests.helpers import get_test_record, user_login
 
 from invenio_app_ils.documents.api import Document
+from invenio_app_ils.records.api import IlsRecord
+from invenio_app_ils.records_relations.retriever import RelationsLoader, \
+    SiblingsRetriever
+from invenio_app_ils.relations.api import LANGUAGE_RELATION, SiblingsRelation
 
 from .helpers import recrel_assert_record_relations, \
     recrel_choose_endpoints_and_do_request
@@ -643,3 +647,28 @@ def test_siblings_relations(client, json_headers, testdata, users):
         },
     ]
     _test_sibl_invalid_relations_should_fail(client, json_headers, invalids)
+
+
+def test_relations_loader(testdata, mocker):
+    """Test that the related records are fetched in bulk."""
+    first, second, third = [
+        Document.get_record_by_pid(pid)
+        for pid in ("docid-1", "docid-2", "docid-6")
+    ]
+    relation = SiblingsRelation(LANGUAGE_RELATION)
+    relation.add(first.pid, second.pid)
+    relation.add(first.pid, third.pid)
+
+    get_records_by_pids = mocker.spy(IlsRecord, "get_records_by_pids")
+    loader = RelationsLoader(second)
+    assert get_records_by_pids.call_count == 1
+    assert {r["pid"] for r in loader.records.values()} == {
+        "docid-1",
+        "docid-6",
+    }
+
+    relations = SiblingsRetriever(second, loader).get()
+    assert {r["pid_value"] for r in relations["language"]} == {
+        "docid-1",
+        "docid-6",
+    }
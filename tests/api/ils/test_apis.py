@@ -7,11 +7,12 @@
 
 """Test ILS APIs."""
 
+import pytest
 from invenio_accounts.models import User
 from tests.helpers import get_test_record
 
 from invenio_app_ils.documents.api import Document
-from invenio_app_ils.patrons.api import patron_exists
+from invenio_app_ils.patrons.api import patron_exists, stream_patrons
 from invenio_app_ils.proxies import current_app_ils
 from invenio_app_ils.records.api import IlsRecord
 from invenio_app_ils.series.api import Series
@@ -48,13 +49,61 @@ def test_apis(testdata):
             assert record["pid"] == pid
             assert record._pid_type == pid_type
 
+    def test_get_records_by_pids():
+        """Test get_records_by_pids."""
+        pids = ["docid-2", "docid-1", "not-existing-pid", "docid-1"]
+        records = list(Document.get_records_by_pids(iter(pids)))
+        assert [r["pid"] for r in records] == ["docid-2", "docid-1"]
+        assert all(isinstance(r, Document) for r in records)
+
+        records = list(
+            IlsRecord.get_records_by_pids(["serid-1"], pid_type="serid")
+        )
+        assert len(records) == 1
+        assert isinstance(records[0], Series)
+        assert records[0]["pid"] == "serid-1"
+
+    def test_get_fields_by_pids():
+        """Test get_fields_by_pids."""
+        pids = ["docid-2", "docid-1", "not-existing-pid"]
+        docs = list(Document.get_fields_by_pids(pids, ["pid", "title"]))
+        assert docs == [
+            dict(pid=pid, title=Document.get_record_by_pid(pid)["title"])
+            for pid in ["docid-2", "docid-1"]
+        ]
+
     def test_get_default_location_pid():
         """Asset that the default location is the first created."""
         first = get_test_record(testdata, "locations", "locid-1")
         pid_value, _ = current_app_ils.get_default_location_pid
         assert pid_value == first["pid"]
 
+    def test_stream_patrons():
+        """Test streaming patrons with their profile."""
+        Patron = current_app_ils.patron_cls
+        users = User.query.order_by(User.id).all()
+        patrons = list(stream_patrons(chunk_size=2))
+        assert [p.id for p in patrons] == [u.id for u in users]
+        for patron in patrons:
+            assert patron.dumps() == Patron(patron.id).dumps()
+
     test_patron_exists()
+    test_stream_patrons()
     test_get_record_by_pid()
     test_get_record_by_pid_and_pid_type()
+    test_get_records_by_pids()
+    test_get_fields_by_pids()
     test_get_default_location_pid()
+
+
+def test_get_fields_by_pids_projection(db, testdata):
+    """Test that the fields are projected in the database query."""
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("Fields are projected on PostgreSQL only")
+    fields = ["pid", "authors", "edition", "not-existing-field"]
+    pids = [doc["pid"] for doc in testdata["documents"]]
+    docs = list(Document.get_fields_by_pids(pids, fields))
+    assert docs == [
+        {field: doc[field] for field in fields if field in doc}
+        for doc in testdata["documents"]
+    ]
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test referenced records indexer."""
+
+from datetime import datetime, timedelta
+
+import click
+import pytest
+from invenio_search import current_search
+
+from invenio_app_ils.cli import _load_rebuild_checkpoint, \
+    _save_rebuild_checkpoint, rebuild_index_partition, \
+    rebuild_index_partitions
+from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE, Document
+from invenio_app_ils.documents.indexer import REFERENCED_FIELDS, \
+    RELATED_RECORDS, get_changed_referenced_pid_types
+from invenio_app_ils.indexer import LocalPendingCascadesStore, \
+    ReferencedRecordsIndexer, ReferencedRecordsScheduler, chunks
+from invenio_app_ils.items.api import ITEM_PID_TYPE
+from invenio_app_ils.proxies import current_app_ils
+
+
+def test_chunks():
+    """Test splitting an iterable in chunks."""
+    assert list(chunks([], 2)) == []
+    assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunks(iter(range(4)), 2)) == [[0, 1], [2, 3]]
+
+
+def test_referenced_records_bulk_indexing(testdata):
+    """Test that referenced records are indexed in chunks."""
+    document = testdata["documents"][0]
+    indexed = dict(pid_type=DOCUMENT_PID_TYPE, record=document)
+    referenced = [
+        dict(pid_type=ITEM_PID_TYPE, record=item)
+        for item in testdata["items"][:5]
+    ]
+
+    indexer = ReferencedRecordsIndexer(chunk_size=2)
+    stats = indexer.index(indexed, iter(referenced))
+    assert stats == dict(success=5, failed=0)
+
+    current_search.flush_and_refresh(index="items")
+    search = current_app_ils.item_search_cls()
+    for r in referenced:
+        assert search.get_record(r["record"].id).execute().hits
+
+
+def test_referenced_records_scheduler_coalescing(app, mocker):
+    """Test that triggers for a queued cascade are merged into it."""
+    mocked_datetime = mocker.patch("invenio_app_ils.indexer.datetime")
+    mocked_datetime.utcnow.return_value = datetime(2020, 1, 1)
+    task = mocker.Mock()
+    scheduler = ReferencedRecordsScheduler(LocalPendingCascadesStore())
+    document = dict(pid="docid-1")
+
+    assert scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+    assert not scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+    assert not scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+    assert scheduler.schedule(task, ITEM_PID_TYPE, dict(pid="itemid-1"))
+    assert task.apply_async.call_count == 2
+
+    # once started, new triggers are scheduled again
+    scheduler.started(DOCUMENT_PID_TYPE, "docid-1")
+    assert scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+    assert task.apply_async.call_count == 3
+
+    assert scheduler.counters == {
+        DOCUMENT_PID_TYPE: dict(scheduled=2, collapsed=2),
+        ITEM_PID_TYPE: dict(scheduled=1),
+    }
+
+
+def test_referenced_records_scheduler_trigger_before_eta(app, mocker):
+    """Test that a trigger just before the queued task ETA is not merged."""
+    mocked_datetime = mocker.patch("invenio_app_ils.indexer.datetime")
+    now = datetime(2020, 1, 1)
+    delay = app.config["ILS_INDEXER_TASK_DELAY"]
+    task = mocker.Mock()
+    scheduler = ReferencedRecordsScheduler(LocalPendingCascadesStore())
+    document = dict(pid="docid-1")
+
+    mocked_datetime.utcnow.return_value = now
+    assert scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+    mocked_datetime.utcnow.return_value = now + delay - timedelta(seconds=1)
+    assert scheduler.schedule(task, DOCUMENT_PID_TYPE, document)
+
+    etas = [c[1]["eta"] for c in task.apply_async.call_args_list]
+    assert etas == [now + delay, now + 2 * delay - timedelta(seconds=1)]
+    assert scheduler.counters == {DOCUMENT_PID_TYPE: dict(scheduled=2)}
+
+
+def test_changed_referenced_pid_types(db, testdata):
+    """Test that only the referenced records embedding changes are indexed."""
+    document = Document.get_record_by_pid("docid-1")
+    # no processed revision
+    assert get_changed_referenced_pid_types(document, None) is None
+    # indexed again without changes
+    assert get_changed_referenced_pid_types(
+        document, document.revision_id
+    ) == []
+
+    def _update(field, value):
+        processed_revision_id = document.revision_id
+        document[field] = value
+        document.commit()
+        db.session.commit()
+        return get_changed_referenced_pid_types(
+            document, processed_revision_id
+        )
+
+    assert _update("abstract", "A new abstract") == []
+    assert _update("languages", ["fr"]) == [RELATED_RECORDS]
+    assert _update("title", "A new title") == sorted(REFERENCED_FIELDS)
+
+    # the changes of all the revisions since the processed one are included
+    processed_revision_id = document.revision_id
+    _update("languages", ["it"])
+    _update("abstract", "Another abstract")
+    assert get_changed_referenced_pid_types(
+        document, processed_revision_id
+    ) == [RELATED_RECORDS]
+
+
+def test_rebuild_index_partitions(testdata):
+    """Test that records are reindexed by partitions of IDs."""
+    partitions = rebuild_index_partitions(ITEM_PID_TYPE, 2)
+    assert partitions
+    for first, last in partitions:
+        assert last - first < 2
+
+    indexed = failed = 0
+    for first, last in partitions:
+        _, _, _, success, errors = rebuild_index_partition(
+            (ITEM_PID_TYPE, first, last, 2)
+        )
+        indexed += success
+        failed += errors
+    assert indexed == len(testdata["items"])
+    assert failed == 0
+
+
+def test_referenced_records_scheduler_skips_stale_tasks(testdata):
+    """Test that tasks load the record and skip already processed ones."""
+    scheduler = ReferencedRecordsScheduler(LocalPendingCascadesStore())
+    document = Document.get_record_by_pid("docid-1")
+    revision_id = document.revision_id
+
+    loaded = scheduler.started(DOCUMENT_PID_TYPE, "docid-1", revision_id)
+    assert loaded.id == document.id
+    assert scheduler.processed_revision_id(DOCUMENT_PID_TYPE, loaded) is None
+    scheduler.processed(DOCUMENT_PID_TYPE, loaded)
+    assert scheduler.processed_revision_id(
+        DOCUMENT_PID_TYPE, loaded
+    ) == revision_id
+
+    # same or older revision already processed
+    assert not scheduler.started(DOCUMENT_PID_TYPE, "docid-1", revision_id)
+    # same revision but other task arguments
+    assert scheduler.started(
+        DOCUMENT_PID_TYPE, "docid-1", revision_id, pid_types=[ITEM_PID_TYPE]
+    )
+    # the record does not exist anymore
+    assert not scheduler.started(DOCUMENT_PID_TYPE, "not-existing", 1)
+    assert scheduler.counters[DOCUMENT_PID_TYPE] == dict(skipped=2)
+
+
+def test_rebuild_index_checkpoint(tmp_path):
+    """Test that a checkpoint can only be resumed with its partition size."""
+    path = str(tmp_path / "checkpoint.json")
+    assert _load_rebuild_checkpoint(path, 10) == set()
+    _save_rebuild_checkpoint(path, 10, {"pitmid:1-10"})
+    assert _load_rebuild_checkpoint(path, 10) == {"pitmid:1-10"}
+    with pytest.raises(click.BadParameter):
+        _load_rebuild_checkpoint(path, 20)
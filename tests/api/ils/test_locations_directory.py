@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test locations directory."""
+
+import pytest
+from invenio_db import db
+from invenio_pidstore.errors import PIDDoesNotExistError
+
+from invenio_app_ils.locations.api import Location
+from invenio_app_ils.locations.directory import LocationsDirectory, \
+    get_internal_location, get_location
+from invenio_app_ils.locations.indexer import LocationIndexer
+
+
+def test_locations_directory(app, testdata, mocker):
+    """Test that locations are loaded once and reloaded on changes."""
+    directory = LocationsDirectory(ttl=60)
+    state = app.extensions["invenio-app-ils"]
+    mocker.patch.dict(state.__dict__, locations_directory=directory)
+
+    location_pid = testdata["locations"][0]["pid"]
+    location = get_location(location_pid)
+    assert location["name"] == testdata["locations"][0]["name"]
+    # lookups return copies
+    location["name"] = "Changed"
+    assert get_location(location_pid)["name"] != "Changed"
+
+    internal_location = testdata["internal_locations"][0]
+    assert get_internal_location(internal_location["pid"]) == dict(
+        internal_location
+    )
+    with pytest.raises(PIDDoesNotExistError):
+        get_location("not-existing-pid")
+
+    record = Location.get_record_by_pid(location_pid)
+    record["name"] = "A new name"
+    record.commit()
+    db.session.commit()
+    version = directory.version
+    LocationIndexer().index(record)
+    assert directory.version == version + 1
+    assert get_location(location_pid)["name"] == "A new name"
@@ -11,7 +11,10 @@ import pytest
 from jinja2.exceptions import TemplateError, TemplateNotFound
 
 from invenio_app_ils.circulation.mail.messages import BlockTemplatedMessage
-from invenio_app_ils.mail.tasks import send_ils_email
+from invenio_app_ils.mail import messages
+from invenio_app_ils.mail.tasks import _close_smtp_connection, _smtp, \
+    ils_email_batch, log_error_mail, log_successful_mail, send_ils_email, \
+    send_ils_emails
 
 
 class TestMessage(BlockTemplatedMessage):
@@ -60,15 +63,66 @@ def test_block_template_with_missing_template(app_with_mail):
 
 
 def test_log_successful_error_mail_task(app_with_mail, mocker):
-    """Test that a successfully sent email is logged."""
-    succ = mocker.patch("invenio_app_ils.mail.tasks.log_successful_mail")
-    err = mocker.patch("invenio_app_ils.mail.tasks.log_error_mail")
+    """Test that successfully sent and failed emails are logged."""
+    succ = mocker.patch("invenio_app_ils.mail.tasks._log_successful_mail")
+    err = mocker.patch("invenio_app_ils.mail.tasks._log_error_mail")
 
-    assert not succ.s.called
-    assert not err.s.called
     send_ils_email(TestMessage())
-    assert succ.s.called
-    assert err.s.called
+    assert succ.call_count == 1
+    assert not err.called
+
+    mocker.patch(
+        "invenio_app_ils.mail.tasks._send_message",
+        side_effect=[None, Exception("SMTP error")],
+    )
+    with ils_email_batch():
+        send_ils_email(TestMessage())
+        send_ils_email(TestMessage())
+    assert succ.call_count == 2
+    assert err.call_count == 1
+
+
+def test_deprecated_log_mail_tasks(app_with_mail, mocker):
+    """Test that the deprecated log tasks still log the emails."""
+    succ = mocker.patch("invenio_app_ils.mail.tasks._log_successful_mail")
+    err = mocker.patch("invenio_app_ils.mail.tasks._log_error_mail")
+    data = dict(id="message-id")
+    exc = Exception("SMTP error")
+
+    log_successful_mail.apply((None, data))
+    succ.assert_called_once_with(data)
+    log_error_mail.apply((dict(id="task-id"), exc, None, data))
+    err.assert_called_once_with(exc, data, request=dict(id="task-id"))
+
+
+def test_close_dropped_smtp_connection(app_with_mail, mocker):
+    """Test that a connection failing to close is dropped."""
+    connection = mocker.Mock()
+    connection.__exit__ = mocker.Mock(side_effect=OSError("Broken pipe"))
+    _smtp.connection = connection
+
+    _close_smtp_connection()
+    assert _smtp.connection is None
+    assert connection.__exit__.called
+
+
+def test_send_emails_in_batches(app_with_mail, mocker):
+    """Test that the emails of a batch are sent by one task per batch."""
+    mocker.patch.dict(app_with_mail.config, ILS_MAIL_BATCH_SIZE=2)
+    # start without the connection opened by the previous tests
+    _close_smtp_connection()
+    task = mocker.spy(send_ils_emails, "apply_async")
+    connect = mocker.spy(app_with_mail.extensions["mail"], "connect")
+
+    with app_with_mail.extensions["mail"].record_messages() as outbox:
+        with ils_email_batch():
+            for _ in range(3):
+                send_ils_email(TestMessage())
+            assert len(outbox) == 0
+        assert len(outbox) == 3
+    assert task.call_count == 2
+    # the SMTP connection is reused by the worker
+    assert connect.call_count == 1
 
 
 def test_example_loader(app_with_mail, example_message_factory):
@@ -92,3 +146,21 @@ def test_send_only_to_test_recipients(app_with_mail, mocker):
         assert outbox[0].recipients == fake_recipients
 
     app_with_mail.config["ILS_MAIL_ENABLE_TEST_RECIPIENTS"] = False
+
+
+def test_footer_memoized(app_with_mail, mocker):
+    """Test that the footer is rendered once for the same SPA routes."""
+    messages._render_memoized_footers.cache_clear()
+    render = mocker.spy(messages, "_render_footers")
+    with app_with_mail.app_context():
+        first = TestMessage(template="mail/subject_body.html")
+        second = TestMessage(template="mail/subject_body.html")
+        assert second.body == first.body
+        assert render.call_count == 1
+
+        mocker.patch.dict(
+            app_with_mail.config, SPA_HOST="https://other.host.ch"
+        )
+        third = TestMessage(template="mail/subject_body.html")
+        assert "https://other.host.ch" in third.body
+        assert render.call_count == 2
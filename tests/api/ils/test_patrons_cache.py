@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2020 CERN.
+#
+# invenio-app-ils is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Test patrons cache."""
+
+from invenio_userprofiles.models import UserProfile
+
+from invenio_app_ils.patrons.cache import PatronsCache
+from invenio_app_ils.proxies import current_app_ils
+
+
+def test_patrons_cache_lru_and_expiration():
+    """Test that the process cache evicts old and expired patrons."""
+    cache = PatronsCache(maxsize=2, ttl=60)
+    cache.set("1", "patron1")
+    cache.set("2", "patron2")
+    assert cache.get("1") == "patron1"
+    cache.set("3", "patron3")
+    assert cache.get("2") is None
+    assert cache.get("1") == "patron1"
+
+    cache.invalidate("1")
+    assert cache.get("1") is None
+
+    expired = PatronsCache(maxsize=2, ttl=-1)
+    expired.set("1", "patron1")
+    assert expired.get("1") is None
+
+
+def test_patrons_request_cache(app, db, users, mocker):
+    """Test that patrons are fetched once per request and invalidated."""
+    Patron = current_app_ils.patron_cls
+    datastore = app.extensions["security"].datastore
+    get_user = mocker.spy(datastore, "get_user")
+    patron_pid = users["patron1"].id
+
+    with app.test_request_context():
+        patron = Patron.get_patron(patron_pid)
+        assert Patron.get_patron(str(patron_pid)) is patron
+        assert get_user.call_count == 1
+
+        profile = UserProfile(user_id=patron_pid, full_name="New Name")
+        db.session.add(profile)
+        db.session.flush()
+        assert Patron.get_patron(patron_pid)["name"] == "New Name"
+        assert get_user.call_count == 2
+
+    with app.test_request_context():
+        Patron.get_patron(patron_pid)
+        assert get_user.call_count == 3
@@ -7,22 +7,35 @@
 
 """Test Items resolvers."""
 
+from copy import deepcopy
+
+import pytest
 from invenio_circulation.pidstore.pids import CIRCULATION_LOAN_PID_TYPE
+from invenio_circulation.proxies import current_circulation
 
 from invenio_app_ils.acquisition.api import ORDER_PID_TYPE
+from invenio_app_ils.circulation.jsonresolvers.loan import item_resolver
 from invenio_app_ils.document_requests.api import DOCUMENT_REQUEST_PID_TYPE
 from invenio_app_ils.documents.api import DOCUMENT_PID_TYPE, Document
 from invenio_app_ils.documents.indexer import DocumentIndexer
 from invenio_app_ils.eitems.api import EITEM_PID_TYPE, EItem
 from invenio_app_ils.eitems.indexer import EItemIndexer
+from invenio_app_ils.errors import UnknownItemPidTypeError
 from invenio_app_ils.ill.api import BORROWING_REQUEST_PID_TYPE
+from invenio_app_ils.indexer import bulk_index_records
 from invenio_app_ils.internal_locations.indexer import InternalLocationIndexer
 from invenio_app_ils.items.api import ITEM_PID_TYPE, Item
 from invenio_app_ils.items.indexer import ItemIndexer
 from invenio_app_ils.locations.api import LOCATION_PID_TYPE, Location
 from invenio_app_ils.locations.indexer import LocationIndexer
-from invenio_app_ils.patrons.api import PATRON_PID_TYPE, Patron
+from invenio_app_ils.patrons.api import PATRON_PID_TYPE, Patron, \
+    get_patron_or_empty_dict
 from invenio_app_ils.patrons.indexer import PatronIndexer
+from invenio_app_ils.proxies import current_app_ils
+from invenio_app_ils.records.jsonresolvers.api import get_cached_record, \
+    prefetch_referenced_records
+from invenio_app_ils.records.jsonresolvers.cache import current_ref_cache, \
+    ref_resolution_cache
 
 from invenio_app_ils.internal_locations.api import (  # isort:skip
     INTERNAL_LOCATION_PID_TYPE,
@@ -205,3 +218,69 @@ def test_jsonresolvers(testdata, mocker):
     test_on_item_update()
     test_on_location_update()
     test_on_patron_update()
+
+
+def test_ref_resolution_cache(app, testdata):
+    """Test that references are resolved once per request."""
+    item_pid = testdata["items"][0]["pid"]
+    with app.test_request_context():
+        item = Item.get_record_by_pid(item_pid)
+        first = deepcopy(item.replace_refs())
+        cache = current_ref_cache()
+        misses = cache.misses
+        assert misses > 0
+
+        second = deepcopy(item.replace_refs())
+        assert second == first
+        assert cache.misses == misses
+        assert cache.hits > 0
+
+    with ref_resolution_cache() as cache:
+        deepcopy(item.replace_refs())
+        assert cache.misses == misses
+    assert current_ref_cache() is None
+
+
+def test_prefetch_referenced_records(app, testdata):
+    """Test that the records referenced by a batch are fetched in bulk."""
+    loans = testdata["loans"]
+    with ref_resolution_cache() as cache:
+        prefetch_referenced_records(loans)
+        assert cache.misses == 0
+
+        for loan in loans:
+            get_cached_record(Document, loan["document_pid"])
+            item_pid = loan.get("item_pid")
+            if item_pid and item_pid["type"] == ITEM_PID_TYPE:
+                get_cached_record(Item, item_pid["value"])
+            get_patron_or_empty_dict(loan["patron_pid"])
+        assert cache.misses == 0
+        assert cache.hits > 0
+
+
+def test_bulk_indexing_does_not_change_records(app, testdata):
+    """Test that resolving the references of the records keeps them."""
+    Order = current_app_ils.record_class_by_pid_type(ORDER_PID_TYPE)
+    orders = [
+        Order.get_record_by_pid(order["pid"])
+        for order in testdata["acq_orders"]
+    ]
+    originals = deepcopy([dict(order) for order in orders])
+
+    record_indexer = current_app_ils.indexer_by_pid_type(ORDER_PID_TYPE)
+    for _, _, errors in bulk_index_records(
+        orders, record_indexer=record_indexer
+    ):
+        assert not errors
+    assert [dict(order) for order in orders] == originals
+
+
+def test_loan_item_resolver_unknown_pid_type(app, testdata):
+    """Test that loans referencing an unknown item type are rejected."""
+    Loan = current_circulation.loan_record_cls
+    loan = Loan.get_record_by_pid(testdata["loans"][0]["pid"])
+    loan["item_pid"] = dict(type="unknown", value="1")
+    with ref_resolution_cache() as cache:
+        cache.set((Loan, loan["pid"]), loan)
+        with pytest.raises(UnknownItemPidTypeError):
+            item_resolver(loan["pid"])